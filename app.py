@@ -1,19 +1,38 @@
-from flask import Flask, render_template, request, jsonify, send_file, redirect, url_for
+from flask import Flask, render_template, request, jsonify, send_file, send_from_directory, redirect, url_for, Response
+from werkzeug.exceptions import NotFound
+from werkzeug.utils import safe_join
 from utils.instagram_api import InstagramAPI
 from utils.download_manager import DownloadService
 from utils.analytics import AnalyticsService
+from utils.image_pipeline import ThumbnailService
+from utils.cohort import CohortAnalyzer
+from utils.typeahead import TypeaheadSearch
 import config
+import click
 import os
+import json
+import mimetypes
+import urllib.parse
 from datetime import datetime, timedelta
 import traceback
 
 app = Flask(__name__)
 app.config.from_object(config.config['default'])
 
-# Initialize managers - without MongoDB
-instagram_api = InstagramAPI()
-download_service = DownloadService()
-analytics_service = AnalyticsService()
+# Process-pool workers start from a fresh interpreter and re-import this file
+# as __mp_main__; they only run top-level worker functions, so the services
+# and their background threads are created in the app process alone
+if __name__ != '__mp_main__':
+    # Initialize managers - without MongoDB
+    instagram_api = InstagramAPI()
+    download_service = DownloadService(instagram_api)
+    analytics_service = AnalyticsService()
+    thumbnail_service = ThumbnailService(download_service)
+    cohort_analyzer = CohortAnalyzer(instagram_api, analytics_service)
+    typeahead_search = TypeaheadSearch(instagram_api.search_profiles)
+    
+    # Index captions of every fetched post for search
+    instagram_api.posts_listeners.append(analytics_service.index_posts)
 
 # Jinja2 Filters
 @app.template_filter('format_number')
@@ -64,6 +83,23 @@ def is_limited_data_filter(profile):
     """Check if profile data is limited"""
     return profile.get('is_limited_data', False)
 
+@app.template_global('thumbnail_url')
+def thumbnail_url(media_url, width, media_id=None):
+    """URL of a resized WebP thumbnail for an image"""
+    if not media_url or not thumbnail_service.available:
+        return media_url
+    return url_for('media_thumbnail', width=width, url=media_url, id=media_id)
+
+@app.template_global('thumbnail_srcset')
+def thumbnail_srcset(media_url, media_id=None):
+    """srcset listing every thumbnail width of an image"""
+    if not media_url or not thumbnail_service.available:
+        return ''
+    return ', '.join(
+        f"{thumbnail_url(media_url, width, media_id)} {width}w"
+        for width in thumbnail_service.widths
+    )
+
 @app.route('/')
 def index():
     """Home page with search"""
@@ -110,6 +146,7 @@ def view_profile(username):
                                 username=username)
         
         elif profile_data.get('is_private'):
+            analytics_service.record_snapshot(profile_data)
             # Private account with some data
             if profile_data.get('has_preview_content'):
                 # Private account with preview content
@@ -201,12 +238,28 @@ def view_posts(username):
 def view_downloads():
     """View download history"""
     try:
+        username = request.args.get('username', '').strip() or None
+        media_type = request.args.get('type', '').strip() or None
+        cursor = request.args.get('cursor') or None
+        
         download_stats = download_service.get_download_stats()
-        download_history = download_service.get_download_history(limit=50)
+        try:
+            page = download_service.get_download_page(
+                limit=50, cursor=cursor, username=username, media_type=media_type
+            )
+        except ValueError:
+            page = download_service.get_download_page(
+                limit=50, username=username, media_type=media_type
+            )
+        daily_stats = download_service.get_daily_stats(days=7)
         
         return render_template('downloads.html', 
                              stats=download_stats, 
-                             downloads=download_history)
+                             downloads=page['downloads'],
+                             next_cursor=page['next_cursor'],
+                             filter_username=username,
+                             filter_type=media_type,
+                             daily_stats=daily_stats)
     except Exception as e:
         print(f"❌ Downloads loading error: {str(e)}")
         return render_template('error.html', message=f"Error loading downloads: {str(e)}")
@@ -222,18 +275,34 @@ def view_analytics(username):
         
         posts = instagram_api.get_user_posts(username, limit=50)
         analytics = analytics_service.analyze_profile(profile_data, posts)
+        history = analytics_service.get_profile_analytics(profile_data['username'])
         
         return render_template('analytics.html', 
                              profile=profile_data, 
-                             analytics=analytics)
+                             analytics=analytics,
+                             history=history)
     except Exception as e:
         print(f"❌ Analytics loading error: {str(e)}")
         return render_template('error.html', message=f"Error loading analytics: {str(e)}")
 
 # Download API Routes
+def _queue_download(job_type, payload):
+    """Queue a download job and respond with its id immediately"""
+    job_id = download_service.submit_download(job_type, payload)
+    if not job_id:
+        return jsonify({'success': False, 'error': 'Could not queue download'})
+    
+    return jsonify({
+        'success': True,
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': url_for('download_job_status', job_id=job_id),
+        'progress_url': url_for('download_job_progress', job_id=job_id)
+    }), 202
+
 @app.route('/download/story', methods=['POST'])
 def download_story():
-    """Download a story"""
+    """Queue a story download"""
     try:
         data = request.get_json()
         story_url = data.get('url')
@@ -243,16 +312,18 @@ def download_story():
         if not all([story_url, username, story_id]):
             return jsonify({'success': False, 'error': 'Missing parameters'})
         
-        result = download_service.download_story(story_url, username, story_id)
-        
-        return jsonify(result)
+        return _queue_download('story', {
+            'url': story_url,
+            'username': username,
+            'story_id': story_id
+        })
     except Exception as e:
         print(f"❌ Story download error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
 
 @app.route('/download/post', methods=['POST'])
 def download_post():
-    """Download a post"""
+    """Queue a post download"""
     try:
         data = request.get_json()
         post_data = data.get('post_data')
@@ -261,16 +332,17 @@ def download_post():
         if not all([post_data, username]):
             return jsonify({'success': False, 'error': 'Missing parameters'})
         
-        result = download_service.download_post(post_data, username)
-        
-        return jsonify(result)
+        return _queue_download('post', {
+            'post_data': post_data,
+            'username': username
+        })
     except Exception as e:
         print(f"❌ Post download error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
 
 @app.route('/download/profile-pic', methods=['POST'])
 def download_profile_pic():
-    """Download profile picture"""
+    """Queue a profile picture download"""
     try:
         data = request.get_json()
         profile_data = data.get('profile_data')
@@ -278,13 +350,101 @@ def download_profile_pic():
         if not profile_data:
             return jsonify({'success': False, 'error': 'Missing profile data'})
         
-        result = download_service.download_profile_picture(profile_data)
-        
-        return jsonify(result)
+        return _queue_download('profile_pic', {'profile_data': profile_data})
     except Exception as e:
         print(f"❌ Profile pic download error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/archive/<username>', methods=['POST'])
+def archive_profile(username):
+    """Queue an incremental archive of every new post of an account"""
+    try:
+        return _queue_download('archive', {'username': username})
+    except Exception as e:
+        print(f"❌ Archive error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/archive/<username>')
+def archive_status(username):
+    """Get the archival checkpoint of an account"""
+    checkpoint = download_service.get_archive_checkpoint(username)
+    if not checkpoint:
+        return jsonify({'success': False, 'error': 'Account has not been archived'}), 404
+    return jsonify({'success': True, 'checkpoint': checkpoint})
+
+@app.route('/download/batch', methods=['POST'])
+def download_batch():
+    """Download many posts/stories at once as a streamed ZIP archive"""
+    try:
+        # Accept JSON from fetch() or a plain form post so the browser can stream to disk
+        data = request.get_json(silent=True)
+        if data is None:
+            data = {'items': json.loads(request.form.get('items', '[]'))}
+        items = (data.get('items') if isinstance(data, dict) else None) or []
+        
+        if not isinstance(items, list) or not items:
+            return jsonify({'success': False, 'error': 'No items to download'}), 400
+        
+        if not all(isinstance(item, dict) for item in items):
+            return jsonify({'success': False, 'error': 'Every item must be an object'}), 400
+        
+        if len(items) > app.config['BATCH_MAX_ITEMS']:
+            return jsonify({
+                'success': False,
+                'error': f"Too many items (max {app.config['BATCH_MAX_ITEMS']})"
+            }), 400
+        
+        filename = f"igspyglass_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        return Response(
+            download_service.stream_batch_zip(items),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+        )
+    except Exception as e:
+        print(f"❌ Batch download error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)}), 400
+
+@app.route('/download/jobs', methods=['POST'])
+def submit_download_job():
+    """Queue a download job of any type"""
+    try:
+        data = request.get_json() or {}
+        job_type = data.pop('type', None)
+        
+        required = {
+            'story': ('url', 'username', 'story_id'),
+            'post': ('post_data', 'username'),
+            'profile_pic': ('profile_data',)
+        }
+        if job_type not in required:
+            return jsonify({'success': False, 'error': 'Invalid job type'})
+        
+        if not all(data.get(field) for field in required[job_type]):
+            return jsonify({'success': False, 'error': 'Missing parameters'})
+        
+        return _queue_download(job_type, data)
+    except Exception as e:
+        print(f"❌ Download job submit error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/download/jobs/<job_id>')
+def download_job_status(job_id):
+    """Get status and result of a download job"""
+    job = download_service.get_job(job_id)
+    if not job:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    return jsonify({'success': True, 'job': job})
+
+@app.route('/download/jobs/<job_id>/progress')
+def download_job_progress(job_id):
+    """Get progress of a download job"""
+    progress = download_service.get_job_progress(job_id)
+    if not progress:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    
+    return jsonify({'success': True, 'progress': progress})
+
 # API Routes
 @app.route('/api/profile/<username>')
 def api_profile(username):
@@ -293,6 +453,7 @@ def api_profile(username):
         profile_data = instagram_api.get_profile_data(username)
         
         if profile_data:
+            analytics_service.record_snapshot(profile_data)
             return jsonify({'success': True, 'profile': profile_data})
         else:
             return jsonify({'success': False, 'error': 'Profile not found'})
@@ -300,6 +461,105 @@ def api_profile(username):
         print(f"❌ API profile error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/analytics/<username>/history')
+def api_profile_history(username):
+    """API endpoint for stored follower/engagement history"""
+    try:
+        start = request.args.get('start')
+        end = request.args.get('end')
+        resolution = request.args.get('resolution') or None
+        if resolution not in (None, 'raw', 'hourly', 'daily'):
+            return jsonify({'success': False, 'error': 'Invalid resolution'}), 400
+        
+        history = analytics_service.get_profile_analytics(
+            username,
+            start=datetime.fromisoformat(start) if start else None,
+            end=datetime.fromisoformat(end) if end else None,
+            resolution=resolution
+        )
+        return jsonify({'success': True, 'username': username, 'history': history})
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ API history error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/analytics/cohort', methods=['GET', 'POST'])
+def api_cohort_analytics():
+    """Compare many profiles, streaming one NDJSON line per profile as it completes"""
+    data = request.get_json(silent=True) or {}
+    usernames = data.get('usernames')
+    if usernames is None:
+        usernames = request.args.get('usernames', '').split(',')
+    
+    if not isinstance(usernames, list):
+        return jsonify({'success': False, 'error': 'usernames must be a list'}), 400
+    
+    # Drop blanks and duplicates, keeping the requested order
+    usernames = list(dict.fromkeys(
+        str(username).strip().lstrip('@').lower() for username in usernames if str(username).strip()
+    ))
+    if not usernames:
+        return jsonify({'success': False, 'error': 'No usernames given'}), 400
+    if len(usernames) > app.config['COHORT_MAX_PROFILES']:
+        return jsonify({
+            'success': False,
+            'error': f"Too many profiles (max {app.config['COHORT_MAX_PROFILES']})"
+        }), 400
+    
+    def generate():
+        for event in cohort_analyzer.stream(usernames):
+            yield json.dumps(event, default=str) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
+@app.route('/api/captions/search')
+def api_caption_search():
+    """API endpoint for ranked full-text search over indexed captions"""
+    try:
+        query = request.args.get('q', '').strip()
+        if not query:
+            return jsonify({'success': False, 'error': 'Missing search query'}), 400
+        
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        results = analytics_service.search_captions(
+            query, username=request.args.get('username') or None, limit=limit
+        )
+        return jsonify({'success': True, 'query': query, 'results': results, 'count': len(results)})
+    except Exception as e:
+        print(f"❌ API caption search error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/captions/tags')
+def api_caption_tags():
+    """API endpoint for the most used hashtags or mentions"""
+    try:
+        kind = request.args.get('kind', 'hashtag')
+        if kind not in ('hashtag', 'mention'):
+            return jsonify({'success': False, 'error': 'Invalid tag kind'}), 400
+        
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        tags = analytics_service.get_tag_frequency(
+            kind, username=request.args.get('username') or None, limit=limit
+        )
+        return jsonify({'success': True, 'kind': kind, 'tags': tags})
+    except Exception as e:
+        print(f"❌ API caption tags error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/captions/tags/<tag>/related')
+def api_caption_related_tags(tag):
+    """API endpoint for hashtags that appear together with a hashtag"""
+    try:
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        related = analytics_service.get_tag_cooccurrence(
+            tag, username=request.args.get('username') or None, limit=limit
+        )
+        return jsonify({'success': True, 'tag': tag.lstrip('#').lower(), 'related': related})
+    except Exception as e:
+        print(f"❌ API related tags error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)})
+
 @app.route('/api/posts/<username>')
 def api_posts(username):
     """API endpoint for posts data"""
@@ -310,6 +570,37 @@ def api_posts(username):
         print(f"❌ API posts error: {str(e)}")
         return jsonify({'success': False, 'error': str(e)})
 
+@app.route('/api/downloads')
+def api_downloads():
+    """API endpoint for cursor-paginated download history"""
+    try:
+        limit = min(max(request.args.get('limit', 50, type=int), 1), 200)
+        page = download_service.get_download_page(
+            limit=limit,
+            cursor=request.args.get('cursor') or None,
+            username=request.args.get('username') or None,
+            media_type=request.args.get('type') or None
+        )
+        return jsonify({
+            'success': True,
+            'downloads': page['downloads'],
+            'next_cursor': page['next_cursor']
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        print(f"❌ API downloads error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)})
+
+@app.route('/api/downloads/governor')
+def api_download_governor():
+    """API endpoint for active/queued media transfers and bandwidth usage"""
+    try:
+        return jsonify({'success': True, 'governor': download_service.get_transfer_stats()})
+    except Exception as e:
+        print(f"❌ API governor error: {str(e)}")
+        return jsonify({'success': False, 'error': str(e)})
+
 # Debug Routes
 @app.route('/debug/profile/<username>')
 def debug_profile(username):
@@ -357,16 +648,90 @@ def test_instagram():
 # Serve downloaded files
 @app.route('/static/downloads/<filename>')
 def serve_downloaded_file(filename):
-    """Serve downloaded files"""
+    """Serve downloaded files with Range, conditional GET and proxy offload"""
     try:
-        file_path = os.path.join(app.config['DOWNLOAD_FOLDER'], filename)
-        if os.path.exists(file_path):
-            return send_file(file_path, as_attachment=True)
-        else:
-            return "File not found", 404
+        # ?inline=1 lets videos play and seek in the browser instead of downloading
+        as_attachment = request.args.get('inline') != '1'
+        download_service.touch_file(os.path.join(app.config['DOWNLOAD_FOLDER'], filename))
+        
+        if app.config['DOWNLOAD_SENDFILE_BACKEND'] == 'x-accel':
+            return _accel_redirect_download(filename, as_attachment)
+        
+        # Handles Range/If-Range, ETag/If-None-Match and Last-Modified; with
+        # USE_X_SENDFILE set the body is left to the front proxy
+        return send_from_directory(
+            os.path.abspath(app.config['DOWNLOAD_FOLDER']),
+            filename,
+            as_attachment=as_attachment,
+            conditional=True,
+            etag=True,
+            max_age=app.config['DOWNLOAD_CACHE_MAX_AGE']
+        )
+    except NotFound:
+        return "File not found", 404
     except Exception as e:
         return str(e), 500
 
+@app.route('/media/thumbnail/<int:width>')
+def media_thumbnail(width):
+    """Serve a WebP thumbnail, falling back to the original while it is generated"""
+    media_url = request.args.get('url', '')
+    media_id = request.args.get('id') or None
+    
+    if not thumbnail_service.is_allowed_source(media_url):
+        return "Unsupported image source", 400
+    
+    try:
+        path = thumbnail_service.get_thumbnail(media_url, width, media_id)
+    except Exception as e:
+        print(f"❌ Thumbnail error: {str(e)}")
+        path = None
+    
+    if not path:
+        return redirect(media_url)
+    
+    return send_file(
+        os.path.abspath(path),
+        mimetype='image/webp',
+        conditional=True,
+        max_age=app.config['DOWNLOAD_CACHE_MAX_AGE']
+    )
+
+def _accel_redirect_download(filename, as_attachment):
+    """Let nginx send the file from its internal download location"""
+    file_path = safe_join(app.config['DOWNLOAD_FOLDER'], filename)
+    if not file_path or not os.path.isfile(file_path):
+        raise NotFound()
+    
+    response = Response(mimetype=mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+    response.headers['X-Accel-Redirect'] = (
+        app.config['DOWNLOAD_ACCEL_PREFIX'].rstrip('/') + '/' + urllib.parse.quote(filename)
+    )
+    response.headers['Cache-Control'] = f"public, max-age={app.config['DOWNLOAD_CACHE_MAX_AGE']}"
+    if as_attachment:
+        response.headers['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+@app.cli.command('rebuild-download-stats')
+def rebuild_download_stats_command():
+    """Recompute download statistics summary tables from the downloads table"""
+    download_service.rebuild_download_stats()
+
+@app.cli.command('sweep-downloads')
+def sweep_downloads_command():
+    """Evict expired and least recently used files from the download folder"""
+    removed = download_service.sweep_downloads()
+    print(f"Removed {removed['files']} files ({removed['bytes']} bytes)")
+
+@app.cli.command('archive-profiles')
+@click.argument('usernames', nargs=-1)
+def archive_profiles_command(usernames):
+    """Archive new posts of the given accounts (default: every archived account)"""
+    for username in usernames or download_service.get_archived_usernames():
+        result = download_service.archive_profile(username)
+        status = 'ok' if result.get('success') else f"failed: {result.get('error')}"
+        print(f"{username}: {result.get('downloaded', 0)} new posts ({status})")
+
 @app.errorhandler(404)
 def not_found(error):
     return render_template('error.html', message="Page not found"), 404
@@ -418,6 +783,38 @@ def api_search(query):
             'error': str(e)
         })
 
+@app.route('/api/typeahead')
+def api_typeahead():
+    """API endpoint for search-as-you-type with per-client debouncing"""
+    try:
+        query = request.args.get('q', '')
+        client_id = request.args.get('client') or request.remote_addr
+        profiles, source = typeahead_search.search(client_id, query)
+
+        if source is None:
+            # A newer query from the same client replaced this one
+            return jsonify({'success': True, 'query': query, 'superseded': True})
+
+        return jsonify({
+            'success': True,
+            'query': query,
+            'profiles': profiles,
+            'count': len(profiles),
+            'source': source,
+            'superseded': False
+        })
+    except Exception as e:
+        print(f"❌ API typeahead error: {str(e)}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        })
+
+@app.route('/api/typeahead/stats')
+def api_typeahead_stats():
+    """API endpoint for typeahead cache and upstream counters"""
+    return jsonify({'success': True, 'stats': typeahead_search.get_stats()})
+
 # Add these new routes to your existing app.py
 
 @app.route('/preview/media/<username>')
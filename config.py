@@ -10,6 +10,30 @@ class Config:
 
     MONGO_URI = os.environ.get('MONGO_URI') or 'mongodb://localhost:27017/igspyglass'
     
+    # Model persistence: 'sqlite' (embedded, no server needed) or 'mongo'
+    MODELS_BACKEND = os.environ.get('MODELS_BACKEND', 'sqlite')
+    MODELS_DB_PATH = os.environ.get('MODELS_DB_PATH', 'models.db')
+    MODELS_BULK_BATCH_SIZE = 1000  # documents per bulk write / transaction
+    MODELS_STORY_PURGE_INTERVAL = 300  # seconds between expired-story purges (SQLite)
+    MODELS_POOL_SIZE = int(os.environ.get('MODELS_POOL_SIZE', 10))  # connections per process, shared by all managers
+    MONGO_MIN_POOL_SIZE = 0
+    MONGO_CONNECT_TIMEOUT_MS = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS = 5000
+    MONGO_SOCKET_TIMEOUT_MS = 30000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS = 10000  # how long a request waits for a free pooled connection
+    
+    # Fuzzy profile search (trigram index)
+    PROFILE_SEARCH_MIN_SIMILARITY = 0.3  # share of query trigrams a field must contain
+    PROFILE_SEARCH_MAX_CANDIDATES = 1000  # profiles scored per query
+    
+    # Typeahead search
+    TYPEAHEAD_DEBOUNCE_MS = 250  # quiet time per client before searching upstream
+    TYPEAHEAD_MIN_QUERY_LENGTH = 2
+    TYPEAHEAD_CACHE_SIZE = 2000  # cached queries
+    TYPEAHEAD_CACHE_TTL = 300  # seconds
+    TYPEAHEAD_MIN_RESULTS = 5  # filtered prefix results needed to skip the upstream search
+    TYPEAHEAD_MAX_CLIENTS = 10000
+    
     # Instagram API Configuration
     INSTAGRAM_API_BASE = 'https://www.instagram.com'
     
@@ -28,7 +52,85 @@ class Config:
     # Download settings
     DOWNLOAD_FOLDER = 'static/downloads'
     MAX_CONTENT_SIZE = 500 * 1024 * 1024  # 500MB
-    ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'mp4', 'mov'}
+    ALLOWED_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp', 'mp4', 'mov'}
+    DOWNLOAD_BUFFER_SIZE = 1024 * 1024  # read buffer for large transfers
+    DOWNLOAD_LARGE_FILE_THRESHOLD = 4 * 1024 * 1024
+    DOWNLOAD_SEGMENTS = int(os.environ.get('DOWNLOAD_SEGMENTS', 4))  # parallel ranges for big files
+    DOWNLOAD_SEGMENT_THRESHOLD = 16 * 1024 * 1024
+    DOWNLOAD_MAX_PER_HOST = int(os.environ.get('DOWNLOAD_MAX_PER_HOST', 6))
+    DOWNLOAD_MAX_BYTES_PER_SEC = int(os.environ.get('DOWNLOAD_MAX_BYTES_PER_SEC', 0))  # 0 = unlimited
+    
+    # Serving downloaded files. DOWNLOAD_SENDFILE_BACKEND hands the transfer to a
+    # front proxy: 'x-sendfile' (Apache/lighttpd) or 'x-accel' (nginx internal
+    # location mapped to DOWNLOAD_ACCEL_PREFIX)
+    DOWNLOAD_SENDFILE_BACKEND = os.environ.get('DOWNLOAD_SENDFILE_BACKEND')
+    DOWNLOAD_ACCEL_PREFIX = os.environ.get('DOWNLOAD_ACCEL_PREFIX', '/protected-downloads/')
+    USE_X_SENDFILE = DOWNLOAD_SENDFILE_BACKEND == 'x-sendfile'
+    DOWNLOAD_CACHE_MAX_AGE = 30 * 24 * 3600  # stored files never change once written
+    
+    # Download folder retention (0 disables a limit)
+    DOWNLOAD_MAX_TOTAL_SIZE = int(os.environ.get('DOWNLOAD_MAX_TOTAL_SIZE', 10 * 1024 * 1024 * 1024))
+    DOWNLOAD_MAX_AGE_DAYS = int(os.environ.get('DOWNLOAD_MAX_AGE_DAYS', 30))
+    DOWNLOAD_EVICTION_LOW_WATERMARK = 0.9  # evict down to this fraction of the size cap
+    DOWNLOAD_SWEEP_INTERVAL = 300  # seconds
+    DOWNLOAD_SWEEP_BATCH_SIZE = 200
+    
+    # Thumbnail pipeline (requires Pillow)
+    THUMBNAIL_FOLDER = 'static/downloads/thumbnails'
+    THUMBNAIL_WIDTHS = (320, 640, 1080)
+    THUMBNAIL_QUALITY = 80
+    THUMBNAIL_WORKERS = int(os.environ.get('THUMBNAIL_WORKERS', 2))
+    THUMBNAIL_SOURCE_HOSTS = ('cdninstagram.com', 'fbcdn.net', 'instagram.com')
+    
+    # Background download queue
+    DOWNLOAD_WORKERS = int(os.environ.get('DOWNLOAD_WORKERS', 4))
+    JOB_PROGRESS_SAVE_INTERVAL = 1.0  # seconds between progress writes to SQLite
+    JOB_HEARTBEAT_INTERVAL = 10  # seconds between heartbeats of running jobs
+    JOB_STALE_AFTER = 60  # seconds without a heartbeat before a running job is recovered
+    
+    # Batch ZIP downloads
+    BATCH_DOWNLOAD_WORKERS = int(os.environ.get('BATCH_DOWNLOAD_WORKERS', 8))
+    BATCH_MAX_ITEMS = 200
+    
+    # Incremental profile archival
+    ARCHIVE_DOWNLOAD_WORKERS = 4
+    ARCHIVE_PAGE_SIZE = 12
+    
+    # Analytics
+    ANALYTICS_ROLLING_WINDOW = 7  # posts per moving-average window
+    ANALYTICS_DB_PATH = os.environ.get('ANALYTICS_DB_PATH', 'analytics.db')
+    ANALYTICS_DRIFT_THRESHOLD = 0.2  # relative engagement change of known posts that forces a rebuild
+    ANALYTICS_RECENT_POSTS = 100  # newest posts kept for the rolling average and median posting gap
+    ANALYTICS_OUTLIER_CANDIDATES = 20  # highest and lowest engagement posts kept as outlier candidates
+    
+    # Cohort comparisons
+    COHORT_MAX_PROFILES = 100
+    COHORT_FETCH_WORKERS = int(os.environ.get('COHORT_FETCH_WORKERS', 8))
+    COHORT_PROCESS_WORKERS = int(os.environ.get('COHORT_PROCESS_WORKERS', 2))
+    COHORT_POST_LIMIT = 50
+    
+    # Profile history (time-series snapshots)
+    TIMESERIES_FOLDER = os.environ.get('TIMESERIES_FOLDER', 'data/timeseries')
+    TIMESERIES_MIN_INTERVAL = 60  # seconds between stored snapshots of one profile
+    TIMESERIES_RAW_RETENTION_DAYS = 7
+    TIMESERIES_HOURLY_RETENTION_DAYS = 90
+    TIMESERIES_DEFAULT_RANGE_DAYS = 90
+    
+    # SQLite settings
+    SQLITE_POOL_SIZE = int(os.environ.get('SQLITE_POOL_SIZE', 8))
+    SQLITE_BUSY_TIMEOUT = 5000  # milliseconds
+    SQLITE_POOL_TIMEOUT = 10  # seconds to wait for a free pooled connection
+    SQLITE_CACHE_SIZE_KB = 16 * 1024
+    SQLITE_MMAP_SIZE = 64 * 1024 * 1024
+    SQLITE_STATEMENT_CACHE_SIZE = 128
+    
+    # Write-behind download logging
+    DOWNLOAD_LOG_BATCH_SIZE = 100
+    DOWNLOAD_LOG_FLUSH_INTERVAL_MS = 250
+    DOWNLOAD_LOG_QUEUE_SIZE = 10000
+    DOWNLOAD_LOG_WRITE_RETRIES = 3  # retries of a failed batch before flush() reports it
+    DOWNLOAD_LOG_RETRY_DELAY_MS = 200  # backoff step between retries
+    DOWNLOAD_LOG_FLUSH_TIMEOUT = 5  # seconds flush() waits for the writer
     
     # Cache settings
     CACHE_DURATION = 3600  # 1 hour
@@ -0,0 +1,94 @@
+"""Compare storage backends on the workload of the model managers.
+
+Run from the project root, e.g.::
+
+    python -m models.benchmark --backend sqlite --backend mongo --profiles 2000
+"""
+import argparse
+import os
+import tempfile
+import time
+from models.models import ProfileManager, StoryManager, DownloadManager, AnalyticsManager
+from models.storage import SQLiteBackend, create_storage_backend
+
+def _timed(operations, label, count, func):
+    started = time.perf_counter()
+    for i in range(count):
+        func(i)
+    elapsed = time.perf_counter() - started
+    operations[label] = {
+        'count': count,
+        'seconds': round(elapsed, 4),
+        'ops_per_sec': round(count / elapsed, 1) if elapsed else None
+    }
+
+def benchmark_backend(backend, profiles=1000, stories_per_profile=5, downloads=1000, prefix='bench'):
+    """Time every manager operation against ``backend``; returns results per operation"""
+    profile_manager = ProfileManager(backend)
+    story_manager = StoryManager(backend)
+    download_manager = DownloadManager(backend)
+    analytics_manager = AnalyticsManager(backend)
+    usernames = [f"{prefix}_user_{i}" for i in range(profiles)]
+    operations = {}
+
+    _timed(operations, 'save_profile', profiles, lambda i: profile_manager.save_profile({
+        'username': usernames[i],
+        'full_name': f"Benchmark User {i}",
+        'bio': f"photography travel food #{i % 50}",
+        'followers': i * 10
+    }))
+    _timed(operations, 'get_profile', profiles, lambda i: profile_manager.get_profile(usernames[i]))
+    _timed(operations, 'search_profiles', 100, lambda i: profile_manager.search_profiles(f"user_{i}"))
+
+    _timed(operations, 'save_stories', profiles, lambda i: story_manager.save_stories(usernames[i], [
+        {'id': f"{i}_{n}", 'timestamp': n, 'media_type': 'image'} for n in range(stories_per_profile)
+    ]))
+    _timed(operations, 'get_active_stories', profiles, lambda i: story_manager.get_active_stories(usernames[i]))
+
+    # Bulk paths: all accounts in one call
+    bulk_profiles = [{'username': f"{prefix}_bulk_{i}", 'bio': 'bulk ingest'} for i in range(profiles)]
+    _timed(operations, 'save_profiles (bulk)', 1, lambda i: profile_manager.save_profiles(bulk_profiles))
+    _timed(operations, 'save_stories_bulk', 1, lambda i: story_manager.save_stories_bulk({
+        username: [{'id': f"bulk_{n}", 'timestamp': n, 'media_type': 'image'} for n in range(stories_per_profile)]
+        for username in usernames
+    }))
+
+    _timed(operations, 'log_download', downloads, lambda i: download_manager.log_download({
+        'username': usernames[i % profiles], 'type': 'post', 'url': f"https://example.com/{i}.jpg"
+    }))
+    _timed(operations, 'get_download_history', 100, lambda i: download_manager.get_download_history())
+    _timed(operations, 'get_download_stats', 100, lambda i: download_manager.get_download_stats())
+
+    _timed(operations, 'save_analytics', profiles, lambda i: analytics_manager.save_analytics(
+        usernames[i], {'engagement_rate': i / 100, 'average_likes': i}
+    ))
+    _timed(operations, 'get_profile_analytics', profiles, lambda i: analytics_manager.get_profile_analytics(usernames[i]))
+
+    return operations
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark model storage backends')
+    parser.add_argument('--backend', action='append', choices=['sqlite', 'mongo'],
+                        help='backend to benchmark (repeatable, default: sqlite)')
+    parser.add_argument('--profiles', type=int, default=1000)
+    parser.add_argument('--stories', type=int, default=5, help='stories per profile')
+    parser.add_argument('--downloads', type=int, default=1000)
+    args = parser.parse_args()
+
+    prefix = f"bench{int(time.time())}"
+    for name in args.backend or ['sqlite']:
+        if name == 'sqlite':
+            # Benchmark against a scratch database, never the configured one
+            folder = tempfile.mkdtemp(prefix='models-bench-')
+            backend = SQLiteBackend(os.path.join(folder, 'models.db'))
+        else:
+            backend = create_storage_backend(name)
+
+        print(f"📊 {name}")
+        results = benchmark_backend(backend, args.profiles, args.stories, args.downloads, prefix)
+        for operation, result in results.items():
+            print(f"   {operation:<24} {result['count']:>7} ops  {result['seconds']:>8.3f}s  {result['ops_per_sec']:>10} ops/s")
+        print(f"   pool: {backend.get_pool_stats()}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,860 @@
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import datetime
+from models import trigram
+from utils.sqlite_pool import SQLiteConnectionPool
+import config
+
+try:
+    from pymongo import MongoClient, ASCENDING, DESCENDING, UpdateOne
+    from pymongo.errors import DuplicateKeyError, OperationFailure
+    from pymongo.monitoring import ConnectionPoolListener
+except ImportError:  # pymongo is only needed for the Mongo backend
+    MongoClient = None
+    ASCENDING, DESCENDING = 1, -1
+    ConnectionPoolListener = object
+
+# Document fields stored as datetimes; restored from JSON on the SQLite backend
+DATETIME_FIELDS = ('last_updated', 'fetched_at', 'expires_at', 'downloaded_at', 'analyzed_at', 'timestamp')
+
+class StorageBackend(ABC):
+    """Persistence interface shared by the model managers.
+
+    Saving a document that already exists replaces the top-level fields it
+    carries and keeps the others, like a Mongo ``$set``; a field set to None
+    is stored as null.
+    """
+
+    @abstractmethod
+    def save_profile(self, profile_data):
+        pass
+
+    @abstractmethod
+    def save_profiles(self, profiles):
+        pass
+
+    @abstractmethod
+    def get_profile(self, username):
+        pass
+
+    @abstractmethod
+    def search_profiles(self, query, limit=50):
+        """Fuzzy-match active profiles by username, full name and bio, best first"""
+
+    @abstractmethod
+    def rebuild_search_index(self):
+        pass
+
+    @abstractmethod
+    def save_stories(self, stories):
+        """Upsert stories of any number of accounts; each carries its username"""
+
+    @abstractmethod
+    def get_active_stories(self, username, now):
+        pass
+
+    @abstractmethod
+    def purge_expired_stories(self, now):
+        pass
+
+    @abstractmethod
+    def log_download(self, download_data):
+        pass
+
+    @abstractmethod
+    def get_download_history(self, limit=100):
+        pass
+
+    @abstractmethod
+    def count_downloads(self, since=None):
+        pass
+
+    @abstractmethod
+    def save_analytics(self, username, analytics_data):
+        pass
+
+    @abstractmethod
+    def get_profile_analytics(self, username):
+        pass
+
+    @abstractmethod
+    def get_pool_stats(self):
+        pass
+
+    def close(self):
+        pass
+
+def _batches(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+class PoolMetrics(ConnectionPoolListener):
+    """Counts MongoClient connection pool events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {
+            'created': 0,
+            'closed': 0,
+            'checked_out': 0,
+            'checked_in': 0,
+            'checkout_failed': 0,
+            'pool_cleared': 0
+        }
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        self._count('pool_cleared')
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        self._count('created')
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        self._count('closed')
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        self._count('checkout_failed')
+
+    def connection_checked_out(self, event):
+        self._count('checked_out')
+
+    def connection_checked_in(self, event):
+        self._count('checked_in')
+
+    def get_stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        counts['open'] = counts['created'] - counts['closed']
+        counts['in_use'] = counts['checked_out'] - counts['checked_in']
+        return counts
+
+class MongoDB:
+    def __init__(self):
+        if MongoClient is None:
+            raise RuntimeError('pymongo is required for the Mongo storage backend')
+        self.metrics = PoolMetrics()
+        self.client = MongoClient(
+            config.Config.MONGO_URI,
+            maxPoolSize=config.Config.MODELS_POOL_SIZE,
+            minPoolSize=config.Config.MONGO_MIN_POOL_SIZE,
+            connectTimeoutMS=config.Config.MONGO_CONNECT_TIMEOUT_MS,
+            serverSelectionTimeoutMS=config.Config.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+            socketTimeoutMS=config.Config.MONGO_SOCKET_TIMEOUT_MS,
+            waitQueueTimeoutMS=config.Config.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+            event_listeners=[self.metrics]
+        )
+        self.db = self.client.igspyglass
+
+    # Profile Collections
+    def get_profiles_collection(self):
+        return self.db.profiles
+
+    def get_stories_collection(self):
+        return self.db.stories
+
+    def get_posts_collection(self):
+        return self.db.posts
+
+    def get_downloads_collection(self):
+        return self.db.downloads
+
+    def get_analytics_collection(self):
+        return self.db.analytics
+
+    def get_users_collection(self):
+        return self.db.users
+
+    def get_trigram_stats_collection(self):
+        return self.db.trigram_stats
+
+    def get_migrations_collection(self):
+        return self.db.migrations
+
+class MongoBackend(StorageBackend):
+    """Stores documents in MongoDB collections"""
+
+    def __init__(self):
+        self.db = MongoDB()
+        self._ensure_indexes()
+
+    def _ensure_indexes(self):
+        stories = self.db.get_stories_collection()
+        self.db.get_profiles_collection().create_index([('username', ASCENDING)], unique=True)
+        stories.create_index([('id', ASCENDING), ('username', ASCENDING)], unique=True)
+        stories.create_index([('username', ASCENDING), ('expires_at', ASCENDING)])
+        stories.create_index([('username', ASCENDING), ('timestamp', DESCENDING)])
+        try:
+            # The server deletes stories once expires_at has passed
+            stories.create_index([('expires_at', ASCENDING)], expireAfterSeconds=0)
+        except OperationFailure:
+            # An earlier plain index on expires_at has to be replaced
+            stories.drop_index([('expires_at', ASCENDING)])
+            stories.create_index([('expires_at', ASCENDING)], expireAfterSeconds=0)
+        self.db.get_downloads_collection().create_index([('downloaded_at', DESCENDING)])
+        self.db.get_analytics_collection().create_index([('username', ASCENDING)], unique=True)
+        self.db.get_profiles_collection().create_index([('search_trigrams.all', ASCENDING)])
+        self._migrate_search_index()
+
+    def _migrate_search_index(self):
+        """Index profiles saved before the trigram index existed, once per database"""
+        migrations = self.db.get_migrations_collection()
+        try:
+            # Claiming the marker first keeps concurrent starts from counting trigrams twice
+            migrations.insert_one({'_id': MONGO_TRIGRAM_MIGRATION, 'started_at': datetime.utcnow()})
+        except DuplicateKeyError:
+            return
+
+        try:
+            indexed = self._index_profiles({'search_trigrams': {'$exists': False}})
+        except Exception:
+            migrations.delete_one({'_id': MONGO_TRIGRAM_MIGRATION})
+            raise
+        migrations.update_one({'_id': MONGO_TRIGRAM_MIGRATION}, {'$set': {'applied_at': datetime.utcnow()}})
+        if indexed:
+            print(f"🔎 Indexed {indexed} existing profiles for search")
+
+    def _index_profiles(self, query):
+        """Refresh the stored trigrams of matching profiles and the trigram counts"""
+        profiles = self.db.get_profiles_collection()
+        fields = {field: 1 for field, _ in trigram.SEARCH_FIELDS}
+        fields['search_trigrams.all'] = 1
+
+        updates = []
+        counts = {}
+        for profile in profiles.find(query, fields):
+            grams = trigram.profile_trigrams(profile)
+            stored = {
+                trigram.SEARCH_FIELDS[index][0]: sorted(field_grams)
+                for index, field_grams in grams.items()
+            }
+            current = set().union(*grams.values())
+            stored['all'] = sorted(current)
+            previous = set(profile.get('search_trigrams', {}).get('all', []))
+
+            for gram in current - previous:
+                counts[gram] = counts.get(gram, 0) + 1
+            for gram in previous - current:
+                counts[gram] = counts.get(gram, 0) - 1
+            updates.append(UpdateOne({'_id': profile['_id']}, {'$set': {'search_trigrams': stored}}))
+
+        for batch in _batches(updates, config.Config.MODELS_BULK_BATCH_SIZE):
+            profiles.bulk_write(batch, ordered=False)
+
+        stats = [
+            UpdateOne({'_id': gram}, {'$inc': {'profiles': change}}, upsert=True)
+            for gram, change in counts.items() if change
+        ]
+        for batch in _batches(stats, config.Config.MODELS_BULK_BATCH_SIZE):
+            self.db.get_trigram_stats_collection().bulk_write(batch, ordered=False)
+        return len(updates)
+
+    def save_profile(self, profile_data):
+        result = self.db.get_profiles_collection().update_one(
+            {'username': profile_data['username']},
+            {'$set': profile_data},
+            upsert=True
+        )
+        self._index_profiles({'username': profile_data['username']})
+        return result.acknowledged
+
+    def save_profiles(self, profiles):
+        operations = [
+            UpdateOne({'username': profile['username']}, {'$set': profile}, upsert=True)
+            for profile in profiles
+        ]
+        for batch in _batches(operations, config.Config.MODELS_BULK_BATCH_SIZE):
+            self.db.get_profiles_collection().bulk_write(batch, ordered=False)
+        for batch in _batches([profile['username'] for profile in profiles], config.Config.MODELS_BULK_BATCH_SIZE):
+            self._index_profiles({'username': {'$in': batch}})
+        return len(operations)
+
+    def get_profile(self, username):
+        return self.db.get_profiles_collection().find_one({'username': username}, {'search_trigrams': 0})
+
+    def search_profiles(self, query, limit=50):
+        query_grams = trigram.trigrams(query)
+        if not query_grams:
+            return []
+
+        required = trigram.min_shared(query_grams, config.Config.PROFILE_SEARCH_MIN_SIMILARITY)
+        frequencies = {
+            stat['_id']: stat['profiles']
+            for stat in self.db.get_trigram_stats_collection().find({'_id': {'$in': list(query_grams)}})
+        }
+        profiles = self.db.get_profiles_collection()
+        # Rank by shared trigrams on the server, so the candidate limit keeps the best matches
+        candidates = list(profiles.aggregate([
+            {'$match': {
+                'search_trigrams.all': {'$in': trigram.candidate_trigrams(query_grams, frequencies, required)},
+                'is_active': True
+            }},
+            {'$addFields': {'search_overlap': {'$size': {'$setIntersection': ['$search_trigrams.all', sorted(query_grams)]}}}},
+            {'$match': {'search_overlap': {'$gte': required}}},
+            {'$sort': {'search_overlap': -1, 'username': 1}},
+            {'$limit': config.Config.PROFILE_SEARCH_MAX_CANDIDATES},
+            {'$project': {'search_overlap': 0}}
+        ]))
+
+        # Username prefixes are a cheap index range and keep short queries useful
+        prefix = query.strip().lower()
+        if prefix:
+            seen = {profile['_id'] for profile in candidates}
+            candidates.extend(
+                profile for profile in profiles.find({
+                    'username': {'$gte': prefix, '$lt': prefix[:-1] + chr(ord(prefix[-1]) + 1)},
+                    'is_active': True
+                }).limit(config.Config.PROFILE_SEARCH_MAX_CANDIDATES)
+                if profile['_id'] not in seen
+            )
+
+        ranked = []
+        for profile in candidates:
+            stored = profile.pop('search_trigrams', {})
+            shared_by_field = {
+                index: len(query_grams.intersection(stored.get(field, [])))
+                for index, (field, _) in enumerate(trigram.SEARCH_FIELDS)
+            }
+            if max(shared_by_field.values()) >= required:
+                profile['search_score'] = round(trigram.score(query, query_grams, profile.get('username'), shared_by_field), 4)
+                ranked.append(profile)
+
+        ranked.sort(key=lambda profile: (-profile['search_score'], profile.get('username', '')))
+        return ranked[:limit]
+
+    def rebuild_search_index(self):
+        self.db.get_trigram_stats_collection().delete_many({})
+        self.db.get_profiles_collection().update_many({}, {'$unset': {'search_trigrams': ''}})
+        return self._index_profiles({})
+
+    def save_stories(self, stories):
+        operations = [
+            UpdateOne({'id': story['id'], 'username': story['username']}, {'$set': story}, upsert=True)
+            for story in stories
+        ]
+        for batch in _batches(operations, config.Config.MODELS_BULK_BATCH_SIZE):
+            self.db.get_stories_collection().bulk_write(batch, ordered=False)
+        return len(operations)
+
+    def get_active_stories(self, username, now):
+        return list(self.db.get_stories_collection().find({
+            'username': username,
+            'expires_at': {'$gt': now}
+        }).sort('timestamp', DESCENDING))
+
+    def purge_expired_stories(self, now):
+        # Normally done by the TTL monitor; this forces it
+        return self.db.get_stories_collection().delete_many({'expires_at': {'$lte': now}}).deleted_count
+
+    def log_download(self, download_data):
+        return str(self.db.get_downloads_collection().insert_one(download_data).inserted_id)
+
+    def get_download_history(self, limit=100):
+        return list(self.db.get_downloads_collection().find().sort('downloaded_at', DESCENDING).limit(limit))
+
+    def count_downloads(self, since=None):
+        query = {'downloaded_at': {'$gte': since}} if since else {}
+        return self.db.get_downloads_collection().count_documents(query)
+
+    def save_analytics(self, username, analytics_data):
+        result = self.db.get_analytics_collection().update_one(
+            {'username': username},
+            {'$set': analytics_data},
+            upsert=True
+        )
+        return result.acknowledged
+
+    def get_profile_analytics(self, username):
+        return self.db.get_analytics_collection().find_one({'username': username})
+
+    def get_pool_stats(self):
+        return dict(self.db.metrics.get_stats(), max_pool_size=config.Config.MODELS_POOL_SIZE)
+
+    def close(self):
+        self.db.client.close()
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+SQLITE_MIGRATIONS = [
+    # 1: document tables with the queried fields as indexed columns
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS profiles (
+            username TEXT PRIMARY KEY,
+            is_active INTEGER NOT NULL DEFAULT 1,
+            last_updated TIMESTAMP,
+            data TEXT NOT NULL
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS stories (
+            id TEXT NOT NULL,
+            username TEXT NOT NULL,
+            timestamp TIMESTAMP,
+            expires_at TIMESTAMP,
+            data TEXT NOT NULL,
+            PRIMARY KEY (id, username)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_stories_username ON stories (username)',
+        'CREATE INDEX IF NOT EXISTS idx_stories_expires_at ON stories (expires_at)',
+        '''
+        CREATE TABLE IF NOT EXISTS downloads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT,
+            downloaded_at TIMESTAMP,
+            data TEXT NOT NULL
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_downloads_username ON downloads (username)',
+        'CREATE INDEX IF NOT EXISTS idx_downloads_downloaded_at ON downloads (downloaded_at)',
+        '''
+        CREATE TABLE IF NOT EXISTS analytics (
+            username TEXT PRIMARY KEY,
+            analyzed_at TIMESTAMP,
+            data TEXT NOT NULL
+        )
+        '''
+    ],
+    # 2: compound story indexes for active-story lookups and ordering
+    [
+        'DROP INDEX IF EXISTS idx_stories_username',
+        'CREATE INDEX IF NOT EXISTS idx_stories_username_expires_at ON stories (username, expires_at)',
+        'CREATE INDEX IF NOT EXISTS idx_stories_username_timestamp ON stories (username, timestamp)'
+    ],
+    # 3: trigram index for fuzzy profile search
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS profile_trigrams (
+            username TEXT NOT NULL,
+            field INTEGER NOT NULL,
+            trigram TEXT NOT NULL,
+            PRIMARY KEY (username, field, trigram)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_profile_trigrams_trigram ON profile_trigrams (trigram, username)',
+        '''
+        CREATE TABLE IF NOT EXISTS trigram_stats (
+            trigram TEXT PRIMARY KEY,
+            profiles INTEGER NOT NULL
+        ) WITHOUT ROWID
+        '''
+    ]
+]
+
+# Migration that created the trigram index; profiles saved before it are indexed once
+TRIGRAM_MIGRATION = 3
+
+# Marker document in the Mongo migrations collection for the same backfill
+MONGO_TRIGRAM_MIGRATION = 'search_trigrams'
+
+# One top-level field of a JSON document, as JSON text
+JSON_MEMBER_SQL = '''CASE type
+    WHEN 'text' THEN json_quote(value)
+    WHEN 'true' THEN 'true'
+    WHEN 'false' THEN 'false'
+    WHEN 'null' THEN 'null'
+    ELSE value
+END'''
+
+# Shallow merge of the incoming document into the stored one, like Mongo's
+# $set: json_patch would drop fields set to null and merge nested objects
+MERGE_DATA_SQL = f'''(
+        SELECT json_group_object(key, json(member)) FROM (
+            SELECT key, {JSON_MEMBER_SQL} AS member FROM json_each({{table}}.data)
+            WHERE key NOT IN (SELECT key FROM json_each(excluded.data))
+            UNION ALL
+            SELECT key, {JSON_MEMBER_SQL} FROM json_each(excluded.data)
+        )
+    )'''
+
+UPSERT_PROFILE_SQL = f'''
+    INSERT INTO profiles (username, is_active, last_updated, data)
+    VALUES (?, ?, ?, ?)
+    ON CONFLICT (username) DO UPDATE SET
+        is_active = excluded.is_active,
+        last_updated = excluded.last_updated,
+        data = {MERGE_DATA_SQL.format(table='profiles')}
+'''
+
+UPSERT_STORY_SQL = f'''
+    INSERT INTO stories (id, username, timestamp, expires_at, data)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (id, username) DO UPDATE SET
+        timestamp = excluded.timestamp,
+        expires_at = excluded.expires_at,
+        data = {MERGE_DATA_SQL.format(table='stories')}
+'''
+
+PURGE_STORIES_SQL = 'DELETE FROM stories WHERE expires_at <= ?'
+
+ACTIVE_STORIES_SQL = '''
+    SELECT data FROM stories
+    WHERE username = ? AND expires_at > ?
+    ORDER BY timestamp DESC
+'''
+
+SEARCH_FIELDS_SQL = '''
+    SELECT username, json_extract(data, '$.full_name'), json_extract(data, '$.bio')
+    FROM profiles WHERE username IN ({placeholders})
+'''
+
+PROFILE_TRIGRAMS_SQL = 'SELECT field, trigram FROM profile_trigrams WHERE username = ?'
+
+INSERT_TRIGRAM_SQL = 'INSERT OR IGNORE INTO profile_trigrams (username, field, trigram) VALUES (?, ?, ?)'
+
+DELETE_TRIGRAM_SQL = 'DELETE FROM profile_trigrams WHERE username = ? AND field = ? AND trigram = ?'
+
+COUNT_TRIGRAM_SQL = '''
+    INSERT INTO trigram_stats (trigram, profiles) VALUES (?, ?)
+    ON CONFLICT (trigram) DO UPDATE SET profiles = profiles + excluded.profiles
+'''
+
+TRIGRAM_STATS_SQL = 'SELECT trigram, profiles FROM trigram_stats WHERE trigram IN ({placeholders})'
+
+# Profiles hitting the most of the rarest query trigrams; the postings read are capped
+# Every posting of the rarest trigrams is counted, so the limit keeps the best overlap
+SEARCH_CANDIDATES_SQL = '''
+    SELECT t.username FROM profile_trigrams t
+    JOIN profiles p ON p.username = t.username AND p.is_active = 1
+    WHERE t.trigram IN ({placeholders})
+    GROUP BY t.username
+    ORDER BY COUNT(*) DESC, t.username
+    LIMIT ?
+'''
+
+PREFIX_CANDIDATES_SQL = 'SELECT username FROM profiles WHERE username >= ? AND username < ? AND is_active = 1 LIMIT ?'
+
+SHARED_TRIGRAMS_SQL = '''
+    SELECT username, field, COUNT(*) FROM profile_trigrams
+    WHERE username IN ({candidates}) AND trigram IN ({grams})
+    GROUP BY username, field
+'''
+
+ACTIVE_PROFILES_SQL = 'SELECT username, data FROM profiles WHERE is_active = 1 AND username IN ({placeholders})'
+
+UPSERT_ANALYTICS_SQL = f'''
+    INSERT INTO analytics (username, analyzed_at, data)
+    VALUES (?, ?, ?)
+    ON CONFLICT (username) DO UPDATE SET
+        analyzed_at = excluded.analyzed_at,
+        data = {MERGE_DATA_SQL.format(table='analytics')}
+'''
+
+def _placeholders(values):
+    return ', '.join('?' for _ in values)
+
+def _encode(document):
+    return json.dumps(document, default=lambda value: value.isoformat() if isinstance(value, datetime) else str(value))
+
+def _decode(data):
+    document = json.loads(data)
+    for field in DATETIME_FIELDS:
+        value = document.get(field)
+        if isinstance(value, str):
+            try:
+                document[field] = datetime.fromisoformat(value)
+            except ValueError:
+                pass
+    return document
+
+class SQLiteBackend(StorageBackend):
+    """Embedded backend: JSON documents in SQLite with indexed key columns.
+
+    Updates merge the top-level fields into the stored document, matching
+    Mongo's ``$set`` upserts. SQLite has no TTL indexes, so expired stories are
+    deleted by a purge that runs at most every MODELS_STORY_PURGE_INTERVAL
+    seconds when stories are written or read.
+    """
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or config.Config.MODELS_DB_PATH
+        self.pool = SQLiteConnectionPool(self.db_path, size=config.Config.MODELS_POOL_SIZE)
+        self._last_purge = 0
+        self._purge_lock = threading.Lock()
+        self._init_db()
+
+    def _init_db(self):
+        with self.pool.connection() as conn:
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+            for number, statements in enumerate(SQLITE_MIGRATIONS, start=1):
+                if number <= version:
+                    continue
+                for statement in statements:
+                    conn.execute(statement)
+                conn.execute(f'PRAGMA user_version = {number}')
+                conn.commit()
+                print(f"🔧 Applied models database migration {number}")
+
+        if version < TRIGRAM_MIGRATION:
+            indexed = self.rebuild_search_index()
+            if indexed:
+                print(f"🔎 Indexed {indexed} existing profiles for search")
+
+    def _index_profiles(self, conn, usernames):
+        """Bring the trigrams of ``usernames`` in line with their stored profiles"""
+        counts = {}
+        for batch in _batches(list(usernames), config.Config.MODELS_BULK_BATCH_SIZE):
+            rows = conn.execute(SEARCH_FIELDS_SQL.format(placeholders=_placeholders(batch)), batch).fetchall()
+            for username, full_name, bio in rows:
+                grams = trigram.profile_trigrams({'username': username, 'full_name': full_name, 'bio': bio})
+                current = {(index, gram) for index, field_grams in grams.items() for gram in field_grams}
+                previous = set(conn.execute(PROFILE_TRIGRAMS_SQL, (username,)).fetchall())
+                if current == previous:
+                    continue
+
+                conn.executemany(DELETE_TRIGRAM_SQL, [(username, index, gram) for index, gram in previous - current])
+                conn.executemany(INSERT_TRIGRAM_SQL, [(username, index, gram) for index, gram in current - previous])
+
+                # Counts are per profile, whichever fields contain the trigram
+                current_grams = {gram for _, gram in current}
+                previous_grams = {gram for _, gram in previous}
+                for gram in current_grams - previous_grams:
+                    counts[gram] = counts.get(gram, 0) + 1
+                for gram in previous_grams - current_grams:
+                    counts[gram] = counts.get(gram, 0) - 1
+
+        conn.executemany(COUNT_TRIGRAM_SQL, [(gram, change) for gram, change in counts.items() if change])
+
+    def _profile_row(self, profile_data):
+        return (
+            profile_data['username'],
+            int(profile_data.get('is_active', True)),
+            profile_data.get('last_updated'),
+            _encode(profile_data)
+        )
+
+    def save_profile(self, profile_data):
+        with self.pool.connection() as conn:
+            conn.execute(UPSERT_PROFILE_SQL, self._profile_row(profile_data))
+            self._index_profiles(conn, [profile_data['username']])
+        return True
+
+    def save_profiles(self, profiles):
+        rows = [self._profile_row(profile) for profile in profiles]
+        # One transaction per batch instead of one per profile
+        for batch in _batches(rows, config.Config.MODELS_BULK_BATCH_SIZE):
+            with self.pool.connection() as conn:
+                conn.executemany(UPSERT_PROFILE_SQL, batch)
+                self._index_profiles(conn, {row[0] for row in batch})
+        return len(rows)
+
+    def get_profile(self, username):
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT data FROM profiles WHERE username = ?', (username,)).fetchone()
+        return _decode(row[0]) if row else None
+
+    def search_profiles(self, query, limit=50):
+        query_grams = trigram.trigrams(query)
+        if not query_grams:
+            return []
+        grams = sorted(query_grams)
+        required = trigram.min_shared(query_grams, config.Config.PROFILE_SEARCH_MIN_SIMILARITY)
+
+        with self.pool.connection() as conn:
+            frequencies = dict(conn.execute(
+                TRIGRAM_STATS_SQL.format(placeholders=_placeholders(grams)), grams
+            ).fetchall())
+            rarest = trigram.candidate_trigrams(query_grams, frequencies, required)
+            candidates = {row[0] for row in conn.execute(
+                SEARCH_CANDIDATES_SQL.format(placeholders=_placeholders(rarest)),
+                rarest + [config.Config.PROFILE_SEARCH_MAX_CANDIDATES]
+            ).fetchall()}
+
+            # Username prefixes are a cheap primary key range and keep short queries useful
+            prefix = query.strip().lower()
+            if prefix:
+                candidates.update(row[0] for row in conn.execute(
+                    PREFIX_CANDIDATES_SQL,
+                    (prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1), config.Config.PROFILE_SEARCH_MAX_CANDIDATES)
+                ).fetchall())
+            if not candidates:
+                return []
+            candidates = list(candidates)
+
+            shared = {}
+            for username, field, count in conn.execute(
+                SHARED_TRIGRAMS_SQL.format(candidates=_placeholders(candidates), grams=_placeholders(grams)),
+                candidates + grams
+            ).fetchall():
+                shared.setdefault(username, {})[field] = count
+
+            scores = {
+                username: trigram.score(query, query_grams, username, shared_by_field)
+                for username, shared_by_field in shared.items()
+                if max(shared_by_field.values()) >= required
+            }
+            ranked = sorted(scores, key=lambda username: (-scores[username], username))
+
+            # Candidates are active, but one deactivated meanwhile must not cost a result slot
+            results = []
+            for start in range(0, len(ranked), limit):
+                batch = ranked[start:start + limit]
+                rows = dict(conn.execute(ACTIVE_PROFILES_SQL.format(placeholders=_placeholders(batch)), batch).fetchall())
+                for username in batch:
+                    if username in rows and len(results) < limit:
+                        profile = _decode(rows[username])
+                        profile['search_score'] = round(scores[username], 4)
+                        results.append(profile)
+                if len(results) >= limit:
+                    break
+        return results
+
+    def rebuild_search_index(self):
+        with self.pool.connection() as conn:
+            conn.execute('DELETE FROM profile_trigrams')
+            conn.execute('DELETE FROM trigram_stats')
+            usernames = [row[0] for row in conn.execute('SELECT username FROM profiles').fetchall()]
+            self._index_profiles(conn, usernames)
+        return len(usernames)
+
+    def save_stories(self, stories):
+        rows = [
+            (str(story['id']), story['username'], story.get('timestamp'), story.get('expires_at'), _encode(story))
+            for story in stories
+        ]
+        for batch in _batches(rows, config.Config.MODELS_BULK_BATCH_SIZE):
+            with self.pool.connection() as conn:
+                conn.executemany(UPSERT_STORY_SQL, batch)
+        self._purge_if_due()
+        return len(rows)
+
+    def get_active_stories(self, username, now):
+        self._purge_if_due()
+        with self.pool.connection() as conn:
+            rows = conn.execute(ACTIVE_STORIES_SQL, (username, now)).fetchall()
+        return [_decode(row[0]) for row in rows]
+
+    def purge_expired_stories(self, now):
+        with self.pool.connection() as conn:
+            return conn.execute(PURGE_STORIES_SQL, (now,)).rowcount
+
+    def _purge_if_due(self):
+        """Emulate a TTL index by purging expired stories periodically"""
+        with self._purge_lock:
+            if time.monotonic() - self._last_purge < config.Config.MODELS_STORY_PURGE_INTERVAL:
+                return
+            self._last_purge = time.monotonic()
+
+        try:
+            purged = self.purge_expired_stories(datetime.utcnow())
+            if purged:
+                print(f"🧹 Purged {purged} expired stories")
+        except Exception as e:
+            print(f"❌ Story purge error: {e}")
+
+    def log_download(self, download_data):
+        with self.pool.connection() as conn:
+            cursor = conn.execute(
+                'INSERT INTO downloads (username, downloaded_at, data) VALUES (?, ?, ?)',
+                (download_data.get('username'), download_data.get('downloaded_at'), _encode(download_data))
+            )
+        return str(cursor.lastrowid)
+
+    def get_download_history(self, limit=100):
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                'SELECT data FROM downloads ORDER BY downloaded_at DESC LIMIT ?', (limit,)
+            ).fetchall()
+        return [_decode(row[0]) for row in rows]
+
+    def count_downloads(self, since=None):
+        with self.pool.connection() as conn:
+            if since:
+                return conn.execute(
+                    'SELECT COUNT(*) FROM downloads WHERE downloaded_at >= ?', (since,)
+                ).fetchone()[0]
+            return conn.execute('SELECT COUNT(*) FROM downloads').fetchone()[0]
+
+    def save_analytics(self, username, analytics_data):
+        with self.pool.connection() as conn:
+            conn.execute(UPSERT_ANALYTICS_SQL, (
+                username, analytics_data.get('analyzed_at'), _encode(analytics_data)
+            ))
+        return True
+
+    def get_profile_analytics(self, username):
+        with self.pool.connection() as conn:
+            row = conn.execute('SELECT data FROM analytics WHERE username = ?', (username,)).fetchone()
+        return _decode(row[0]) if row else None
+
+    def get_pool_stats(self):
+        return self.pool.get_stats()
+
+    def close(self):
+        self.pool.close_all()
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'mongo': MongoBackend
+}
+
+def create_storage_backend(name=None):
+    """Create a new, unshared storage backend named by ``name`` or Config.MODELS_BACKEND"""
+    name = (name or config.Config.MODELS_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown storage backend: {name}")
+    return BACKENDS[name]()
+
+# One backend (and so one connection pool) per backend name and process
+_backends = {}
+_backends_lock = threading.Lock()
+_backends_pid = os.getpid()
+
+def _reset_after_fork():
+    """Drop backends inherited from the parent; their sockets are not fork-safe"""
+    global _backends, _backends_lock, _backends_pid
+    _backends = {}
+    _backends_lock = threading.Lock()
+    _backends_pid = os.getpid()
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+def get_storage_backend(name=None):
+    """Get the process-wide storage backend, creating it on first use"""
+    name = (name or config.Config.MODELS_BACKEND).lower()
+    if os.getpid() != _backends_pid:
+        _reset_after_fork()
+
+    with _backends_lock:
+        backend = _backends.get(name)
+        if backend is None:
+            backend = create_storage_backend(name)
+            _backends[name] = backend
+            print(f"🔌 Opened shared {name} storage backend (pool size {config.Config.MODELS_POOL_SIZE})")
+        return backend
+
+def get_pool_stats():
+    """Connection pool metrics of every backend opened in this process"""
+    with _backends_lock:
+        backends = dict(_backends)
+    return {name: backend.get_pool_stats() for name, backend in backends.items()}
+
+def close_storage_backends():
+    """Close the shared backends, e.g. on shutdown"""
+    with _backends_lock:
+        backends = list(_backends.values())
+        _backends.clear()
+    for backend in backends:
+        backend.close()
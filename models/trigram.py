@@ -0,0 +1,64 @@
+import math
+import re
+import unicodedata
+
+# Profile fields indexed for search, in stored field order, with their ranking weight
+SEARCH_FIELDS = (
+    ('username', 1.0),
+    ('full_name', 0.9),
+    ('bio', 0.6)
+)
+
+NON_WORD_PATTERN = re.compile(r'[\W_]+')
+
+def normalize(text):
+    """Lowercase, strip accents and split on anything that is not a letter or digit"""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(char for char in text if not unicodedata.combining(char))
+    return NON_WORD_PATTERN.sub(' ', text.lower()).strip()
+
+def trigrams(text):
+    """Set of padded word trigrams, e.g. 'ann' -> '  a', ' an', 'ann', 'nn '"""
+    grams = set()
+    for word in normalize(text).split():
+        padded = f"  {word} "
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def profile_trigrams(profile):
+    """Trigram sets of a profile's searchable fields, keyed by field index"""
+    return {
+        index: trigrams(profile.get(field))
+        for index, (field, _) in enumerate(SEARCH_FIELDS)
+    }
+
+def min_shared(query_grams, min_similarity):
+    """Trigrams a field must share with the query to reach ``min_similarity``"""
+    return max(1, math.ceil(len(query_grams) * min_similarity))
+
+def candidate_trigrams(query_grams, frequencies, required):
+    """The rarest query trigrams, enough that every match contains one of them.
+
+    A profile sharing ``required`` of the query's trigrams must contain at
+    least one of any ``len(query_grams) - required + 1`` of them, so only the
+    posting lists of the rarest ones have to be read.
+    """
+    ordered = sorted(query_grams, key=lambda gram: (frequencies.get(gram, 0), gram))
+    return ordered[:len(query_grams) - required + 1]
+
+def score(query, query_grams, username, shared_by_field):
+    """Rank a profile by the best weighted share of query trigrams in any field.
+
+    Exact and prefix username matches rank above fuzzy ones.
+    """
+    best = max(
+        (SEARCH_FIELDS[index][1] * shared / len(query_grams) for index, shared in shared_by_field.items()),
+        default=0
+    )
+    username = (username or '').lower()
+    query = query.strip().lower()
+    if username == query:
+        best += 1
+    elif username.startswith(query):
+        best += 0.5
+    return best
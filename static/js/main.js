@@ -102,14 +102,21 @@ function downloadMedia(type, url, username, id) {
   })
     .then((response) => response.json())
     .then((result) => {
-      if (result.success) {
+      if (!result.success) {
+        throw new Error(result.error || "Unknown error");
+      }
+      showAlert("Download queued...", "info");
+      return waitForDownloadJob(result.job_id);
+    })
+    .then((job) => {
+      if (job.status === "completed") {
         showAlert("Download completed successfully!", "success");
 
         // Trigger actual file download
-        if (result.filepath) {
+        if (job.result && job.result.filepath) {
           const link = document.createElement("a");
-          link.href = "/" + result.filepath;
-          link.download = result.filename;
+          link.href = "/" + job.result.filepath;
+          link.download = job.result.filename;
           link.style.display = "none";
           document.body.appendChild(link);
           link.click();
@@ -117,14 +124,14 @@ function downloadMedia(type, url, username, id) {
         }
       } else {
         showAlert(
-          "Download failed: " + (result.error || "Unknown error"),
+          "Download failed: " + (job.error || "Unknown error"),
           "danger"
         );
       }
     })
     .catch((error) => {
       console.error("Error:", error);
-      showAlert("Download failed: Network error", "danger");
+      showAlert("Download failed: " + (error.message || "Network error"), "danger");
     })
     .finally(() => {
       // Restore button state with smooth transition
@@ -136,6 +143,30 @@ function downloadMedia(type, url, username, id) {
     });
 }
 
+function waitForDownloadJob(jobId, interval = 1000) {
+  // Poll the job status endpoint until the download finishes
+  return new Promise((resolve, reject) => {
+    const poll = () => {
+      fetch(`/download/jobs/${jobId}`)
+        .then((response) => response.json())
+        .then((result) => {
+          if (!result.success) {
+            reject(new Error(result.error || "Job not found"));
+            return;
+          }
+          const job = result.job;
+          if (job.status === "completed" || job.status === "failed") {
+            resolve(job);
+          } else {
+            setTimeout(poll, interval);
+          }
+        })
+        .catch(reject);
+    };
+    poll();
+  });
+}
+
 function showAlert(message, type) {
   const alertDiv = document.createElement("div");
   alertDiv.className = `alert alert-${type} alert-dismissible fade show shadow-sm`;
@@ -197,33 +228,62 @@ function downloadAllPosts() {
 }
 
 function startBatchDownload(buttons, type) {
-  let downloaded = 0;
-  const total = buttons.length;
+  const items = [];
+  const seen = new Set();
+
+  buttons.forEach((button) => {
+    const item = batchItemFromButton(button);
+    const key = item && JSON.stringify([item.type, item.story_id || item.post_data.id]);
+    if (item && !seen.has(key)) {
+      seen.add(key);
+      items.push(item);
+    }
+  });
+
+  const total = items.length;
 
   if (total === 0) {
     showAlert(`No ${type} available to download.`, "warning");
     return;
   }
 
-  showAlert(`Starting batch download of ${total} ${type}...`, "info");
+  showAlert(`Preparing ZIP archive of ${total} ${type}...`, "info");
 
-  buttons.forEach((button, index) => {
-    setTimeout(() => {
-      button.click();
-      downloaded++;
+  // A regular form post lets the browser stream the archive straight to disk
+  const form = document.createElement("form");
+  form.method = "POST";
+  form.action = "/download/batch";
+  form.style.display = "none";
 
-      // Update progress
-      if (downloaded % 5 === 0 || downloaded === total) {
-        showAlert(`Downloaded ${downloaded} of ${total} ${type}...`, "info");
-      }
+  const input = document.createElement("input");
+  input.type = "hidden";
+  input.name = "items";
+  input.value = JSON.stringify(items);
+  form.appendChild(input);
 
-      if (downloaded === total) {
-        setTimeout(() => {
-          showAlert(`All ${type} download completed!`, "success");
-        }, 2000);
-      }
-    }, index * 1500); // 1.5 second delay between downloads
-  });
+  document.body.appendChild(form);
+  form.submit();
+  document.body.removeChild(form);
+}
+
+function batchItemFromButton(button) {
+  const { type, url, username, id } = button.dataset;
+
+  try {
+    if (type === "post") {
+      return {
+        type: "post",
+        post_data: JSON.parse(decodeURIComponent(url)),
+        username,
+      };
+    }
+    if (type === "story" && url && id) {
+      return { type: "story", url, username, story_id: id };
+    }
+  } catch (error) {
+    console.error("Invalid download button data:", error);
+  }
+  return null;
 }
 
 // Add smooth scrolling for anchor links
@@ -1,53 +1,191 @@
+import threading
 from datetime import datetime, timedelta
+import numpy as np
+from utils.analytics_engine import AnalyticsEngine, PostFrame, RunningAggregates
+from utils.analytics_store import AnalyticsStore
+from utils.caption_index import CaptionIndex
+from utils.timeseries import TimeSeriesStore
+import config
 
 class AnalyticsService:
     def __init__(self):
-        # No database dependency
-        pass
+        self.engine = AnalyticsEngine()
+        # Running per-profile aggregates, so each view only folds in new posts
+        self.store = AnalyticsStore()
+        # Searchable captions, hashtags and mentions of fetched posts
+        self.captions = CaptionIndex(self.store.pool)
+        # Follower and engagement history, one snapshot per profile fetch
+        self.timeseries = TimeSeriesStore()
+        
+        self._locks = {}
+        self._locks_lock = threading.Lock()
     
     def analyze_profile(self, profile_data, posts):
-        """Analyze profile engagement and performance"""
+        """Analyze profile engagement and performance.
+        
+        Every statistic comes from running aggregates that only new posts are
+        folded into, so a view costs as much as the fetched posts, not the
+        profile's history. Medians and percentiles are read from log-spaced
+        histograms; the rolling average and median gap cover the newest posts.
+        """
         try:
-            total_likes = 0
-            total_comments = 0
-            video_posts = 0
-            image_posts = 0
-            
-            for post in posts:
-                total_likes += post.get('likes', 0)
-                total_comments += post.get('comments', 0)
-                if post.get('is_video'):
-                    video_posts += 1
-                else:
-                    image_posts += 1
-            
-            total_posts = len(posts)
-            avg_likes = total_likes / total_posts if total_posts > 0 else 0
-            avg_comments = total_comments / total_posts if total_posts > 0 else 0
-            engagement_rate = ((avg_likes + avg_comments) / profile_data.get('followers', 1)) * 100 if profile_data.get('followers', 0) > 0 else 0
-            
-            analytics_data = {
-                'total_posts_analyzed': total_posts,
-                'total_likes': total_likes,
-                'total_comments': total_comments,
-                'average_likes': round(avg_likes, 2),
-                'average_comments': round(avg_comments, 2),
-                'engagement_rate': round(engagement_rate, 2),
-                'video_posts_count': video_posts,
-                'image_posts_count': image_posts,
-                'video_percentage': round((video_posts / total_posts) * 100, 2) if total_posts > 0 else 0,
+            followers = profile_data.get('followers', 0)
+            frame = PostFrame(posts)
+            
+            username = profile_data.get('username')
+            if username and posts and all(str(post.get('id', '')).isdigit() for post in posts):
+                analytics_data = self._analyze_incremental(username, frame, followers)
+            else:
+                analytics_data = self.engine.analyze(frame, followers)
+            
+            analytics_data.update({
                 'last_post_date': posts[0].get('timestamp') if posts else None,
                 'followers_count': profile_data.get('followers', 0),
                 'following_count': profile_data.get('following', 0)
-            }
+            })
             
-            # No database saving
+            self.record_snapshot(
+                profile_data,
+                analytics_data['engagement_rate'] if posts else None
+            )
             return analytics_data
             
         except Exception as e:
             print(f"Error analyzing profile: {e}")
             return {}
     
-    def get_profile_analytics(self, username):
-        """Get saved analytics for a profile - now returns empty"""
-        return {}
+    def _analyze_incremental(self, username, frame, followers):
+        aggregates, mode, folded = self._update_aggregates(username, frame)
+        
+        analytics_data = aggregates.summary(followers)
+        analytics_data.update({
+            'analysis_mode': mode,
+            'posts_folded': folded,
+            'posts_in_window': len(frame)
+        })
+        return analytics_data
+    
+    def _update_aggregates(self, username, frame):
+        """Fold unseen posts into the saved aggregates and update the counts of folded ones.
+        
+        Only the stored rows of the fetched posts are read. If the engagement of
+        folded posts moved more than ANALYTICS_DRIFT_THRESHOLD, or the saved
+        state predates the current layout, the aggregates are rebuilt from every
+        stored post instead. Returns the aggregates, the analysis mode and the
+        number of posts folded.
+        """
+        with self._locks_lock:
+            lock = self._locks.setdefault(username, threading.Lock())
+        
+        with lock:
+            state = self.store.get_aggregates(username)
+            aggregates = RunningAggregates(state)
+            mode = 'incremental' if state else 'full'
+            
+            # First occurrence of each post id
+            positions = {}
+            for index in range(len(frame)):
+                positions.setdefault(str(frame.posts[index]['id']), index)
+            fetched = [_post_row(frame, index) for index in positions.values()]
+            stored = {post['id']: post for post in self.store.get_posts(username, positions)} if state else {}
+            
+            unseen = [positions[post['id']] for post in fetched if post['id'] not in stored]
+            changed = [
+                positions[post['id']] for post in fetched
+                if post['id'] in stored and (
+                    stored[post['id']]['likes'] != post['likes'] or stored[post['id']]['comments'] != post['comments']
+                )
+            ]
+            previous = [stored[str(frame.posts[index]['id'])] for index in changed]
+            
+            rebuild = bool(state) and state.get('version') != RunningAggregates.VERSION
+            before = sum(post['likes'] + post['comments'] for post in previous)
+            after = int(frame.engagement[changed].sum()) if changed else 0
+            drift = abs(after - before) / before if before else 0.0
+            if drift > config.Config.ANALYTICS_DRIFT_THRESHOLD:
+                print(f"🔄 Engagement of {username}'s posts moved {drift:.0%}, rebuilding analytics from stored posts")
+                rebuild = True
+            
+            if rebuild:
+                # Stored rows carry no media fields, so fetched posts are folded as fetched
+                population = {post['id']: post for post in self.store.get_posts(username)}
+                population.update((post_id, frame.posts[index]) for post_id, index in positions.items())
+                population = PostFrame(list(population.values()))
+                
+                previous_best = aggregates.best_post
+                aggregates = RunningAggregates()
+                aggregates.fold(population, range(len(population)))
+                best_id = aggregates.best_post['id']
+                if previous_best and previous_best['id'] == best_id and best_id not in positions:
+                    aggregates.best_post['post'] = previous_best['post']
+                mode, folded = 'full', len(population)
+            else:
+                folded = len(unseen)
+                aggregates.fold(frame, unseen)
+                aggregates.adjust(
+                    frame, changed,
+                    [post['likes'] for post in previous],
+                    [post['comments'] for post in previous]
+                )
+            
+            if mode == 'full' or unseen or changed:
+                self.store.save_aggregates(username, aggregates.to_dict(), fetched)
+            
+            return aggregates, mode, folded
+    
+    def index_posts(self, username, posts):
+        """Add fetched posts' captions, hashtags and mentions to the search index"""
+        return self.captions.index_posts(username, posts)
+    
+    def search_captions(self, query, username=None, limit=20):
+        """Full-text search over indexed captions, best matches first"""
+        return self.captions.search(query, username, limit)
+    
+    def get_tag_frequency(self, kind='hashtag', username=None, limit=20):
+        """Most used hashtags or mentions"""
+        return self.captions.tag_frequency(kind, username, limit)
+    
+    def get_tag_cooccurrence(self, tag, username=None, limit=20):
+        """Hashtags used together with ``tag``"""
+        return self.captions.tag_cooccurrence(tag, username, limit)
+    
+    def record_snapshot(self, profile_data, engagement_rate=None):
+        """Append the profile's current counts to its history"""
+        if not profile_data or profile_data.get('is_limited_data'):
+            return False
+        try:
+            return self.timeseries.append(
+                profile_data.get('username'),
+                followers=profile_data.get('followers', 0),
+                following=profile_data.get('following', 0),
+                posts=profile_data.get('posts_count', 0),
+                engagement_rate=engagement_rate
+            )
+        except Exception as e:
+            print(f"Error recording profile snapshot: {e}")
+            return False
+    
+    def get_profile_analytics(self, username, start=None, end=None, resolution=None):
+        """Get the stored follower and engagement history of a profile"""
+        if start is None and end is None:
+            start = datetime.now() - timedelta(days=config.Config.TIMESERIES_DEFAULT_RANGE_DAYS)
+        try:
+            return self.timeseries.query(username, start, end, resolution)
+        except ValueError:
+            raise
+        except Exception as e:
+            print(f"Error loading profile history: {e}")
+            return {}
+
+def _post_row(frame, index):
+    """The fields of a fetched post that are stored alongside the aggregates"""
+    post = frame.posts[index]
+    timestamp = frame.timestamps[index]
+    return {
+        'id': str(post['id']),
+        'shortcode': post.get('shortcode'),
+        'likes': int(frame.likes[index]),
+        'comments': int(frame.comments[index]),
+        'is_video': bool(frame.is_video[index]),
+        'timestamp': None if np.isnat(timestamp) else str(timestamp)
+    }
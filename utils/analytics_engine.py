@@ -0,0 +1,549 @@
+from datetime import datetime
+import numpy as np
+import config
+
+WEEKDAY_LABELS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+
+def hours_and_weekdays(times):
+    """Hour of day and weekday (Monday = 0) of datetime64 values"""
+    days = times.astype('datetime64[D]')
+    hours = (times.astype('datetime64[h]') - days).astype(np.int64)
+    # 1970-01-01 was a Thursday
+    weekdays = (days.astype(np.int64) + 3) % 7
+    return hours, weekdays
+
+def _to_datetime(value):
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, (int, float)):
+        return datetime.fromtimestamp(value)
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    return None
+
+class PostFrame:
+    """Column arrays of the post fields used by analytics"""
+
+    def __init__(self, posts):
+        self.posts = posts
+        count = len(posts)
+        self.likes = np.fromiter((post.get('likes') or 0 for post in posts), dtype=np.int64, count=count)
+        self.comments = np.fromiter((post.get('comments') or 0 for post in posts), dtype=np.int64, count=count)
+        self.is_video = np.fromiter((bool(post.get('is_video')) for post in posts), dtype=bool, count=count)
+
+        # Wall-clock times; NaT where a post has no timestamp
+        self.timestamps = np.array(
+            [_to_datetime(post.get('timestamp')) or np.datetime64('NaT') for post in posts],
+            dtype='datetime64[s]'
+        ) if count else np.array([], dtype='datetime64[s]')
+
+    def __len__(self):
+        return len(self.posts)
+
+    @property
+    def engagement(self):
+        return self.likes + self.comments
+
+class AnalyticsEngine:
+    """Vectorized engagement analytics over a profile's posts.
+
+    Posts are loaded into NumPy columns once; every statistic is then
+    computed with array operations instead of a Python loop per post.
+    """
+
+    def __init__(self, rolling_window=None, percentiles=(25, 50, 75, 90), histogram_bins=10):
+        self.rolling_window = rolling_window or config.Config.ANALYTICS_ROLLING_WINDOW
+        self.percentiles = percentiles
+        self.histogram_bins = histogram_bins
+
+    def analyze(self, posts, followers=0):
+        """Compute summary, distribution, rolling, cadence and timing statistics"""
+        frame = posts if isinstance(posts, PostFrame) else PostFrame(posts)
+        result = self.summary(frame, followers)
+        if len(frame):
+            result.update(self.distribution(frame))
+            result.update(self.rolling_engagement(frame))
+            result.update(self.cadence(frame))
+            result.update(self.timing(frame))
+        return result
+
+    def summary(self, frame, followers=0):
+        total = len(frame)
+        video_count = int(frame.is_video.sum())
+        total_likes = int(frame.likes.sum())
+        total_comments = int(frame.comments.sum())
+
+        avg_likes = total_likes / total if total else 0
+        avg_comments = total_comments / total if total else 0
+        engagement_rate = (avg_likes + avg_comments) / followers * 100 if followers > 0 else 0
+
+        most_engaged = frame.posts[int(np.argmax(frame.engagement))] if total else None
+
+        return {
+            'total_posts_analyzed': total,
+            'total_likes': total_likes,
+            'total_comments': total_comments,
+            'average_likes': round(avg_likes, 2),
+            'average_comments': round(avg_comments, 2),
+            'engagement_rate': round(engagement_rate, 2),
+            'video_posts_count': video_count,
+            'image_posts_count': total - video_count,
+            'video_percentage': round(video_count / total * 100, 2) if total else 0,
+            'most_engaged_post': most_engaged
+        }
+
+    def distribution(self, frame):
+        """Medians, percentiles, a histogram and IQR outliers of engagement"""
+        engagement = frame.engagement
+        values = np.percentile(engagement, self.percentiles)
+        q1, q3 = np.percentile(engagement, [25, 75])
+        spread = q3 - q1
+        low, high = q1 - 1.5 * spread, q3 + 1.5 * spread
+
+        outliers = np.flatnonzero((engagement < low) | (engagement > high))
+        outliers = outliers[np.argsort(-engagement[outliers])]
+        counts, edges = np.histogram(engagement, bins=self.histogram_bins)
+
+        result = {
+            'median_likes': float(np.median(frame.likes)),
+            'median_comments': float(np.median(frame.comments)),
+            'median_engagement': float(np.median(engagement)),
+            'engagement_std': round(float(engagement.std()), 2),
+            'engagement_percentiles': {
+                f"p{percentile}": round(float(value), 2)
+                for percentile, value in zip(self.percentiles, values)
+            },
+            'engagement_histogram': {
+                'counts': counts.tolist(),
+                'edges': [round(float(edge), 2) for edge in edges]
+            },
+            'outlier_posts': [
+                {
+                    'id': frame.posts[index].get('id'),
+                    'shortcode': frame.posts[index].get('shortcode'),
+                    'engagement': int(engagement[index]),
+                    'direction': 'high' if engagement[index] > high else 'low'
+                }
+                for index in outliers
+            ]
+        }
+
+        if frame.is_video.any() and not frame.is_video.all():
+            result['average_engagement_video'] = round(float(engagement[frame.is_video].mean()), 2)
+            result['average_engagement_image'] = round(float(engagement[~frame.is_video].mean()), 2)
+
+        return result
+
+    def _dated(self, frame):
+        """Indexes of posts with a timestamp, oldest first"""
+        dated = np.flatnonzero(~np.isnat(frame.timestamps))
+        return dated[np.argsort(frame.timestamps[dated], kind='stable')]
+
+    def rolling_engagement(self, frame):
+        """Moving average of engagement over the last ``rolling_window`` posts"""
+        order = self._dated(frame)
+        if not len(order):
+            return {}
+
+        engagement = frame.engagement[order].astype(np.float64)
+        window = min(self.rolling_window, len(engagement))
+        cumulative = np.concatenate(([0.0], np.cumsum(engagement)))
+        rolling = (cumulative[window:] - cumulative[:-window]) / window
+
+        return {
+            'rolling_window': window,
+            'rolling_engagement': {
+                'labels': np.datetime_as_string(frame.timestamps[order][window - 1:], unit='D').tolist(),
+                'values': np.round(rolling, 2).tolist()
+            }
+        }
+
+    def cadence(self, frame):
+        """Posting frequency and the gaps between consecutive posts"""
+        order = self._dated(frame)
+        times = frame.timestamps[order]
+        if len(times) < 2:
+            return {'post_frequency': 'Unknown'}
+
+        gaps = np.diff(times).astype(np.float64) / 3600
+        span_days = max((times[-1] - times[0]).astype(np.float64) / 86400, 1 / 24)
+        per_week = (len(times) - 1) / span_days * 7
+
+        return {
+            'posts_per_week': round(per_week, 2),
+            'post_frequency': f"{per_week:.1f} posts/week",
+            'median_gap_hours': round(float(np.median(gaps)), 2),
+            'average_gap_hours': round(float(gaps.mean()), 2),
+            'longest_gap_hours': round(float(gaps.max()), 2)
+        }
+
+    def timing(self, frame):
+        """Post counts and average engagement by hour of day and day of week"""
+        order = self._dated(frame)
+        if not len(order):
+            return {}
+
+        engagement = frame.engagement[order]
+        hours, weekdays = hours_and_weekdays(frame.timestamps[order])
+
+        hour_counts = np.bincount(hours, minlength=24)
+        hour_engagement = np.bincount(hours, weights=engagement, minlength=24)
+        day_counts = np.bincount(weekdays, minlength=7)
+        day_engagement = np.bincount(weekdays, weights=engagement, minlength=7)
+
+        return timing_summary(hour_counts, hour_engagement, day_counts, day_engagement)
+
+def timing_summary(hour_counts, hour_engagement, day_counts, day_engagement):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        hour_average = np.where(hour_counts, hour_engagement / hour_counts, 0)
+        day_average = np.where(day_counts, day_engagement / day_counts, 0)
+
+    return {
+        'posts_by_hour': np.asarray(hour_counts).tolist(),
+        'engagement_by_hour': np.round(hour_average, 2).tolist(),
+        'posts_by_weekday': np.asarray(day_counts).tolist(),
+        'engagement_by_weekday': np.round(day_average, 2).tolist(),
+        'weekday_labels': WEEKDAY_LABELS,
+        'best_hour': int(np.argmax(hour_average)),
+        'best_weekday': WEEKDAY_LABELS[int(np.argmax(day_average))]
+    }
+
+# Engagement histograms use log-spaced bins, BINS_PER_DOUBLING to each doubling
+# of the count, so percentiles stay within a few percent at any scale
+BINS_PER_DOUBLING = 8
+
+def log_bins(values):
+    """Histogram bin of each non-negative count"""
+    return np.floor(np.log2(np.asarray(values, dtype=np.float64) + 1) * BINS_PER_DOUBLING).astype(np.int64)
+
+def bin_edges(index):
+    """Lower and upper count bounds of a log-spaced bin"""
+    return 2 ** (index / BINS_PER_DOUBLING) - 1, 2 ** ((index + 1) / BINS_PER_DOUBLING) - 1
+
+def binned_percentile(bins, percentile):
+    """Approximate percentile of the counts in ``bins`` ({bin: count}), interpolated within a bin"""
+    total = sum(bins.values())
+    if not total:
+        return 0.0
+
+    rank = percentile / 100 * total
+    seen = 0
+    for index in sorted(bins):
+        count = bins[index]
+        if count and seen + count >= rank:
+            low, high = bin_edges(index)
+            if high - low < 1:
+                # Narrow bins hold at most one whole number
+                return float(np.ceil(low))
+            return low + (high - low) * (rank - seen) / count
+        seen += count
+    return bin_edges(max(bins))[1]
+
+class RunningAggregates:
+    """Per-profile running state that new posts can be folded into.
+
+    Holds counts, sums and sums of squares of likes/comments, log-spaced
+    histograms of the counts (for medians and percentiles), hour and weekday
+    histograms and the posting time range of the posts folded so far. Only
+    bounded post-level state is kept: the newest ANALYTICS_RECENT_POSTS dated
+    posts for the rolling average and gap median, the highest and lowest
+    ANALYTICS_OUTLIER_CANDIDATES posts for outliers, and the most engaged post.
+    When a folded post's counts change, ``adjust`` swaps its old counts for
+    the new ones.
+    """
+
+    # Bumped when the state layout changes; older states are rebuilt from stored posts
+    VERSION = 2
+
+    def __init__(self, state=None):
+        state = state or {}
+        self.count = state.get('count', 0)
+        self.video_count = state.get('video_count', 0)
+        self.like_sum = state.get('like_sum', 0)
+        self.comment_sum = state.get('comment_sum', 0)
+        self.video_engagement_sum = state.get('video_engagement_sum', 0)
+        self.engagement_sq_sum = state.get('engagement_sq_sum', 0.0)
+        self.like_bins = {int(index): count for index, count in state.get('like_bins', {}).items()}
+        self.comment_bins = {int(index): count for index, count in state.get('comment_bins', {}).items()}
+        self.engagement_bins = {int(index): count for index, count in state.get('engagement_bins', {}).items()}
+        self.hour_counts = np.array(state.get('hour_counts', [0] * 24), dtype=np.int64)
+        self.hour_engagement = np.array(state.get('hour_engagement', [0] * 24), dtype=np.float64)
+        self.weekday_counts = np.array(state.get('weekday_counts', [0] * 7), dtype=np.int64)
+        self.weekday_engagement = np.array(state.get('weekday_engagement', [0] * 7), dtype=np.float64)
+        self.dated_count = state.get('dated_count', 0)
+        self.first_timestamp = state.get('first_timestamp')
+        self.last_timestamp = state.get('last_timestamp')
+        self.longest_gap = state.get('longest_gap', 0)
+        # [timestamp, engagement, post id], oldest first
+        self.recent = state.get('recent', [])
+        # [engagement, post id, shortcode], highest and lowest first
+        self.top_posts = state.get('top_posts', [])
+        self.bottom_posts = state.get('bottom_posts', [])
+        # {'id', 'engagement', 'post'}; 'post' is the post as it was fetched
+        self.best_post = state.get('best_post')
+
+    def to_dict(self):
+        return {
+            'version': self.VERSION,
+            'count': self.count,
+            'video_count': self.video_count,
+            'like_sum': self.like_sum,
+            'comment_sum': self.comment_sum,
+            'video_engagement_sum': self.video_engagement_sum,
+            'engagement_sq_sum': self.engagement_sq_sum,
+            'like_bins': self.like_bins,
+            'comment_bins': self.comment_bins,
+            'engagement_bins': self.engagement_bins,
+            'hour_counts': self.hour_counts.tolist(),
+            'hour_engagement': self.hour_engagement.tolist(),
+            'weekday_counts': self.weekday_counts.tolist(),
+            'weekday_engagement': self.weekday_engagement.tolist(),
+            'dated_count': self.dated_count,
+            'first_timestamp': self.first_timestamp,
+            'last_timestamp': self.last_timestamp,
+            'longest_gap': self.longest_gap,
+            'recent': self.recent,
+            'top_posts': self.top_posts,
+            'bottom_posts': self.bottom_posts,
+            'best_post': self.best_post
+        }
+
+    def fold(self, frame, indexes):
+        """Add the posts at ``indexes`` of ``frame`` to the totals"""
+        indexes = np.asarray(indexes, dtype=np.int64)
+        if not len(indexes):
+            return
+
+        likes = frame.likes[indexes]
+        comments = frame.comments[indexes]
+        engagement = likes + comments
+
+        self.count += len(indexes)
+        self.video_count += int(frame.is_video[indexes].sum())
+        self.like_sum += int(likes.sum())
+        self.comment_sum += int(comments.sum())
+        self.video_engagement_sum += int(engagement[frame.is_video[indexes]].sum())
+        self.engagement_sq_sum += float(np.square(engagement.astype(np.float64)).sum())
+        _count_bins(self.like_bins, likes, 1)
+        _count_bins(self.comment_bins, comments, 1)
+        _count_bins(self.engagement_bins, engagement, 1)
+
+        times = frame.timestamps[indexes]
+        dated = ~np.isnat(times)
+        if dated.any():
+            times = times[dated]
+            hours, weekdays = hours_and_weekdays(times)
+            self.hour_counts += np.bincount(hours, minlength=24)
+            self.hour_engagement += np.bincount(hours, weights=engagement[dated], minlength=24)
+            self.weekday_counts += np.bincount(weekdays, minlength=7)
+            self.weekday_engagement += np.bincount(weekdays, weights=engagement[dated], minlength=7)
+
+            seconds = np.sort(times.astype(np.int64))
+            if self.last_timestamp is None:
+                runs = [seconds]
+            else:
+                # Gaps are only measured beyond the folded time range; posts inside it keep the longest gap
+                runs = [
+                    np.concatenate((seconds[seconds < self.first_timestamp], [self.first_timestamp])),
+                    np.concatenate(([self.last_timestamp], seconds[seconds > self.last_timestamp]))
+                ]
+                seconds = np.concatenate(([self.first_timestamp, self.last_timestamp], seconds))
+            for run in runs:
+                if len(run) > 1:
+                    self.longest_gap = max(self.longest_gap, int(np.diff(run).max()))
+            self.first_timestamp = int(seconds.min())
+            self.last_timestamp = int(seconds.max())
+            self.dated_count += int(dated.sum())
+
+        self._track(frame, indexes)
+
+    def adjust(self, frame, indexes, likes, comments):
+        """Replace the folded ``likes``/``comments`` of the posts at ``indexes`` with their counts in ``frame``"""
+        indexes = np.asarray(indexes, dtype=np.int64)
+        if not len(indexes):
+            return
+
+        likes = np.asarray(likes, dtype=np.int64)
+        comments = np.asarray(comments, dtype=np.int64)
+        before = (likes + comments).astype(np.float64)
+        after = frame.engagement[indexes].astype(np.float64)
+
+        self.like_sum += int((frame.likes[indexes] - likes).sum())
+        self.comment_sum += int((frame.comments[indexes] - comments).sum())
+        self.video_engagement_sum += int((after - before)[frame.is_video[indexes]].sum())
+        self.engagement_sq_sum += float((np.square(after) - np.square(before)).sum())
+        _count_bins(self.like_bins, likes, -1)
+        _count_bins(self.like_bins, frame.likes[indexes], 1)
+        _count_bins(self.comment_bins, comments, -1)
+        _count_bins(self.comment_bins, frame.comments[indexes], 1)
+        _count_bins(self.engagement_bins, likes + comments, -1)
+        _count_bins(self.engagement_bins, frame.engagement[indexes], 1)
+
+        times = frame.timestamps[indexes]
+        dated = ~np.isnat(times)
+        if dated.any():
+            hours, weekdays = hours_and_weekdays(times[dated])
+            delta = (after - before)[dated]
+            self.hour_engagement += np.bincount(hours, weights=delta, minlength=24)
+            self.weekday_engagement += np.bincount(weekdays, weights=delta, minlength=7)
+
+        self._track(frame, indexes)
+
+    def _track(self, frame, indexes):
+        """Update the bounded post-level state with the current counts of the posts at ``indexes``"""
+        ids = {str(frame.posts[index]['id']) for index in indexes}
+
+        recent = [entry for entry in self.recent if entry[2] not in ids]
+        recent.extend(
+            [int(frame.timestamps[index].astype(np.int64)), int(frame.engagement[index]), str(frame.posts[index]['id'])]
+            for index in indexes if not np.isnat(frame.timestamps[index])
+        )
+        recent.sort()
+        self.recent = recent[-config.Config.ANALYTICS_RECENT_POSTS:]
+
+        candidates = [entry for entry in self.top_posts + self.bottom_posts if entry[1] not in ids]
+        candidates.extend(
+            [int(frame.engagement[index]), str(frame.posts[index]['id']), frame.posts[index].get('shortcode')]
+            for index in indexes
+        )
+        candidates = list({entry[1]: entry for entry in candidates}.values())
+        limit = config.Config.ANALYTICS_OUTLIER_CANDIDATES
+        self.top_posts = sorted(candidates, key=lambda entry: (-entry[0], entry[1]))[:limit]
+        self.bottom_posts = sorted(candidates, key=lambda entry: (entry[0], entry[1]))[:limit]
+
+        positions = {str(frame.posts[index]['id']): index for index in indexes}
+        if self.best_post is not None and self.best_post['id'] in positions:
+            # Refresh the best post first; if it lost engagement it keeps its place until a fetched post beats it
+            index = positions[self.best_post['id']]
+            self.best_post.update(engagement=int(frame.engagement[index]), post=frame.posts[index])
+        index = max(indexes.tolist(), key=lambda index: frame.engagement[index])
+        if self.best_post is None or frame.engagement[index] > self.best_post['engagement']:
+            self.best_post = {
+                'id': str(frame.posts[index]['id']),
+                'engagement': int(frame.engagement[index]),
+                'post': frame.posts[index]
+            }
+
+    def distribution(self):
+        """Medians, percentiles, a histogram and IQR outliers, from the count histograms"""
+        percentiles = (25, 50, 75, 90)
+        q1 = binned_percentile(self.engagement_bins, 25)
+        q3 = binned_percentile(self.engagement_bins, 75)
+        spread = q3 - q1
+        low, high = q1 - 1.5 * spread, q3 + 1.5 * spread
+
+        # One histogram bar per doubling of engagement
+        doublings = {}
+        for index, count in self.engagement_bins.items():
+            if count:
+                doublings[index // BINS_PER_DOUBLING] = doublings.get(index // BINS_PER_DOUBLING, 0) + count
+        span = range(min(doublings), max(doublings) + 1) if doublings else range(0)
+
+        outliers = [
+            {'id': entry[1], 'shortcode': entry[2], 'engagement': entry[0], 'direction': 'high'}
+            for entry in self.top_posts if entry[0] > high
+        ] + [
+            {'id': entry[1], 'shortcode': entry[2], 'engagement': entry[0], 'direction': 'low'}
+            for entry in self.bottom_posts if entry[0] < low
+        ]
+
+        result = {
+            'median_likes': round(binned_percentile(self.like_bins, 50), 2),
+            'median_comments': round(binned_percentile(self.comment_bins, 50), 2),
+            'median_engagement': round(binned_percentile(self.engagement_bins, 50), 2),
+            'engagement_percentiles': {
+                f"p{percentile}": round(binned_percentile(self.engagement_bins, percentile), 2)
+                for percentile in percentiles
+            },
+            'engagement_histogram': {
+                'counts': [doublings.get(doubling, 0) for doubling in span],
+                'edges': [2 ** doubling - 1 for doubling in span] + ([2 ** span[-1] * 2 - 1] if span else [])
+            },
+            'outlier_posts': outliers
+        }
+
+        image_count = self.count - self.video_count
+        if self.video_count and image_count:
+            result['average_engagement_video'] = round(self.video_engagement_sum / self.video_count, 2)
+            result['average_engagement_image'] = round(
+                (self.like_sum + self.comment_sum - self.video_engagement_sum) / image_count, 2
+            )
+
+        return result
+
+    def recent_activity(self):
+        """Rolling engagement average and median posting gap of the newest posts"""
+        if not self.recent:
+            return {}
+
+        engagement = np.array([entry[1] for entry in self.recent], dtype=np.float64)
+        window = min(config.Config.ANALYTICS_ROLLING_WINDOW, len(engagement))
+        cumulative = np.concatenate(([0.0], np.cumsum(engagement)))
+        rolling = (cumulative[window:] - cumulative[:-window]) / window
+        seconds = np.array([entry[0] for entry in self.recent], dtype=np.int64)
+
+        result = {
+            'rolling_window': window,
+            'rolling_engagement': {
+                'labels': np.datetime_as_string(seconds[window - 1:].astype('datetime64[s]'), unit='D').tolist(),
+                'values': np.round(rolling, 2).tolist()
+            }
+        }
+        if len(seconds) > 1:
+            result['median_gap_hours'] = round(float(np.median(np.diff(seconds))) / 3600, 2)
+        return result
+
+    def summary(self, followers=0):
+        """Every reported statistic, over the folded posts"""
+        total = self.count
+        avg_likes = self.like_sum / total if total else 0
+        avg_comments = self.comment_sum / total if total else 0
+        mean_engagement = avg_likes + avg_comments
+        variance = self.engagement_sq_sum / total - mean_engagement ** 2 if total else 0
+
+        result = {
+            'total_posts_analyzed': total,
+            'total_likes': self.like_sum,
+            'total_comments': self.comment_sum,
+            'average_likes': round(avg_likes, 2),
+            'average_comments': round(avg_comments, 2),
+            'engagement_rate': round(mean_engagement / followers * 100, 2) if followers > 0 else 0,
+            'engagement_std': round(float(np.sqrt(max(variance, 0))), 2),
+            'video_posts_count': self.video_count,
+            'image_posts_count': total - self.video_count,
+            'video_percentage': round(self.video_count / total * 100, 2) if total else 0,
+            'most_engaged_post': self.best_post['post'] if self.best_post else None
+        }
+
+        if total:
+            result.update(self.distribution())
+        result.update(self.recent_activity())
+
+        if self.dated_count:
+            result.update(timing_summary(
+                self.hour_counts, self.hour_engagement, self.weekday_counts, self.weekday_engagement
+            ))
+
+        if self.dated_count > 1:
+            span = self.last_timestamp - self.first_timestamp
+            per_week = (self.dated_count - 1) / max(span / 86400, 1 / 24) * 7
+            result.update({
+                'posts_per_week': round(per_week, 2),
+                'post_frequency': f"{per_week:.1f} posts/week",
+                'average_gap_hours': round(span / (self.dated_count - 1) / 3600, 2),
+                'longest_gap_hours': round(self.longest_gap / 3600, 2)
+            })
+
+        return result
+
+def _count_bins(bins, values, step):
+    """Add ``step`` to the log-spaced bin of every value"""
+    for index in log_bins(values).tolist():
+        count = bins.get(index, 0) + step
+        if count:
+            bins[index] = count
+        else:
+            bins.pop(index, None)
@@ -0,0 +1,207 @@
+import json
+from datetime import datetime
+from utils.sqlite_pool import SQLiteConnectionPool
+import config
+
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = [
+    # 1: running analytics aggregates per profile
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS profile_aggregates (
+            username TEXT PRIMARY KEY,
+            state TEXT NOT NULL,
+            updated_at TIMESTAMP
+        )
+        '''
+    ],
+    # 2: full-text caption index with extracted hashtags and mentions
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS captions (
+            id INTEGER PRIMARY KEY,
+            post_id TEXT NOT NULL UNIQUE,
+            username TEXT NOT NULL,
+            caption TEXT NOT NULL,
+            caption_hash TEXT NOT NULL,
+            posted_at TIMESTAMP,
+            likes INTEGER DEFAULT 0,
+            comments INTEGER DEFAULT 0,
+            indexed_at TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_captions_username ON captions (username)',
+        '''
+        CREATE VIRTUAL TABLE IF NOT EXISTS captions_fts USING fts5(
+            caption,
+            content='captions',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+        ''',
+        # Keep the external-content FTS table in step with captions
+        '''
+        CREATE TRIGGER IF NOT EXISTS captions_fts_insert AFTER INSERT ON captions BEGIN
+            INSERT INTO captions_fts (rowid, caption) VALUES (new.id, new.caption);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS captions_fts_delete AFTER DELETE ON captions BEGIN
+            INSERT INTO captions_fts (captions_fts, rowid, caption) VALUES ('delete', old.id, old.caption);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS captions_fts_update AFTER UPDATE OF caption ON captions BEGIN
+            INSERT INTO captions_fts (captions_fts, rowid, caption) VALUES ('delete', old.id, old.caption);
+            INSERT INTO captions_fts (rowid, caption) VALUES (new.id, new.caption);
+        END
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS post_tags (
+            post_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            tag TEXT NOT NULL,
+            username TEXT NOT NULL,
+            PRIMARY KEY (post_id, kind, tag)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_post_tags_kind_tag ON post_tags (kind, tag, post_id)',
+        'CREATE INDEX IF NOT EXISTS idx_post_tags_username_kind_tag ON post_tags (username, kind, tag, post_id)'
+    ],
+    # 3: like/comment counts of every post folded into the running aggregates;
+    # aggregates saved before cannot be matched to their posts and are rebuilt
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS aggregate_posts (
+            username TEXT NOT NULL,
+            post_id TEXT NOT NULL,
+            shortcode TEXT,
+            likes INTEGER DEFAULT 0,
+            comments INTEGER DEFAULT 0,
+            is_video INTEGER DEFAULT 0,
+            posted_at TEXT,
+            PRIMARY KEY (username, post_id)
+        ) WITHOUT ROWID
+        ''',
+        'DELETE FROM profile_aggregates'
+    ]
+]
+
+GET_AGGREGATES_SQL = 'SELECT state FROM profile_aggregates WHERE username = ?'
+
+SAVE_AGGREGATES_SQL = '''
+    INSERT INTO profile_aggregates (username, state, updated_at)
+    VALUES (?, ?, ?)
+    ON CONFLICT (username) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at
+'''
+
+GET_AGGREGATE_POSTS_SQL = '''
+    SELECT post_id, shortcode, likes, comments, is_video, posted_at
+    FROM aggregate_posts
+    WHERE username = ? {id_filter}
+'''
+
+# Post ids per lookup, well below SQLite's bound-parameter limit
+POST_ID_BATCH_SIZE = 500
+
+UPSERT_AGGREGATE_POST_SQL = '''
+    INSERT INTO aggregate_posts (username, post_id, shortcode, likes, comments, is_video, posted_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (username, post_id) DO UPDATE SET
+        shortcode = excluded.shortcode,
+        likes = excluded.likes,
+        comments = excluded.comments
+'''
+
+class AnalyticsStore:
+    """SQLite persistence for profile analytics state"""
+
+    def __init__(self, db_path=None):
+        self.db_path = db_path or config.Config.ANALYTICS_DB_PATH
+        self.pool = SQLiteConnectionPool(self.db_path)
+        self._init_db()
+
+    def _init_db(self):
+        """Initialize SQLite database and apply pending migrations"""
+        try:
+            with self.pool.connection() as conn:
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+
+                for number, statements in enumerate(MIGRATIONS, start=1):
+                    if number <= version:
+                        continue
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f'PRAGMA user_version = {number}')
+                    conn.commit()
+                    print(f"🔧 Applied analytics database migration {number}")
+
+            print("✅ SQLite analytics database initialized")
+        except Exception as e:
+            print(f"❌ Analytics database initialization error: {e}")
+
+    def get_aggregates(self, username):
+        """Get the saved running aggregates of a profile"""
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute(GET_AGGREGATES_SQL, (username,)).fetchone()
+            if row:
+                return json.loads(row[0])
+        except Exception as e:
+            print(f"❌ Aggregates lookup error: {e}")
+
+        return None
+
+    def get_posts(self, username, ids=None):
+        """Get the posts folded into a profile's aggregates, with the counts they were folded with.
+        
+        With ``ids``, only those posts are read; without, every post of the profile.
+        """
+        try:
+            with self.pool.connection() as conn:
+                if ids is None:
+                    rows = conn.execute(GET_AGGREGATE_POSTS_SQL.format(id_filter=''), (username,)).fetchall()
+                else:
+                    ids = list(ids)
+                    rows = []
+                    for start in range(0, len(ids), POST_ID_BATCH_SIZE):
+                        batch = ids[start:start + POST_ID_BATCH_SIZE]
+                        id_filter = f"AND post_id IN ({', '.join('?' for _ in batch)})"
+                        rows.extend(conn.execute(
+                            GET_AGGREGATE_POSTS_SQL.format(id_filter=id_filter), (username, *batch)
+                        ).fetchall())
+            return [
+                {
+                    'id': row[0],
+                    'shortcode': row[1],
+                    'likes': row[2],
+                    'comments': row[3],
+                    'is_video': bool(row[4]),
+                    'timestamp': row[5]
+                }
+                for row in rows
+            ]
+        except Exception as e:
+            print(f"❌ Aggregate posts lookup error: {e}")
+            return []
+
+    def save_aggregates(self, username, state, posts=()):
+        """Save the running aggregates of a profile together with the counts of ``posts``"""
+        try:
+            with self.pool.connection() as conn:
+                conn.execute(SAVE_AGGREGATES_SQL, (username, json.dumps(state, default=_json_default), datetime.now()))
+                conn.executemany(UPSERT_AGGREGATE_POST_SQL, [
+                    (
+                        username, post['id'], post.get('shortcode'), post['likes'], post['comments'],
+                        int(post['is_video']), post['timestamp']
+                    )
+                    for post in posts
+                ])
+            return True
+        except Exception as e:
+            print(f"❌ Aggregates save error: {e}")
+            return False
+
+def _json_default(value):
+    """Serialize the datetimes in saved post payloads"""
+    return value.isoformat() if isinstance(value, datetime) else str(value)
@@ -0,0 +1,190 @@
+import hashlib
+import re
+from datetime import datetime
+
+# Hashtags and mentions are found in the same scan of the caption; only
+# mentions (usernames) may contain dots
+TAG_PATTERN = re.compile(r'(?<![\w#@])(?:#(\w+)|@(\w+(?:\.\w+)*))')
+
+SEARCH_TERM_PATTERN = re.compile(r'\w+\*?')
+
+EXISTING_HASHES_SQL = 'SELECT post_id, caption_hash FROM captions WHERE post_id IN ({placeholders})'
+
+UPSERT_CAPTION_SQL = '''
+    INSERT INTO captions (post_id, username, caption, caption_hash, posted_at, likes, comments, indexed_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT (post_id) DO UPDATE SET
+        caption = excluded.caption,
+        caption_hash = excluded.caption_hash,
+        likes = excluded.likes,
+        comments = excluded.comments,
+        indexed_at = excluded.indexed_at
+'''
+
+DELETE_TAGS_SQL = 'DELETE FROM post_tags WHERE post_id = ?'
+
+INSERT_TAG_SQL = 'INSERT OR IGNORE INTO post_tags (post_id, kind, tag, username) VALUES (?, ?, ?, ?)'
+
+SEARCH_SQL = '''
+    SELECT
+        c.post_id, c.username, c.caption, c.posted_at, c.likes, c.comments,
+        snippet(captions_fts, 0, '[', ']', '…', 16),
+        bm25(captions_fts) AS score
+    FROM captions_fts
+    JOIN captions c ON c.id = captions_fts.rowid
+    WHERE captions_fts MATCH ? {user_filter}
+    ORDER BY score
+    LIMIT ?
+'''
+
+TAG_FREQUENCY_SQL = '''
+    SELECT tag, COUNT(*) AS posts
+    FROM post_tags
+    WHERE kind = ? {user_filter}
+    GROUP BY tag
+    ORDER BY posts DESC, tag
+    LIMIT ?
+'''
+
+TAG_COOCCURRENCE_SQL = '''
+    SELECT other.tag, COUNT(*) AS posts
+    FROM post_tags AS tagged
+    JOIN post_tags AS other
+        ON other.post_id = tagged.post_id AND other.kind = 'hashtag' AND other.tag <> tagged.tag
+    WHERE tagged.kind = 'hashtag' AND tagged.tag = ? {user_filter}
+    GROUP BY other.tag
+    ORDER BY posts DESC, other.tag
+    LIMIT ?
+'''
+
+def extract_tags(caption):
+    """Return the set of (kind, tag) hashtags and mentions in a caption"""
+    tags = set()
+    for hashtag, mention in TAG_PATTERN.findall(caption or ''):
+        if hashtag:
+            tags.add(('hashtag', hashtag.lower()))
+        else:
+            tags.add(('mention', mention.lower()))
+    return tags
+
+def build_match_query(query):
+    """Turn free text into an FTS5 query of quoted terms, all of which must match"""
+    terms = []
+    for term in SEARCH_TERM_PATTERN.findall(query or ''):
+        prefix = term.endswith('*')
+        term = term.rstrip('*')
+        if term:
+            terms.append(f'"{term}"*' if prefix else f'"{term}"')
+    return ' '.join(terms)
+
+class CaptionIndex:
+    """Full-text index of post captions plus their hashtags and mentions.
+
+    Posts are re-indexed only when their caption text changes, so indexing
+    the same fetched posts again costs one lookup of stored caption hashes.
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def index_posts(self, username, posts):
+        """Index new or edited captions; returns the number of posts written"""
+        posts = [post for post in posts if post.get('id') and not post.get('is_preview')]
+        if not posts or not username:
+            return 0
+        username = username.lower()
+
+        hashes = {
+            str(post['id']): hashlib.sha1((post.get('caption') or '').encode()).hexdigest()
+            for post in posts
+        }
+
+        try:
+            with self.pool.connection() as conn:
+                post_ids = list(hashes)
+                existing = dict(conn.execute(
+                    EXISTING_HASHES_SQL.format(placeholders=', '.join('?' for _ in post_ids)),
+                    post_ids
+                ).fetchall())
+
+                changed = [post for post in posts if existing.get(str(post['id'])) != hashes[str(post['id'])]]
+                if not changed:
+                    return 0
+
+                now = datetime.now()
+                conn.executemany(UPSERT_CAPTION_SQL, [
+                    (
+                        str(post['id']), username, post.get('caption') or '', hashes[str(post['id'])],
+                        post.get('timestamp'), post.get('likes', 0), post.get('comments', 0), now
+                    )
+                    for post in changed
+                ])
+                conn.executemany(DELETE_TAGS_SQL, [(str(post['id']),) for post in changed])
+                conn.executemany(INSERT_TAG_SQL, [
+                    (str(post['id']), kind, tag, username)
+                    for post in changed
+                    for kind, tag in extract_tags(post.get('caption'))
+                ])
+
+            return len(changed)
+        except Exception as e:
+            print(f"❌ Caption indexing error: {e}")
+            return 0
+
+    def search(self, query, username=None, limit=20):
+        """Rank captions matching ``query`` by BM25 relevance"""
+        match = build_match_query(query)
+        if not match:
+            return []
+
+        params = [match]
+        user_filter = ''
+        if username:
+            user_filter = 'AND c.username = ?'
+            params.append(username.lower())
+        params.append(limit)
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(SEARCH_SQL.format(user_filter=user_filter), params).fetchall()
+
+        return [
+            {
+                'post_id': row[0],
+                'username': row[1],
+                'caption': row[2],
+                'timestamp': row[3],
+                'likes': row[4],
+                'comments': row[5],
+                'snippet': row[6],
+                'score': round(-row[7], 6)
+            }
+            for row in rows
+        ]
+
+    def tag_frequency(self, kind='hashtag', username=None, limit=20):
+        """Most used hashtags or mentions, overall or for one profile"""
+        params = [kind]
+        user_filter = ''
+        if username:
+            user_filter = 'AND username = ?'
+            params.append(username.lower())
+        params.append(limit)
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(TAG_FREQUENCY_SQL.format(user_filter=user_filter), params).fetchall()
+
+        return [{'tag': tag, 'posts': count} for tag, count in rows]
+
+    def tag_cooccurrence(self, tag, username=None, limit=20):
+        """Hashtags most often used in the same posts as ``tag``"""
+        params = [tag.lstrip('#').lower()]
+        user_filter = ''
+        if username:
+            user_filter = 'AND tagged.username = ?'
+            params.append(username.lower())
+        params.append(limit)
+
+        with self.pool.connection() as conn:
+            rows = conn.execute(TAG_COOCCURRENCE_SQL.format(user_filter=user_filter), params).fetchall()
+
+        return [{'tag': other, 'posts': count} for other, count in rows]
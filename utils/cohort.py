@@ -0,0 +1,156 @@
+import multiprocessing
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+import numpy as np
+from utils.analytics_engine import AnalyticsEngine
+import config
+
+# Metrics compared across a cohort; higher is ranked better for all of them
+COHORT_METRICS = (
+    'followers',
+    'engagement_rate',
+    'average_likes',
+    'average_comments',
+    'median_engagement',
+    'posts_per_week',
+    'video_percentage'
+)
+
+def analyze_cohort_member(posts, followers):
+    """Compute one account's metrics; runs in a worker process"""
+    analytics = AnalyticsEngine().analyze(posts, followers)
+    metrics = {metric: analytics.get(metric, 0) for metric in COHORT_METRICS if metric != 'followers'}
+    metrics['posts_analyzed'] = analytics['total_posts_analyzed']
+    return metrics
+
+def rank_cohort(rows):
+    """Add each account's rank (1 = highest) and percentile for every metric"""
+    if not rows:
+        return {'profiles': [], 'summary': {}}
+
+    summary = {}
+    for metric in COHORT_METRICS:
+        values = np.array([row['metrics'].get(metric) or 0 for row in rows], dtype=np.float64)
+        ordered = np.sort(values)
+        below = np.searchsorted(ordered, values, side='left')
+        at_or_below = np.searchsorted(ordered, values, side='right')
+
+        # Ties share the best rank; percentile counts half of the tied accounts
+        ranks = len(values) - at_or_below + 1
+        percentiles = (below + (at_or_below - below) / 2) / len(values) * 100
+
+        for row, rank, percentile in zip(rows, ranks, percentiles):
+            row.setdefault('ranks', {})[metric] = int(rank)
+            row.setdefault('percentiles', {})[metric] = round(float(percentile), 1)
+
+        summary[metric] = {
+            'min': float(ordered[0]),
+            'median': float(np.median(values)),
+            'mean': round(float(values.mean()), 2),
+            'max': float(ordered[-1])
+        }
+
+    profiles = sorted(rows, key=lambda row: row['ranks']['engagement_rate'])
+    return {'profiles': profiles, 'summary': summary}
+
+class CohortAnalyzer:
+    """Compares many accounts at once.
+
+    Profiles and posts are fetched on a thread pool; each account is handed
+    to a process pool for analysis as soon as its fetch finishes, and its
+    result is yielded as soon as the analysis finishes. The last event ranks
+    the whole cohort.
+    """
+
+    def __init__(self, instagram_api, analytics_service):
+        self.instagram_api = instagram_api
+        self.analytics_service = analytics_service
+        self._process_pool = None
+        self._lock = threading.Lock()
+
+    def _get_process_pool(self):
+        with self._lock:
+            if self._process_pool is None:
+                # Workers start from a clean interpreter instead of forking this threaded process
+                start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=config.Config.COHORT_PROCESS_WORKERS,
+                    mp_context=multiprocessing.get_context(start_method)
+                )
+            return self._process_pool
+
+    def _fetch(self, username):
+        profile_data = self.instagram_api.get_profile_data(username)
+        if not profile_data:
+            raise LookupError('Profile not found')
+        if profile_data.get('is_private'):
+            raise LookupError('Private account')
+
+        posts = self.instagram_api.get_user_posts(username, limit=config.Config.COHORT_POST_LIMIT)
+        return profile_data, posts
+
+    def stream(self, usernames):
+        """Yield a 'profile' or 'error' event per account, then a 'cohort' event"""
+        total = len(usernames)
+        fetch_pool = ThreadPoolExecutor(
+            max_workers=min(config.Config.COHORT_FETCH_WORKERS, total or 1),
+            thread_name_prefix='cohort-fetch'
+        )
+        process_pool = self._get_process_pool()
+
+        pending = {}
+        rows = []
+        failed = []
+
+        try:
+            for username in usernames:
+                pending[fetch_pool.submit(self._fetch, username)] = ('fetch', username, None)
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, username, profile_data = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        failed.append({'username': username, 'error': str(e)})
+                        yield {
+                            'type': 'error',
+                            'username': username,
+                            'error': str(e),
+                            'completed': len(rows) + len(failed),
+                            'total': total
+                        }
+                        continue
+
+                    if stage == 'fetch':
+                        profile_data, posts = result
+                        analysis = process_pool.submit(
+                            analyze_cohort_member, posts, profile_data.get('followers', 0)
+                        )
+                        pending[analysis] = ('analysis', username, profile_data)
+                        continue
+
+                    metrics = dict(result, followers=profile_data.get('followers', 0))
+                    self.analytics_service.record_snapshot(profile_data, metrics['engagement_rate'])
+                    row = {
+                        'username': profile_data.get('username', username),
+                        'full_name': profile_data.get('full_name', ''),
+                        'is_verified': profile_data.get('is_verified', False),
+                        'metrics': metrics
+                    }
+                    rows.append(row)
+                    yield {
+                        'type': 'profile',
+                        'completed': len(rows) + len(failed),
+                        'total': total,
+                        **row
+                    }
+
+            yield dict(rank_cohort(rows), type='cohort', failed=failed)
+            print(f"✅ Cohort analysis finished: {len(rows)} profiles, {len(failed)} failed")
+        finally:
+            # Stop outstanding work if the client went away early
+            for future in pending:
+                future.cancel()
+            fetch_pool.shutdown(wait=False, cancel_futures=True)
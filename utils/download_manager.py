@@ -1,50 +1,428 @@
 import os
-import uuid
-import sqlite3
+import base64
+import hashlib
 import json
-from datetime import datetime
-from utils.instagram_api import MediaDownloader
+import zipfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from utils.instagram_api import MediaDownloader, MediaRejectedError
+from utils.job_queue import DownloadJobQueue
+from utils.sqlite_pool import SQLiteConnectionPool
+from utils.log_writer import DownloadLogWriter
+from utils.retention import RetentionManager
 import config
 
+# Schema migrations, applied in order and tracked with PRAGMA user_version
+MIGRATIONS = [
+    # 1: base tables
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS downloads (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            type TEXT,
+            username TEXT,
+            media_id TEXT,
+            file_path TEXT,
+            file_size INTEGER,
+            media_url TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS download_jobs (
+            id TEXT PRIMARY KEY,
+            job_type TEXT,
+            payload TEXT,
+            status TEXT,
+            bytes_downloaded INTEGER DEFAULT 0,
+            bytes_total INTEGER,
+            result TEXT,
+            error TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS media_blobs (
+            media_id TEXT,
+            media_url TEXT,
+            content_hash TEXT,
+            file_path TEXT,
+            file_size INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (media_id, media_url)
+        )
+        '''
+    ],
+    # 2: indexes for history ordering, per-user/per-media lookups and job recovery
+    [
+        'CREATE INDEX IF NOT EXISTS idx_downloads_created_at ON downloads (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_downloads_username_created_at ON downloads (username, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_downloads_media_id ON downloads (media_id)',
+        'CREATE INDEX IF NOT EXISTS idx_download_jobs_status ON download_jobs (status, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_media_blobs_content_hash ON media_blobs (content_hash)'
+    ],
+    # 3: summary tables kept current by triggers so stats reads don't scan downloads
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS download_stats_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            total_downloads INTEGER NOT NULL DEFAULT 0,
+            unique_users INTEGER NOT NULL DEFAULT 0,
+            total_size INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS download_stats_by_type (
+            type TEXT PRIMARY KEY,
+            downloads INTEGER NOT NULL DEFAULT 0,
+            total_size INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS download_stats_by_user (
+            username TEXT PRIMARY KEY,
+            downloads INTEGER NOT NULL DEFAULT 0,
+            total_size INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS download_stats_by_day (
+            day TEXT PRIMARY KEY,
+            downloads INTEGER NOT NULL DEFAULT 0,
+            total_size INTEGER NOT NULL DEFAULT 0
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_download_stats_by_user_downloads ON download_stats_by_user (downloads)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_download_stats_user_added
+        AFTER INSERT ON download_stats_by_user
+        BEGIN
+            UPDATE download_stats_totals SET unique_users = unique_users + 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_download_stats_user_removed
+        AFTER DELETE ON download_stats_by_user
+        BEGIN
+            UPDATE download_stats_totals SET unique_users = unique_users - 1 WHERE id = 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_downloads_stats_insert
+        AFTER INSERT ON downloads
+        BEGIN
+            UPDATE download_stats_totals
+            SET total_downloads = total_downloads + 1,
+                total_size = total_size + COALESCE(NEW.file_size, 0)
+            WHERE id = 1;
+            
+            INSERT INTO download_stats_by_type (type, downloads, total_size)
+            VALUES (COALESCE(NEW.type, 'unknown'), 1, COALESCE(NEW.file_size, 0))
+            ON CONFLICT (type) DO UPDATE SET
+                downloads = downloads + 1,
+                total_size = total_size + excluded.total_size;
+            
+            INSERT INTO download_stats_by_day (day, downloads, total_size)
+            VALUES (date(NEW.created_at), 1, COALESCE(NEW.file_size, 0))
+            ON CONFLICT (day) DO UPDATE SET
+                downloads = downloads + 1,
+                total_size = total_size + excluded.total_size;
+            
+            INSERT INTO download_stats_by_user (username, downloads, total_size)
+            SELECT NEW.username, 1, COALESCE(NEW.file_size, 0)
+            WHERE NEW.username IS NOT NULL
+            ON CONFLICT (username) DO UPDATE SET
+                downloads = downloads + 1,
+                total_size = total_size + excluded.total_size;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_downloads_stats_delete
+        AFTER DELETE ON downloads
+        BEGIN
+            UPDATE download_stats_totals
+            SET total_downloads = total_downloads - 1,
+                total_size = total_size - COALESCE(OLD.file_size, 0)
+            WHERE id = 1;
+            
+            UPDATE download_stats_by_type
+            SET downloads = downloads - 1, total_size = total_size - COALESCE(OLD.file_size, 0)
+            WHERE type = COALESCE(OLD.type, 'unknown');
+            DELETE FROM download_stats_by_type WHERE type = COALESCE(OLD.type, 'unknown') AND downloads <= 0;
+            
+            UPDATE download_stats_by_day
+            SET downloads = downloads - 1, total_size = total_size - COALESCE(OLD.file_size, 0)
+            WHERE day = date(OLD.created_at);
+            DELETE FROM download_stats_by_day WHERE day = date(OLD.created_at) AND downloads <= 0;
+            
+            UPDATE download_stats_by_user
+            SET downloads = downloads - 1, total_size = total_size - COALESCE(OLD.file_size, 0)
+            WHERE username = OLD.username;
+            DELETE FROM download_stats_by_user WHERE username = OLD.username AND downloads <= 0;
+        END
+        '''
+    ],
+    # 4: indexes for keyset-paginated history filtered by username and/or type
+    [
+        'CREATE INDEX IF NOT EXISTS idx_downloads_type_created_at ON downloads (type, created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_downloads_username_type_created_at ON downloads (username, type, created_at)'
+    ],
+    # 5: size and last access of every stored file, for retention and LRU eviction
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS stored_files (
+            file_path TEXT PRIMARY KEY,
+            content_hash TEXT,
+            file_size INTEGER NOT NULL DEFAULT 0,
+            created_at TIMESTAMP,
+            last_accessed TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_stored_files_last_accessed ON stored_files (last_accessed)',
+        'CREATE INDEX IF NOT EXISTS idx_downloads_file_path ON downloads (file_path)',
+        'CREATE INDEX IF NOT EXISTS idx_media_blobs_file_path ON media_blobs (file_path)',
+        '''
+        INSERT OR IGNORE INTO stored_files (file_path, content_hash, file_size, created_at, last_accessed)
+        SELECT file_path, content_hash, MAX(file_size), MIN(created_at), MAX(created_at)
+        FROM media_blobs GROUP BY file_path
+        ''',
+        # Files written before the blob store only appear in the download log
+        '''
+        INSERT OR IGNORE INTO stored_files (file_path, content_hash, file_size, created_at, last_accessed)
+        SELECT file_path, NULL, MAX(COALESCE(file_size, 0)), MIN(created_at), MAX(created_at)
+        FROM downloads WHERE file_path IS NOT NULL GROUP BY file_path
+        '''
+    ],
+    # 6: per-account checkpoints for incremental profile archival
+    [
+        '''
+        CREATE TABLE IF NOT EXISTS archive_checkpoints (
+            username TEXT PRIMARY KEY,
+            user_id TEXT,
+            last_media_id TEXT,
+            run_newest_id TEXT,
+            run_max_id TEXT,
+            items_archived INTEGER NOT NULL DEFAULT 0,
+            last_run_at TIMESTAMP,
+            updated_at TIMESTAMP
+        )
+        '''
+    ],
+    # 7: job ownership so only one process runs a job, and stale ones can be recovered
+    [
+        'ALTER TABLE download_jobs ADD COLUMN owner TEXT',
+        'ALTER TABLE download_jobs ADD COLUMN heartbeat TIMESTAMP'
+    ]
+]
+
+# Recomputes the summary tables from the downloads table (used by migration 3 and for repair)
+REBUILD_STATS_SQL = [
+    'DELETE FROM download_stats_by_type',
+    'DELETE FROM download_stats_by_day',
+    'DELETE FROM download_stats_by_user',
+    '''
+    INSERT INTO download_stats_by_type (type, downloads, total_size)
+    SELECT COALESCE(type, 'unknown'), COUNT(*), COALESCE(SUM(file_size), 0)
+    FROM downloads GROUP BY COALESCE(type, 'unknown')
+    ''',
+    '''
+    INSERT INTO download_stats_by_day (day, downloads, total_size)
+    SELECT date(created_at), COUNT(*), COALESCE(SUM(file_size), 0)
+    FROM downloads GROUP BY date(created_at)
+    ''',
+    '''
+    INSERT INTO download_stats_by_user (username, downloads, total_size)
+    SELECT username, COUNT(*), COALESCE(SUM(file_size), 0)
+    FROM downloads WHERE username IS NOT NULL GROUP BY username
+    ''',
+    '''
+    INSERT OR REPLACE INTO download_stats_totals (id, total_downloads, unique_users, total_size)
+    SELECT 1, COUNT(*), (SELECT COUNT(*) FROM download_stats_by_user), COALESCE(SUM(file_size), 0)
+    FROM downloads
+    '''
+]
+MIGRATIONS[2].extend(REBUILD_STATS_SQL)
+
+# Statements are kept as constants so pooled connections reuse their prepared form
+INSERT_DOWNLOAD_SQL = '''
+    INSERT INTO downloads 
+    (type, username, media_id, file_path, file_size, media_url, created_at)
+    VALUES (?, ?, ?, ?, ?, ?, ?)
+'''
+
+DOWNLOAD_STATS_SQL = '''
+    SELECT total_downloads, unique_users, total_size
+    FROM download_stats_totals
+    WHERE id = 1
+'''
+
+STATS_BY_TYPE_SQL = 'SELECT type, downloads, total_size FROM download_stats_by_type'
+
+STATS_FOR_DAY_SQL = 'SELECT downloads, total_size FROM download_stats_by_day WHERE day = ?'
+
+STATS_BY_DAY_SQL = '''
+    SELECT day, downloads, total_size
+    FROM download_stats_by_day
+    WHERE day >= ?
+    ORDER BY day ASC
+'''
+
+STATS_BY_USER_SQL = '''
+    SELECT username, downloads, total_size
+    FROM download_stats_by_user
+    ORDER BY downloads DESC
+    LIMIT ?
+'''
+
+# Keyset pagination over (created_at, id); the rowid is part of every index entry,
+# so the created_at indexes serve this ordering without a sort
+DOWNLOAD_PAGE_SQL = '''
+    SELECT 
+        id, type, username, media_id, file_path, file_size, media_url, created_at
+    FROM downloads 
+    {where}
+    ORDER BY created_at DESC, id DESC 
+    LIMIT ?
+'''
+
+INSERT_JOB_SQL = '''
+    INSERT INTO download_jobs 
+    (id, job_type, payload, status, created_at, updated_at)
+    VALUES (?, ?, ?, 'queued', ?, ?)
+'''
+
+JOB_COLUMNS = '''
+    id, job_type, payload, status, bytes_downloaded, bytes_total,
+    result, error, created_at, updated_at, owner, heartbeat
+'''
+
+# Only one process can move a queued job to running
+CLAIM_JOB_SQL = '''
+    UPDATE download_jobs
+    SET status = 'running', owner = ?, heartbeat = ?, updated_at = ?
+    WHERE id = ? AND status = 'queued'
+'''
+
+# Compare-and-set on the owner and heartbeat that were judged stale
+RELEASE_STALE_JOB_SQL = '''
+    UPDATE download_jobs
+    SET status = 'queued', owner = NULL, heartbeat = NULL, bytes_downloaded = 0, updated_at = ?
+    WHERE id = ? AND status = 'running' AND owner IS ? AND heartbeat IS ?
+'''
+
+JOB_HEARTBEAT_SQL = '''
+    UPDATE download_jobs SET heartbeat = ?
+    WHERE owner = ? AND status = 'running'
+'''
+
+GET_JOB_SQL = f'SELECT {JOB_COLUMNS} FROM download_jobs WHERE id = ?'
+
+UNFINISHED_JOBS_SQL = f'''
+    SELECT {JOB_COLUMNS}
+    FROM download_jobs 
+    WHERE status IN ('queued', 'running')
+    ORDER BY created_at ASC
+'''
+
+GET_BLOB_SQL = '''
+    SELECT content_hash, file_path, file_size
+    FROM media_blobs 
+    WHERE media_id = ? AND media_url = ?
+'''
+
+SAVE_BLOB_SQL = '''
+    INSERT OR REPLACE INTO media_blobs 
+    (media_id, media_url, content_hash, file_path, file_size, created_at)
+    VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+def encode_history_cursor(created_at, download_id):
+    """Encode a history position as an opaque URL-safe cursor"""
+    raw = json.dumps([str(created_at), int(download_id)]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_history_cursor(cursor):
+    """Decode a history cursor, raising ValueError if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, download_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return str(created_at), int(download_id)
+    except Exception:
+        raise ValueError('Invalid history cursor')
+
+RECORD_STORED_FILE_SQL = '''
+    INSERT INTO stored_files (file_path, content_hash, file_size, created_at, last_accessed)
+    VALUES (?, ?, ?, ?, ?)
+    ON CONFLICT (file_path) DO UPDATE SET last_accessed = excluded.last_accessed
+'''
+
+TOUCH_STORED_FILE_SQL = '''
+    UPDATE stored_files SET last_accessed = ?
+    WHERE file_path = ? AND (last_accessed IS NULL OR last_accessed < ?)
+'''
+
+STORED_SIZE_SQL = 'SELECT COUNT(*), COALESCE(SUM(file_size), 0) FROM stored_files'
+
+EXPIRED_FILES_SQL = '''
+    SELECT file_path, file_size
+    FROM stored_files
+    WHERE last_accessed < ?
+    ORDER BY last_accessed ASC
+    LIMIT ?
+'''
+
+LRU_FILES_SQL = '''
+    SELECT file_path, file_size
+    FROM stored_files
+    ORDER BY last_accessed ASC
+    LIMIT ?
+'''
+
+ARCHIVE_CHECKPOINT_COLUMNS = '''
+    username, user_id, last_media_id, run_newest_id, run_max_id,
+    items_archived, last_run_at, updated_at
+'''
+
+GET_ARCHIVE_CHECKPOINT_SQL = f'''
+    SELECT {ARCHIVE_CHECKPOINT_COLUMNS}
+    FROM archive_checkpoints
+    WHERE username = ?
+'''
+
+ARCHIVE_USERNAMES_SQL = 'SELECT username FROM archive_checkpoints ORDER BY username'
+
 class SQLiteDownloadManager:
     def __init__(self, db_path='downloads.db'):
         self.db_path = db_path
+        self.pool = SQLiteConnectionPool(db_path)
         self._init_db()
+        self.log_writer = DownloadLogWriter(self._write_download_rows)
     
     def _init_db(self):
-        """Initialize SQLite database"""
-        try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS downloads (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    type TEXT,
-                    username TEXT,
-                    media_id TEXT,
-                    file_path TEXT,
-                    file_size INTEGER,
-                    media_url TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-            conn.commit()
-            conn.close()
+        """Initialize SQLite database and apply pending migrations"""
+        try:
+            with self.pool.connection() as conn:
+                version = conn.execute('PRAGMA user_version').fetchone()[0]
+                
+                for number, statements in enumerate(MIGRATIONS, start=1):
+                    if number <= version:
+                        continue
+                    for statement in statements:
+                        conn.execute(statement)
+                    conn.execute(f'PRAGMA user_version = {number}')
+                    conn.commit()
+                    print(f"🔧 Applied download database migration {number}")
+            
             print("✅ SQLite download database initialized")
         except Exception as e:
             print(f"❌ Database initialization error: {e}")
     
     def log_download(self, download_data):
-        """Log download to SQLite database"""
+        """Queue a download record; it is written with the next batch"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                INSERT INTO downloads 
-                (type, username, media_id, file_path, file_size, media_url, created_at)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
+            self.log_writer.write((
                 download_data.get('type'),
                 download_data.get('username'),
                 download_data.get('post_id') or download_data.get('story_id') or download_data.get('username'),
@@ -53,36 +431,40 @@ class SQLiteDownloadManager:
                 download_data.get('media_url'),
                 datetime.now()
             ))
-            
-            conn.commit()
-            conn.close()
             return True
         except Exception as e:
             print(f"❌ Download logging error: {e}")
             return False
     
+    def _write_download_rows(self, rows):
+        """Insert a batch of download records in a single transaction"""
+        with self.pool.connection() as conn:
+            conn.executemany(INSERT_DOWNLOAD_SQL, rows)
+    
+    def flush(self):
+        """Write any buffered download records"""
+        self.log_writer.flush()
+    
     def get_download_stats(self):
-        """Get download statistics"""
+        """Get download statistics from the summary tables"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT 
-                    COUNT(*) as total_downloads,
-                    COUNT(DISTINCT username) as unique_users,
-                    SUM(file_size) as total_size
-                FROM downloads
-            ''')
-            
-            result = cursor.fetchone()
-            conn.close()
+            self.flush()
+            today = datetime.now().strftime('%Y-%m-%d')
+            with self.pool.connection() as conn:
+                result = conn.execute(DOWNLOAD_STATS_SQL).fetchone()
+                today_row = conn.execute(STATS_FOR_DAY_SQL, (today,)).fetchone()
+                by_type = conn.execute(STATS_BY_TYPE_SQL).fetchall()
             
             if result:
                 return {
                     'total_downloads': result[0] or 0,
                     'unique_users': result[1] or 0,
-                    'total_size': result[2] or 0
+                    'total_size': result[2] or 0,
+                    'today_downloads': today_row[0] if today_row else 0,
+                    'by_type': {
+                        row[0]: {'downloads': row[1], 'total_size': row[2]}
+                        for row in by_type
+                    }
                 }
         except Exception as e:
             print(f"❌ Download stats error: {e}")
@@ -90,124 +472,643 @@ class SQLiteDownloadManager:
         return {
             'total_downloads': 0,
             'unique_users': 0,
-            'total_size': 0
+            'total_size': 0,
+            'today_downloads': 0,
+            'by_type': {}
         }
     
+    def get_daily_stats(self, days=7):
+        """Get per-day download counts for the last N days, oldest first"""
+        try:
+            self.flush()
+            start = datetime.now().date() - timedelta(days=days - 1)
+            with self.pool.connection() as conn:
+                rows = conn.execute(STATS_BY_DAY_SQL, (start.isoformat(),)).fetchall()
+            
+            counts = {row[0]: {'downloads': row[1], 'total_size': row[2]} for row in rows}
+            return [
+                dict(day=day, **counts.get(day, {'downloads': 0, 'total_size': 0}))
+                for day in ((start + timedelta(days=offset)).isoformat() for offset in range(days))
+            ]
+        except Exception as e:
+            print(f"❌ Daily stats error: {e}")
+        
+        return []
+    
+    def get_top_users(self, limit=10):
+        """Get the most downloaded usernames"""
+        try:
+            self.flush()
+            with self.pool.connection() as conn:
+                rows = conn.execute(STATS_BY_USER_SQL, (limit,)).fetchall()
+            
+            return [
+                {'username': row[0], 'downloads': row[1], 'total_size': row[2]}
+                for row in rows
+            ]
+        except Exception as e:
+            print(f"❌ Top users stats error: {e}")
+        
+        return []
+    
+    def rebuild_download_stats(self):
+        """Recompute all summary tables from the downloads table"""
+        try:
+            self.flush()
+            with self.pool.connection() as conn:
+                for statement in REBUILD_STATS_SQL:
+                    conn.execute(statement)
+            print("✅ Download statistics rebuilt")
+            return True
+        except Exception as e:
+            print(f"❌ Download stats rebuild error: {e}")
+            return False
+    
     def get_download_history(self, limit=50):
         """Get download history"""
+        return self.get_download_page(limit=limit)['downloads']
+    
+    def get_download_page(self, limit=50, cursor=None, username=None, media_type=None):
+        """Get one page of download history, newest first.
+        
+        ``cursor`` is the ``next_cursor`` of the previous page; it encodes the
+        (created_at, id) of the last row so later pages cost the same as the first.
+        """
+        conditions = []
+        params = []
+        if username:
+            conditions.append('username = ?')
+            params.append(username)
+        if media_type:
+            conditions.append('type = ?')
+            params.append(media_type)
+        if cursor:
+            created_at, download_id = decode_history_cursor(cursor)
+            conditions.append('(created_at, id) < (?, ?)')
+            params.extend([created_at, download_id])
+        
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+        
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-            
-            cursor.execute('''
-                SELECT 
-                    type, username, media_id, file_path, file_size, media_url, created_at
-                FROM downloads 
-                ORDER BY created_at DESC 
-                LIMIT ?
-            ''', (limit,))
+            self.flush()
+            with self.pool.connection() as conn:
+                # Fetch one extra row to know whether another page exists
+                rows = conn.execute(
+                    DOWNLOAD_PAGE_SQL.format(where=where), (*params, limit + 1)
+                ).fetchall()
             
             downloads = []
-            for row in cursor.fetchall():
+            for row in rows[:limit]:
                 downloads.append({
-                    'type': row[0],
-                    'username': row[1],
-                    'media_id': row[2],
-                    'file_path': row[3],
-                    'file_size': row[4],
-                    'media_url': row[5],
-                    'created_at': row[6]
+                    'id': row[0],
+                    'type': row[1],
+                    'username': row[2],
+                    'media_id': row[3],
+                    'file_path': row[4],
+                    'file_size': row[5],
+                    'media_url': row[6],
+                    'created_at': row[7]
                 })
             
-            conn.close()
-            return downloads
+            next_cursor = None
+            if len(rows) > limit and downloads:
+                last = downloads[-1]
+                next_cursor = encode_history_cursor(last['created_at'], last['id'])
+            
+            return {'downloads': downloads, 'next_cursor': next_cursor}
         except Exception as e:
             print(f"❌ Download history error: {e}")
         
+        return {'downloads': [], 'next_cursor': None}
+    
+    def create_job(self, job_id, job_type, payload):
+        """Persist a new queued download job"""
+        try:
+            now = datetime.now()
+            with self.pool.connection() as conn:
+                conn.execute(INSERT_JOB_SQL, (
+                    job_id, job_type, json.dumps(payload, default=str), now, now
+                ))
+            return True
+        except Exception as e:
+            print(f"❌ Job creation error: {e}")
+            return False
+    
+    def update_job(self, job_id, **fields):
+        """Update status, progress or result columns of a download job"""
+        columns = {'status', 'bytes_downloaded', 'bytes_total', 'result', 'error'}
+        updates = {key: value for key, value in fields.items() if key in columns}
+        if not updates:
+            return False
+        
+        if 'result' in updates and updates['result'] is not None:
+            updates['result'] = json.dumps(updates['result'], default=str)
+        
+        try:
+            # Column names come from the whitelist above, values are bound
+            assignments = ', '.join(f"{key} = ?" for key in sorted(updates))
+            with self.pool.connection() as conn:
+                conn.execute(
+                    f"UPDATE download_jobs SET {assignments}, updated_at = ? WHERE id = ?",
+                    (*(updates[key] for key in sorted(updates)), datetime.now(), job_id)
+                )
+            return True
+        except Exception as e:
+            print(f"❌ Job update error: {e}")
+            return False
+    
+    def get_job(self, job_id):
+        """Get a download job by id"""
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute(GET_JOB_SQL, (job_id,)).fetchone()
+            
+            if row:
+                return self._job_from_row(row)
+        except Exception as e:
+            print(f"❌ Job lookup error: {e}")
+        
+        return None
+    
+    def claim_job(self, job_id, owner):
+        """Mark a queued job as running for ``owner``; False if another process has it"""
+        try:
+            now = datetime.now()
+            with self.pool.connection() as conn:
+                return conn.execute(CLAIM_JOB_SQL, (owner, now, now, job_id)).rowcount == 1
+        except Exception as e:
+            print(f"❌ Job claim error: {e}")
+            return False
+    
+    def release_stale_job(self, job):
+        """Put a running job whose owner is gone back in the queue"""
+        try:
+            with self.pool.connection() as conn:
+                return conn.execute(RELEASE_STALE_JOB_SQL, (
+                    datetime.now(), job['id'], job['owner'], job['heartbeat']
+                )).rowcount == 1
+        except Exception as e:
+            print(f"❌ Job release error: {e}")
+            return False
+    
+    def heartbeat_jobs(self, owner):
+        """Refresh the heartbeat of every job ``owner`` is running"""
+        try:
+            with self.pool.connection() as conn:
+                conn.execute(JOB_HEARTBEAT_SQL, (datetime.now(), owner))
+            return True
+        except Exception as e:
+            print(f"❌ Job heartbeat error: {e}")
+            return False
+    
+    def get_unfinished_jobs(self):
+        """Get queued or running jobs, oldest first"""
+        try:
+            with self.pool.connection() as conn:
+                rows = conn.execute(UNFINISHED_JOBS_SQL).fetchall()
+            
+            return [self._job_from_row(row) for row in rows]
+        except Exception as e:
+            print(f"❌ Unfinished jobs lookup error: {e}")
+        
+        return []
+    
+    def get_blob(self, media_id, media_url):
+        """Look up the stored blob for a media item"""
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute(GET_BLOB_SQL, (media_id, media_url)).fetchone()
+            
+            if row:
+                return {
+                    'content_hash': row[0],
+                    'file_path': row[1],
+                    'file_size': row[2]
+                }
+        except Exception as e:
+            print(f"❌ Blob lookup error: {e}")
+        
+        return None
+    
+    def save_blob(self, media_id, media_url, content_hash, file_path, file_size):
+        """Index a media item against its content-addressed blob"""
+        try:
+            now = datetime.now()
+            with self.pool.connection() as conn:
+                conn.execute(SAVE_BLOB_SQL, (
+                    media_id, media_url, content_hash, file_path, file_size, now
+                ))
+                conn.execute(RECORD_STORED_FILE_SQL, (
+                    file_path, content_hash, file_size, now, now
+                ))
+            return True
+        except Exception as e:
+            print(f"❌ Blob index error: {e}")
+            return False
+    
+    def record_stored_file(self, file_path, content_hash, file_size):
+        """Track a derived file (such as a thumbnail) for retention"""
+        try:
+            now = datetime.now()
+            with self.pool.connection() as conn:
+                conn.execute(RECORD_STORED_FILE_SQL, (
+                    file_path, content_hash, file_size, now, now
+                ))
+            return True
+        except Exception as e:
+            print(f"❌ Stored file tracking error: {e}")
+            return False
+    
+    def touch_files(self, accesses):
+        """Record last access times, given as a {file_path: accessed_at} dict"""
+        if not accesses:
+            return True
+        try:
+            with self.pool.connection() as conn:
+                conn.executemany(TOUCH_STORED_FILE_SQL, [
+                    (accessed_at, file_path, accessed_at)
+                    for file_path, accessed_at in accesses.items()
+                ])
+            return True
+        except Exception as e:
+            print(f"❌ File access tracking error: {e}")
+            return False
+    
+    def get_stored_size(self):
+        """Get the number and total size of tracked stored files"""
+        try:
+            with self.pool.connection() as conn:
+                count, total = conn.execute(STORED_SIZE_SQL).fetchone()
+            return {'files': count, 'total_size': total}
+        except Exception as e:
+            print(f"❌ Stored size error: {e}")
+        
+        return {'files': 0, 'total_size': 0}
+    
+    def get_expired_files(self, cutoff, limit):
+        """Get files not accessed since ``cutoff``, least recently used first"""
+        try:
+            with self.pool.connection() as conn:
+                return conn.execute(EXPIRED_FILES_SQL, (cutoff, limit)).fetchall()
+        except Exception as e:
+            print(f"❌ Expired files lookup error: {e}")
+        
+        return []
+    
+    def get_lru_files(self, limit):
+        """Get the least recently used files"""
+        try:
+            with self.pool.connection() as conn:
+                return conn.execute(LRU_FILES_SQL, (limit,)).fetchall()
+        except Exception as e:
+            print(f"❌ LRU files lookup error: {e}")
+        
+        return []
+    
+    def remove_stored_files(self, file_paths):
+        """Drop evicted files from the index in one transaction.
+        
+        Blob index entries are removed so the next request fetches the media
+        again; download history rows are kept but no longer point at a file.
+        """
+        if not file_paths:
+            return True
+        try:
+            params = [(file_path,) for file_path in file_paths]
+            self.flush()
+            with self.pool.connection() as conn:
+                conn.executemany('DELETE FROM stored_files WHERE file_path = ?', params)
+                conn.executemany('DELETE FROM media_blobs WHERE file_path = ?', params)
+                conn.executemany('UPDATE downloads SET file_path = NULL WHERE file_path = ?', params)
+            return True
+        except Exception as e:
+            print(f"❌ Stored file removal error: {e}")
+            return False
+    
+    def get_downloaded_media_ids(self, media_type, media_ids):
+        """Return which of ``media_ids`` already have a download of ``media_type``"""
+        media_ids = [str(media_id) for media_id in media_ids]
+        if not media_ids:
+            return set()
+        try:
+            self.flush()
+            placeholders = ', '.join('?' for _ in media_ids)
+            with self.pool.connection() as conn:
+                rows = conn.execute(
+                    f"SELECT DISTINCT media_id FROM downloads WHERE media_id IN ({placeholders}) AND type = ?",
+                    (*media_ids, media_type)
+                ).fetchall()
+            return {row[0] for row in rows}
+        except Exception as e:
+            print(f"❌ Downloaded media lookup error: {e}")
+        
+        return set()
+    
+    def get_archive_checkpoint(self, username):
+        """Get the archival checkpoint of an account"""
+        try:
+            with self.pool.connection() as conn:
+                row = conn.execute(GET_ARCHIVE_CHECKPOINT_SQL, (username,)).fetchone()
+            
+            if row:
+                return {
+                    'username': row[0],
+                    'user_id': row[1],
+                    'last_media_id': row[2],
+                    'run_newest_id': row[3],
+                    'run_max_id': row[4],
+                    'items_archived': row[5],
+                    'last_run_at': row[6],
+                    'updated_at': row[7]
+                }
+        except Exception as e:
+            print(f"❌ Archive checkpoint lookup error: {e}")
+        
+        return None
+    
+    def save_archive_checkpoint(self, username, **fields):
+        """Create or update an account's archival checkpoint"""
+        columns = {'user_id', 'last_media_id', 'run_newest_id', 'run_max_id', 'items_archived', 'last_run_at'}
+        updates = {key: value for key, value in fields.items() if key in columns}
+        updates['updated_at'] = datetime.now()
+        
+        try:
+            # Column names come from the whitelist above, values are bound
+            names = sorted(updates)
+            assignments = ', '.join(f"{key} = excluded.{key}" for key in names)
+            with self.pool.connection() as conn:
+                conn.execute(
+                    f"INSERT INTO archive_checkpoints (username, {', '.join(names)}) "
+                    f"VALUES (?, {', '.join('?' for _ in names)}) "
+                    f"ON CONFLICT (username) DO UPDATE SET {assignments}",
+                    (username, *(updates[key] for key in names))
+                )
+            return True
+        except Exception as e:
+            print(f"❌ Archive checkpoint save error: {e}")
+            return False
+    
+    def get_archived_usernames(self):
+        """Get every account that has an archival checkpoint"""
+        try:
+            with self.pool.connection() as conn:
+                return [row[0] for row in conn.execute(ARCHIVE_USERNAMES_SQL).fetchall()]
+        except Exception as e:
+            print(f"❌ Archived accounts lookup error: {e}")
+        
         return []
+    
+    def _job_from_row(self, row):
+        return {
+            'id': row[0],
+            'type': row[1],
+            'payload': json.loads(row[2]) if row[2] else {},
+            'status': row[3],
+            'bytes_downloaded': row[4] or 0,
+            'bytes_total': row[5],
+            'result': json.loads(row[6]) if row[6] else None,
+            'error': row[7],
+            'created_at': row[8],
+            'updated_at': row[9],
+            'owner': row[10],
+            'heartbeat': row[11]
+        }
 
-class DownloadService:
+def describe_batch_item(item):
+    """Short label of a batch item for the failure list, whatever its shape"""
+    if not isinstance(item, dict):
+        return f"invalid item {item!r:.80}"
+    post_data = item.get('post_data')
+    item_id = item.get('story_id') or (post_data.get('id') if isinstance(post_data, dict) else None)
+    return f"{item.get('type')} {item_id}"
+
+class ZipStreamBuffer:
+    """Write-only sink that lets ZipFile produce an archive as a byte stream"""
+    
     def __init__(self):
+        self._chunks = []
+    
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        """Return and clear everything written since the last drain"""
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+class DownloadService:
+    def __init__(self, instagram_api=None):
+        self.instagram_api = instagram_api
         self.download_manager = SQLiteDownloadManager()
         self.media_downloader = MediaDownloader()
         self.download_folder = config.Config.DOWNLOAD_FOLDER
         
         # Create download folder if it doesn't exist
         os.makedirs(self.download_folder, exist_ok=True)
+        
+        # Keeps the download folder within its size and age limits
+        self.retention = RetentionManager(self.download_manager, self.download_folder)
+        
+        # Downloads currently in progress, keyed by (media_id, media_url)
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
+        
+        # Accounts with an archival run in progress
+        self._archiving = set()
+        self._archiving_lock = threading.Lock()
+        
+        # Downloads run on a worker pool so they don't tie up request threads
+        self.job_queue = DownloadJobQueue(self.download_manager, {
+            'story': lambda payload, progress: self.download_story(
+                payload['url'], payload['username'], payload['story_id'],
+                progress_callback=progress
+            ),
+            'post': lambda payload, progress: self.download_post(
+                payload['post_data'], payload['username'],
+                progress_callback=progress
+            ),
+            'profile_pic': lambda payload, progress: self.download_profile_picture(
+                payload['profile_data'],
+                progress_callback=progress
+            ),
+            'archive': lambda payload, progress: self.archive_profile(
+                payload['username'],
+                progress_callback=progress
+            )
+        })
     
-    def download_story(self, story_url, username, story_id):
+    def submit_download(self, job_type, payload):
+        """Queue a story, post or profile_pic download and return its job id"""
+        return self.job_queue.submit(job_type, payload)
+    
+    def get_job(self, job_id):
+        """Get download job status"""
+        return self.job_queue.get_job(job_id)
+    
+    def get_job_progress(self, job_id):
+        """Get download job progress"""
+        return self.job_queue.get_progress(job_id)
+    
+    def store_media(self, media_id, media_url, file_extension, progress_callback=None):
+        """Fetch media into the content-addressed store, reusing existing blobs.
+        
+        Blobs are named by the SHA-256 of their content, so identical media is
+        kept once no matter how often it is downloaded. Concurrent requests for
+        the same item wait on a single transfer.
+        """
+        key = (str(media_id), media_url)
+        
+        blob = self._existing_blob(key, progress_callback)
+        if blob:
+            return blob
+        
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            is_owner = future is None
+            if is_owner:
+                future = Future()
+                self._inflight[key] = future
+        
+        if not is_owner:
+            print(f"⏳ Waiting for in-flight download: {media_url}")
+            blob = future.result()
+            if not blob:
+                return None
+            if progress_callback:
+                progress_callback(blob['file_size'], blob['file_size'])
+            return dict(blob, cached=True)
+        
+        try:
+            # Another request may have finished between the lookup and registration
+            blob = self._existing_blob(key, progress_callback) or \
+                self._fetch_blob(key, file_extension, progress_callback)
+            future.set_result(blob)
+            return blob
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+    
+    def _existing_blob(self, key, progress_callback=None):
+        blob = self.download_manager.get_blob(*key)
+        if blob and os.path.exists(blob['file_path']):
+            print(f"♻️ Serving stored blob for: {key[0]}")
+            self.retention.touch(blob['file_path'])
+            if progress_callback:
+                progress_callback(blob['file_size'], blob['file_size'])
+            return dict(blob, cached=True)
+        return None
+    
+    def _fetch_blob(self, key, file_extension, progress_callback=None):
+        media_id, media_url = key
+        # A stable name lets a later attempt resume this item's .part file
+        key_hash = hashlib.sha1(f"{media_id}|{media_url}".encode()).hexdigest()
+        incoming_path = os.path.join(
+            self.download_folder, f".incoming_{key_hash}{file_extension}"
+        )
+        
+        info = self.media_downloader.download_media(
+            media_url, incoming_path, progress_callback=progress_callback
+        )
+        if not info:
+            return None
+        
+        blob_path = os.path.join(self.download_folder, f"{info['sha256']}{file_extension}")
+        if os.path.exists(blob_path):
+            # Byte-identical content is already stored under another id/url
+            os.remove(incoming_path)
+        else:
+            os.replace(incoming_path, blob_path)
+        
+        self.download_manager.save_blob(
+            media_id, media_url, info['sha256'], blob_path, info['size']
+        )
+        return {
+            'content_hash': info['sha256'],
+            'file_path': blob_path,
+            'file_size': info['size'],
+            'cached': False,
+            'throughput_bps': info['throughput_bps']
+        }
+    
+    def download_story(self, story_url, username, story_id, progress_callback=None):
         """Download a single story"""
         try:
-            # Generate unique filename
             file_extension = '.mp4' if 'video' in story_url else '.jpg'
-            filename = f"{username}_{story_id}_{uuid.uuid4().hex}{file_extension}"
-            filepath = os.path.join(self.download_folder, filename)
+            blob = self.store_media(story_id, story_url, file_extension, progress_callback)
             
-            # Download media
-            success = self.media_downloader.download_media(story_url, filepath)
-            
-            if success:
+            if blob:
                 # Log download
                 download_data = {
                     'type': 'story',
                     'username': username,
                     'story_id': story_id,
-                    'file_path': filepath,
-                    'file_size': os.path.getsize(filepath),
+                    'file_path': blob['file_path'],
+                    'file_size': blob['file_size'],
                     'media_url': story_url
                 }
                 self.download_manager.log_download(download_data)
                 
                 return {
                     'success': True,
-                    'filepath': filepath,
-                    'filename': filename
+                    'filepath': blob['file_path'],
+                    'filename': f"{username}_{story_id}{file_extension}",
+                    'cached': blob['cached'],
+                    'throughput_bps': blob.get('throughput_bps')
                 }
         
+        except MediaRejectedError as e:
+            return {'success': False, 'error': str(e)}
         except Exception as e:
             print(f"Error downloading story: {e}")
         
         return {'success': False}
     
-    def download_post(self, post_data, username):
+    def download_post(self, post_data, username, progress_callback=None):
         """Download a post"""
         try:
             media_url = post_data.get('video_url') or post_data.get('display_url')
             if not media_url:
                 return {'success': False}
             
-            # Generate unique filename
             file_extension = '.mp4' if post_data.get('is_video') else '.jpg'
-            filename = f"{username}_post_{post_data['id']}_{uuid.uuid4().hex}{file_extension}"
-            filepath = os.path.join(self.download_folder, filename)
-            
-            # Download media
-            success = self.media_downloader.download_media(media_url, filepath)
+            blob = self.store_media(post_data['id'], media_url, file_extension, progress_callback)
             
-            if success:
+            if blob:
                 # Log download
                 download_data = {
                     'type': 'post',
                     'username': username,
                     'post_id': post_data['id'],
-                    'file_path': filepath,
-                    'file_size': os.path.getsize(filepath),
+                    'file_path': blob['file_path'],
+                    'file_size': blob['file_size'],
                     'media_url': media_url
                 }
                 self.download_manager.log_download(download_data)
                 
                 return {
                     'success': True,
-                    'filepath': filepath,
-                    'filename': filename
+                    'filepath': blob['file_path'],
+                    'filename': f"{username}_post_{post_data['id']}{file_extension}",
+                    'cached': blob['cached'],
+                    'throughput_bps': blob.get('throughput_bps')
                 }
         
+        except MediaRejectedError as e:
+            return {'success': False, 'error': str(e)}
         except Exception as e:
             print(f"Error downloading post: {e}")
         
         return {'success': False}
     
-    def download_profile_picture(self, profile_data):
+    def download_profile_picture(self, profile_data, progress_callback=None):
         """Download profile picture"""
         try:
             profile_pic_url = profile_data.get('profile_pic_url')
@@ -215,38 +1116,274 @@ class DownloadService:
                 return {'success': False}
             
             username = profile_data['username']
-            filename = f"{username}_profile_pic_{uuid.uuid4().hex}.jpg"
-            filepath = os.path.join(self.download_folder, filename)
+            blob = self.store_media(username, profile_pic_url, '.jpg', progress_callback)
             
-            # Download media
-            success = self.media_downloader.download_media(profile_pic_url, filepath)
-            
-            if success:
+            if blob:
                 # Log download
                 download_data = {
                     'type': 'profile_pic',
                     'username': username,
-                    'file_path': filepath,
-                    'file_size': os.path.getsize(filepath),
+                    'file_path': blob['file_path'],
+                    'file_size': blob['file_size'],
                     'media_url': profile_pic_url
                 }
                 self.download_manager.log_download(download_data)
                 
                 return {
                     'success': True,
-                    'filepath': filepath,
-                    'filename': filename
+                    'filepath': blob['file_path'],
+                    'filename': f"{username}_profile_pic.jpg",
+                    'cached': blob['cached'],
+                    'throughput_bps': blob.get('throughput_bps')
                 }
         
+        except MediaRejectedError as e:
+            return {'success': False, 'error': str(e)}
         except Exception as e:
             print(f"Error downloading profile picture: {e}")
         
         return {'success': False}
 
+    def archive_profile(self, username, progress_callback=None):
+        """Download a user's posts that are newer than the last archival run.
+        
+        The feed is walked newest-first and the walk stops at the newest media
+        id archived by the previous run, so a run costs one page request plus
+        the new posts. New posts are downloaded on a worker pool. The page
+        cursor is checkpointed after every fully archived page, so an
+        interrupted or failed run resumes where it stopped.
+        """
+        if not self.instagram_api:
+            return {'success': False, 'error': 'Archival is not configured'}
+        
+        with self._archiving_lock:
+            if username in self._archiving:
+                return {'success': False, 'error': f"An archive of {username} is already running"}
+            self._archiving.add(username)
+        
+        try:
+            return self._archive_profile(username, progress_callback)
+        except Exception as e:
+            print(f"❌ Archive error for {username}: {e}")
+            return {'success': False, 'error': str(e)}
+        finally:
+            with self._archiving_lock:
+                self._archiving.discard(username)
+    
+    def _archive_profile(self, username, progress_callback=None):
+        checkpoint = self.download_manager.get_archive_checkpoint(username) or {}
+        
+        user_id = checkpoint.get('user_id')
+        if not user_id:
+            profile_data = self.instagram_api.get_profile_data(username)
+            if not profile_data or not profile_data.get('user_id'):
+                return {'success': False, 'error': 'Profile not found'}
+            if profile_data.get('is_private'):
+                return {'success': False, 'error': 'Private accounts cannot be archived'}
+            user_id = str(profile_data['user_id'])
+        
+        # Media ids grow over time, so anything at or below the watermark is archived
+        last_media_id = int(checkpoint.get('last_media_id') or 0)
+        run_newest_id = int(checkpoint.get('run_newest_id') or 0)
+        resume_max_id = checkpoint.get('run_max_id')
+        archived_before = checkpoint.get('items_archived') or 0
+        if resume_max_id:
+            print(f"⏯️ Resuming archive of {username} at cursor {resume_max_id}")
+        
+        self.download_manager.save_archive_checkpoint(username, user_id=user_id)
+        
+        summary = {'pages': 0, 'new_items': 0, 'downloaded': 0, 'skipped': 0, 'bytes': 0}
+        executor = ThreadPoolExecutor(max_workers=config.Config.ARCHIVE_DOWNLOAD_WORKERS)
+        
+        try:
+            pages = self.instagram_api.iter_user_posts(
+                user_id, max_id=resume_max_id, page_size=config.Config.ARCHIVE_PAGE_SIZE
+            )
+            for posts, next_max_id in pages:
+                summary['pages'] += 1
+                
+                new_posts = [post for post in posts if int(post['id'] or 0) > last_media_id]
+                reached_archived = any(
+                    not post.get('is_pinned') and int(post['id'] or 0) <= last_media_id
+                    for post in posts
+                )
+                
+                if new_posts:
+                    run_newest_id = max(run_newest_id, *(int(post['id']) for post in new_posts))
+                    failures = self._archive_posts(executor, username, new_posts, summary, progress_callback)
+                    if failures:
+                        # Keep the cursor on this page so the next run retries it
+                        self.download_manager.save_archive_checkpoint(
+                            username, run_newest_id=str(run_newest_id),
+                            items_archived=archived_before + summary['downloaded']
+                        )
+                        return dict(summary, success=False, username=username,
+                                    error=f"{failures} posts failed to download")
+                
+                if reached_archived or not next_max_id:
+                    break
+                
+                self.download_manager.save_archive_checkpoint(
+                    username, run_newest_id=str(run_newest_id), run_max_id=next_max_id,
+                    items_archived=archived_before + summary['downloaded']
+                )
+        finally:
+            executor.shutdown(wait=True)
+        
+        # The walk reached the previous run's posts: move the watermark up
+        newest_id = max(last_media_id, run_newest_id)
+        self.download_manager.save_archive_checkpoint(
+            username,
+            last_media_id=str(newest_id) if newest_id else None,
+            run_newest_id=None,
+            run_max_id=None,
+            items_archived=archived_before + summary['downloaded'],
+            last_run_at=datetime.now()
+        )
+        
+        print(
+            f"✅ Archived {username}: {summary['downloaded']} new, "
+            f"{summary['skipped']} already stored, {summary['pages']} pages"
+        )
+        return dict(summary, success=True, username=username)
+    
+    def _archive_posts(self, executor, username, posts, summary, progress_callback=None):
+        """Download a page of new posts concurrently, returning the number of failures"""
+        items = []
+        for post in posts:
+            # Carousels are archived as their individual slides
+            items.extend(post.get('carousel_media') or [post])
+        
+        # Posts stored by an interrupted earlier run don't need to be fetched again
+        stored = self.download_manager.get_downloaded_media_ids('post', [item['id'] for item in items])
+        pending = [item for item in items if item['id'] not in stored]
+        
+        summary['new_items'] += len(items)
+        summary['skipped'] += len(items) - len(pending)
+        
+        failures = 0
+        futures = [executor.submit(self.download_post, item, username) for item in pending]
+        for future in as_completed(futures):
+            result = future.result()
+            if result.get('success'):
+                summary['downloaded'] += 1
+                summary['bytes'] += os.path.getsize(result['filepath']) if os.path.exists(result['filepath']) else 0
+                if progress_callback:
+                    progress_callback(summary['bytes'], None)
+            else:
+                failures += 1
+        
+        return failures
+    
+    def get_archive_checkpoint(self, username):
+        """Get the archival checkpoint of an account"""
+        return self.download_manager.get_archive_checkpoint(username)
+    
+    def get_archived_usernames(self):
+        """Get every account that has been archived before"""
+        return self.download_manager.get_archived_usernames()
+    
+    def download_batch_item(self, item):
+        """Download a single post or story item of a batch"""
+        if not isinstance(item, dict):
+            return {'success': False, 'error': 'Invalid batch item'}
+        item_type = item.get('type')
+        
+        if item_type == 'post' and item.get('post_data') and item.get('username'):
+            return self.download_post(item['post_data'], item['username'])
+        
+        if item_type == 'story' and all(item.get(key) for key in ('url', 'username', 'story_id')):
+            return self.download_story(item['url'], item['username'], item['story_id'])
+        
+        return {'success': False, 'error': 'Invalid batch item'}
+    
+    def stream_batch_zip(self, items):
+        """Download items concurrently and yield a ZIP archive as entries finish"""
+        for chunk in self._generate_batch_zip(items):
+            if chunk:
+                yield chunk
+    
+    def _generate_batch_zip(self, items, chunk_size=1024 * 1024):
+        buffer = ZipStreamBuffer()
+        executor = ThreadPoolExecutor(max_workers=config.Config.BATCH_DOWNLOAD_WORKERS)
+        failures = []
+        names = set()
+        
+        try:
+            futures = {executor.submit(self.download_batch_item, item): item for item in items}
+            
+            # Media is already compressed, so entries are stored rather than deflated
+            with zipfile.ZipFile(buffer, 'w', compression=zipfile.ZIP_STORED) as archive:
+                for future in as_completed(futures):
+                    item = futures[future]
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        result = {'success': False, 'error': str(e)}
+                    
+                    if not result.get('success'):
+                        failures.append(f"{describe_batch_item(item)}: {result.get('error', 'download failed')}")
+                        continue
+                    
+                    arcname = result['filename']
+                    base, extension = os.path.splitext(arcname)
+                    counter = 1
+                    while arcname in names:
+                        arcname = f"{base}_{counter}{extension}"
+                        counter += 1
+                    names.add(arcname)
+                    
+                    with open(result['filepath'], 'rb') as source, \
+                            archive.open(arcname, 'w', force_zip64=True) as entry:
+                        while True:
+                            chunk = source.read(chunk_size)
+                            if not chunk:
+                                break
+                            entry.write(chunk)
+                            yield buffer.drain()
+                    yield buffer.drain()
+                
+                if failures:
+                    archive.writestr('failed_downloads.txt', '\n'.join(failures) + '\n')
+            
+            # Central directory is written when the archive closes
+            yield buffer.drain()
+            print(f"✅ Batch archive finished: {len(names)} files, {len(failures)} failures")
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+    
     def get_download_stats(self):
         """Get download statistics"""
         return self.download_manager.get_download_stats()
     
+    def get_daily_stats(self, days=7):
+        """Get per-day download counts"""
+        return self.download_manager.get_daily_stats(days)
+    
+    def get_top_users(self, limit=10):
+        """Get the most downloaded usernames"""
+        return self.download_manager.get_top_users(limit)
+    
+    def rebuild_download_stats(self):
+        """Rebuild download statistics summary tables"""
+        return self.download_manager.rebuild_download_stats()
+    
+    def get_transfer_stats(self):
+        """Get active/queued transfers and bandwidth usage from the governor"""
+        return self.media_downloader.governor.get_stats()
+    
+    def touch_file(self, file_path):
+        """Record that a stored file was accessed"""
+        self.retention.touch(file_path)
+    
+    def sweep_downloads(self):
+        """Run one retention sweep over the download folder"""
+        return self.retention.sweep()
+    
     def get_download_history(self, limit=50):
         """Get download history"""
         return self.download_manager.get_download_history(limit)
+    
+    def get_download_page(self, limit=50, cursor=None, username=None, media_type=None):
+        """Get a cursor-paginated page of download history"""
+        return self.download_manager.get_download_page(limit, cursor, username, media_type)
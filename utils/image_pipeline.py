@@ -0,0 +1,147 @@
+import multiprocessing
+import os
+import threading
+import urllib.parse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import config
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; thumbnails fall back to the original image
+    Image = None
+    ImageOps = None
+
+def render_thumbnail(source_path, output_path, width, quality):
+    """Resize an image to ``width`` pixels wide and save it as WebP.
+
+    Runs in a worker process, so it only touches the filesystem.
+    """
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGB')
+        if image.width > width:
+            height = max(1, round(image.height * width / image.width))
+            image = image.resize((width, height), Image.LANCZOS)
+
+        temp_path = f"{output_path}.tmp"
+        image.save(temp_path, 'WEBP', quality=quality, method=4)
+        os.replace(temp_path, output_path)
+
+    return os.path.getsize(output_path)
+
+class ThumbnailService:
+    """Generates and caches resized WebP thumbnails of post images.
+
+    Sources are fetched through the download service's content-addressed
+    store, and outputs are cached as ``<source sha256>_<width>.webp``.
+    Resizing runs in a process pool; requests only ever look at the cache
+    and schedule missing thumbnails in the background.
+    """
+
+    def __init__(self, download_service):
+        self.download_service = download_service
+        self.widths = sorted(config.Config.THUMBNAIL_WIDTHS)
+        self.cache_folder = config.Config.THUMBNAIL_FOLDER
+        self.quality = config.Config.THUMBNAIL_QUALITY
+
+        self._process_pool = None
+        self._scheduler = ThreadPoolExecutor(max_workers=2, thread_name_prefix='thumbnail')
+        self._pending = set()
+        self._lock = threading.Lock()
+
+        if self.available:
+            os.makedirs(self.cache_folder, exist_ok=True)
+
+    @property
+    def available(self):
+        return Image is not None
+
+    def _get_process_pool(self):
+        with self._lock:
+            if self._process_pool is None:
+                # Never fork: this process already runs worker threads holding locks and SQLite handles
+                start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+                self._process_pool = ProcessPoolExecutor(
+                    max_workers=config.Config.THUMBNAIL_WORKERS,
+                    mp_context=multiprocessing.get_context(start_method)
+                )
+            return self._process_pool
+
+    def choose_width(self, width):
+        """Snap a requested width to the nearest generated size at least as wide"""
+        for candidate in self.widths:
+            if candidate >= width:
+                return candidate
+        return self.widths[-1]
+
+    def is_allowed_source(self, media_url):
+        """Only proxy images from Instagram's CDN hosts"""
+        host = urllib.parse.urlparse(media_url).hostname or ''
+        return any(
+            host == allowed or host.endswith(f".{allowed}")
+            for allowed in config.Config.THUMBNAIL_SOURCE_HOSTS
+        )
+
+    def thumbnail_path(self, content_hash, width):
+        return os.path.join(self.cache_folder, f"{content_hash}_{width}.webp")
+
+    def get_thumbnail(self, media_url, width, media_id=None):
+        """Return the cached thumbnail path, scheduling generation on a miss"""
+        if not self.available:
+            return None
+
+        media_id = str(media_id or 'thumbnail')
+        width = self.choose_width(width)
+
+        blob = self.download_service.download_manager.get_blob(media_id, media_url)
+        if blob:
+            path = self.thumbnail_path(blob['content_hash'], width)
+            if os.path.exists(path):
+                self.download_service.touch_file(path)
+                return path
+
+        self._schedule(media_id, media_url)
+        return None
+
+    def _schedule(self, media_id, media_url):
+        key = (media_id, media_url)
+        with self._lock:
+            if key in self._pending:
+                return
+            self._pending.add(key)
+        self._scheduler.submit(self._generate, key)
+
+    def _generate(self, key):
+        media_id, media_url = key
+        try:
+            extension = os.path.splitext(urllib.parse.urlparse(media_url).path)[1].lower()
+            if extension.lstrip('.') not in config.Config.ALLOWED_EXTENSIONS:
+                extension = '.jpg'
+
+            blob = self.download_service.store_media(media_id, media_url, extension)
+            if not blob:
+                return
+
+            pool = self._get_process_pool()
+            jobs = {}
+            for width in self.widths:
+                path = self.thumbnail_path(blob['content_hash'], width)
+                if not os.path.exists(path):
+                    jobs[path] = pool.submit(
+                        render_thumbnail, blob['file_path'], path, width, self.quality
+                    )
+
+            for path, future in jobs.items():
+                size = future.result()
+                self.download_service.download_manager.record_stored_file(
+                    path, blob['content_hash'], size
+                )
+
+            if jobs:
+                print(f"🖼️ Generated {len(jobs)} thumbnails for: {media_id}")
+        except Exception as e:
+            print(f"❌ Thumbnail generation error: {e}")
+        finally:
+            with self._lock:
+                self._pending.discard(key)
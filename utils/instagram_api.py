@@ -7,7 +7,13 @@ from datetime import datetime
 import time
 import random
 import base64
+import hashlib
+import os
+import threading
 import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from utils.transfer_governor import get_transfer_governor
+from utils.analytics_engine import AnalyticsEngine
 
 class InstagramAPI:
     def __init__(self):
@@ -29,6 +35,9 @@ class InstagramAPI:
             'X-IG-App-ID': '936619743392459',
         })
         
+        # Callbacks notified with (username, posts) after every posts fetch
+        self.posts_listeners = []
+        
         # Get initial cookies by visiting the main page
         self._initialize_session()
     
@@ -82,8 +91,18 @@ class InstagramAPI:
             'Referer': f'{self.base_url}/',
         }
 
-    def search_profiles(self, query):
-        """Search for Instagram profiles with multiple fallback methods"""
+    def search_profiles(self, query, cancel_check=None):
+        """Search for Instagram profiles with multiple fallback methods.
+
+        ``cancel_check`` is called between methods; once it returns True the
+        search stops and returns no profiles.
+        """
+        def cancelled():
+            if cancel_check and cancel_check():
+                print(f"⏹️ Search cancelled: {query}")
+                return True
+            return False
+
         try:
             print(f"🔍 Searching for: {query}")
             
@@ -91,11 +110,15 @@ class InstagramAPI:
             profiles = self._search_official_api(query)
             if profiles:
                 return profiles
+            if cancelled():
+                return []
             
             # Method 2: Try web search as fallback
             profiles = self._search_web_api(query)
             if profiles:
                 return profiles
+            if cancelled():
+                return []
                 
             # Method 3: Try basic search as last resort
             profiles = self._search_basic(query)
@@ -619,12 +642,14 @@ class InstagramAPI:
             posts = self._get_posts_public_data(username, limit)
             if posts:
                 print(f"✅ Successfully fetched {len(posts)} posts for {username}")
+                self._notify_posts_listeners(username, posts)
                 return posts
             
             # Fallback to basic HTML parsing
             posts = self._get_posts_basic_html(username, limit)
             if posts:
                 print(f"✅ Successfully fetched {len(posts)} posts via HTML for {username}")
+                self._notify_posts_listeners(username, posts)
                 return posts
                 
         except Exception as e:
@@ -632,6 +657,13 @@ class InstagramAPI:
         
         return []
 
+    def _notify_posts_listeners(self, username, posts):
+        for listener in self.posts_listeners:
+            try:
+                listener(username, posts)
+            except Exception as e:
+                print(f"❌ Posts listener error: {e}")
+
     def _get_posts_public_data(self, username, limit):
         """Get posts via public data endpoint"""
         try:
@@ -740,6 +772,69 @@ class InstagramAPI:
         
         return []
 
+    def iter_user_posts(self, user_id, max_id=None, page_size=12):
+        """Walk a user's feed newest-first, one page at a time.
+        
+        Yields ``(posts, next_max_id)`` for each page; pass a ``next_max_id``
+        back as ``max_id`` to continue a walk later. Stops after the last page
+        or when a request fails.
+        """
+        url = f"{self.api_url}/feed/user/{user_id}/"
+        
+        while True:
+            params = {'count': page_size}
+            if max_id:
+                params['max_id'] = max_id
+            
+            response = self._make_request(url, params=params, headers=self._get_common_headers(), timeout=15)
+            if not response or response.status_code != 200:
+                status = response.status_code if response else 'no response'
+                raise IOError(f"feed request failed for user {user_id}: {status}")
+            
+            data = response.json()
+            posts = [self._format_feed_item(item) for item in data.get('items', [])]
+            next_max_id = data.get('next_max_id') if data.get('more_available') else None
+            
+            yield posts, next_max_id
+            
+            if not next_max_id or not posts:
+                return
+            max_id = next_max_id
+            time.sleep(config.Config.REQUEST_DELAY)
+
+    def _format_feed_item(self, item):
+        """Convert a feed API item to the post format used elsewhere"""
+        candidates = item.get('image_versions2', {}).get('candidates', [])
+        videos = item.get('video_versions') or []
+        caption = item.get('caption') or {}
+        
+        post_data = {
+            'id': str(item.get('pk', '')),
+            'shortcode': item.get('code', ''),
+            'thumbnail_url': candidates[-1].get('url', '') if candidates else '',
+            'display_url': candidates[0].get('url', '') if candidates else '',
+            'is_video': bool(videos),
+            'video_url': videos[0].get('url', '') if videos else '',
+            'caption': caption.get('text', ''),
+            'likes': item.get('like_count', 0),
+            'comments': item.get('comment_count', 0),
+            'timestamp': datetime.fromtimestamp(item['taken_at']) if item.get('taken_at') else None,
+            'dimensions': {
+                'width': item.get('original_width'),
+                'height': item.get('original_height')
+            },
+            # Pinned posts are listed first regardless of age
+            'is_pinned': bool(item.get('timeline_pinned_user_ids')),
+            'is_preview': False
+        }
+        
+        if item.get('carousel_media'):
+            post_data['carousel_media'] = [
+                self._format_feed_item(child) for child in item['carousel_media']
+            ]
+        
+        return post_data
+
     def get_user_stories(self, username):
         """Get user stories - simplified for PythonAnywhere"""
         try:
@@ -840,34 +935,17 @@ class InstagramAPI:
                 return None
             
             posts = self.get_user_posts(username, limit=50)
+            analytics = AnalyticsEngine().analyze(posts, profile_data.get('followers', 0))
             
-            insights = {
-                'engagement_rate': 0,
-                'average_likes': 0,
-                'average_comments': 0,
-                'post_frequency': 'Unknown',
-                'most_engaged_post': None
+            return {
+                'engagement_rate': analytics['engagement_rate'],
+                'average_likes': int(analytics['average_likes']),
+                'average_comments': int(analytics['average_comments']),
+                'median_engagement': analytics.get('median_engagement', 0),
+                'post_frequency': analytics.get('post_frequency', 'Unknown'),
+                'most_engaged_post': analytics['most_engaged_post']
             }
             
-            if posts:
-                total_likes = sum(post.get('likes', 0) for post in posts)
-                total_comments = sum(post.get('comments', 0) for post in posts)
-                
-                insights['average_likes'] = total_likes // len(posts)
-                insights['average_comments'] = total_comments // len(posts)
-                
-                if profile_data.get('followers', 0) > 0:
-                    insights['engagement_rate'] = round(
-                        ((total_likes + total_comments) / len(posts)) / profile_data['followers'] * 100, 2
-                    )
-                
-                # Find most engaged post
-                if posts:
-                    most_engaged = max(posts, key=lambda x: x.get('likes', 0) + x.get('comments', 0))
-                    insights['most_engaged_post'] = most_engaged
-            
-            return insights
-            
         except Exception as e:
             print(f"❌ Profile insights error: {e}")
             return None
@@ -878,33 +956,423 @@ class InstagramAPI:
         style = random.choice(styles)
         return f"https://api.dicebear.com/7.x/{style}/svg?seed={username}"
 
+# Content types accepted for media downloads, mapped to their file extension
+CONTENT_TYPE_EXTENSIONS = {
+    'image/jpeg': 'jpg',
+    'image/jpg': 'jpg',
+    'image/png': 'png',
+    'image/webp': 'webp',
+    'video/mp4': 'mp4',
+    'video/quicktime': 'mov'
+}
+
+# Types that say nothing about the payload; the extension of the final URL is checked instead
+GENERIC_CONTENT_TYPES = {'application/octet-stream', 'binary/octet-stream'}
+
+class MediaRejectedError(Exception):
+    """Raised when media is too large or of a type that may not be downloaded"""
+    pass
+
 class MediaDownloader:
-    def __init__(self):
+    def __init__(self, governor=None):
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36'
         })
+        # Shared per-host connection and bandwidth limits
+        self.governor = governor or get_transfer_governor()
+    
+    def download_media(self, url, filename, progress_callback=None):
+        """Download media from URL, hashing the content while it streams.
+        
+        Data is written to ``<filename>.part`` and renamed into place once the
+        transfer is complete. Interrupted transfers are resumed with Range
+        requests (validated by ETag/Last-Modified and Content-Range), up to
+        Config.MAX_RETRIES times; a leftover .part file from an earlier call
+        for the same URL is resumed as well.
+        
+        Returns a dict with the file path, size, SHA-256 and throughput of the
+        transfer, or False if the download failed. Raises MediaRejectedError
+        when the content is larger than Config.MAX_CONTENT_SIZE or the server
+        sends a type outside Config.ALLOWED_EXTENSIONS.
+        """
+        part_path = f"{filename}.part"
+        meta_path = f"{part_path}.json"
+        state = self._load_partial(url, part_path, meta_path)
+        
+        print(f"📥 Downloading media from: {url}")
+        if state['offset']:
+            print(f"⏯️ Resuming from byte {state['offset']}: {url}")
+        else:
+            info = self._try_segmented_download(url, filename, progress_callback)
+            if info:
+                return info
+        
+        started = time.monotonic()
+        start_offset = state['offset']
+        
+        attempts = config.Config.MAX_RETRIES + 1
+        host = urllib.parse.urlparse(url).hostname or ''
+        for attempt in range(1, attempts + 1):
+            backoff = 0
+            response = None
+            self.governor.acquire(host)
+            try:
+                headers = {'Accept-Encoding': 'identity'}
+                if state['offset']:
+                    headers['Range'] = f"bytes={state['offset']}-"
+                    validator = state['etag'] or state['last_modified']
+                    if validator:
+                        headers['If-Range'] = validator
+                
+                response = self.session.get(url, stream=True, timeout=30, headers=headers)
+                
+                if response.status_code == 206 and state['offset']:
+                    if not self._accept_partial_response(response, state):
+                        self._reset_partial(state)
+                        continue
+                    mode = 'ab'
+                elif response.status_code == 200:
+                    # Full body: server ignored the range or the resource changed
+                    if state['offset']:
+                        print(f"🔁 Server sent full content, restarting: {url}")
+                    self._reset_partial(state)
+                    start_offset = 0
+                    state['total'] = int(response.headers.get('Content-Length', 0)) or None
+                    state['etag'] = response.headers.get('ETag')
+                    state['last_modified'] = response.headers.get('Last-Modified')
+                    mode = 'wb'
+                elif response.status_code == 416:
+                    self._reset_partial(state)
+                    start_offset = 0
+                    continue
+                elif 400 <= response.status_code < 500:
+                    print(f"❌ Download failed with status: {response.status_code}")
+                    break
+                else:
+                    raise IOError(f"unexpected status {response.status_code}")
+                
+                # Reject from headers before any body bytes are transferred
+                self._check_response(response, state['total'])
+                self._save_partial_meta(url, meta_path, state)
+                
+                with open(part_path, mode) as f:
+                    self._write_body(response, f, state, progress_callback)
+                
+                if state['total'] is not None and state['offset'] != state['total']:
+                    raise IOError(f"incomplete transfer: {state['offset']} of {state['total']} bytes")
+                
+                os.replace(part_path, filename)
+                if os.path.exists(meta_path):
+                    os.remove(meta_path)
+                
+                elapsed = max(time.monotonic() - started, 1e-6)
+                throughput = (state['offset'] - start_offset) / elapsed
+                print(
+                    f"✅ Successfully downloaded: {filename} "
+                    f"({state['offset'] / 1024 / 1024:.1f} MB in {elapsed:.1f}s, "
+                    f"{throughput / 1024 / 1024:.2f} MB/s)"
+                )
+                return {
+                    'file_path': filename,
+                    'size': state['offset'],
+                    'sha256': state['digest'].hexdigest(),
+                    'elapsed': round(elapsed, 3),
+                    'throughput_bps': int(throughput)
+                }
+                
+            except MediaRejectedError as e:
+                print(f"🚫 Download rejected: {e}")
+                for path in (part_path, meta_path):
+                    if os.path.exists(path):
+                        os.remove(path)
+                raise
+            except Exception as e:
+                print(f"❌ Error downloading media (attempt {attempt}/{attempts}): {e}")
+                if attempt < attempts:
+                    backoff = config.Config.REQUEST_DELAY * attempt
+            finally:
+                # Every path, including the retries, hands the connection back to the pool
+                if response is not None:
+                    response.close()
+                self.governor.release(host)
+            
+            # Back off without holding the host slot, so other transfers can use it
+            if backoff:
+                time.sleep(backoff)
+        
+        return False
+    
+    def _check_extension(self, response):
+        """Reject content whose URL, after redirects, does not end in an allowed extension"""
+        path = urllib.parse.urlparse(getattr(response, 'url', None) or '').path
+        extension = os.path.splitext(path)[1].lstrip('.').lower()
+        if extension not in config.Config.ALLOWED_EXTENSIONS:
+            reason = f"file type '.{extension}' is not allowed" if extension else "file type is unknown"
+            raise MediaRejectedError(reason)
+    
+    def _check_response(self, response, total):
+        """Reject oversized or disallowed content using the response headers"""
+        if total is not None and total > config.Config.MAX_CONTENT_SIZE:
+            raise MediaRejectedError(
+                f"content is {total} bytes, limit is {config.Config.MAX_CONTENT_SIZE}"
+            )
+        
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if not content_type or content_type in GENERIC_CONTENT_TYPES:
+            self._check_extension(response)
+            return
+        extension = CONTENT_TYPE_EXTENSIONS.get(content_type)
+        if extension not in config.Config.ALLOWED_EXTENSIONS:
+            raise MediaRejectedError(f"content type '{content_type}' is not allowed")
     
-    def download_media(self, url, filename):
-        """Download media from URL with improved error handling"""
+    def _write_body(self, response, f, state, progress_callback=None):
+        """Stream the response body into ``f``, enforcing the size limit as it goes"""
+        limit = config.Config.MAX_CONTENT_SIZE
+        
+        def consume(data):
+            if state['offset'] + len(data) > limit:
+                raise MediaRejectedError(f"content exceeded the {limit} byte limit mid-stream")
+            self.governor.throttle(len(data))
+            f.write(data)
+            state['digest'].update(data)
+            state['offset'] += len(data)
+            if progress_callback:
+                progress_callback(state['offset'], state['total'])
+        
+        encoding = response.headers.get('Content-Encoding', 'identity').lower()
+        raw = getattr(response, 'raw', None)
+        remaining = None if state['total'] is None else state['total'] - state['offset']
+        large = remaining is None or remaining >= config.Config.DOWNLOAD_LARGE_FILE_THRESHOLD
+        
+        if large and encoding == 'identity' and hasattr(raw, 'readinto'):
+            # Read straight into one reusable buffer instead of allocating per chunk
+            buffer = bytearray(config.Config.DOWNLOAD_BUFFER_SIZE)
+            view = memoryview(buffer)
+            while True:
+                count = raw.readinto(view)
+                if not count:
+                    break
+                consume(view[:count])
+        else:
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                if chunk:
+                    consume(chunk)
+    
+    def _try_segmented_download(self, url, filename, progress_callback=None):
+        """Download large files over several ranged connections at once.
+        
+        Returns None when the file is small, the server doesn't support byte
+        ranges, or the segmented transfer fails, so the caller can fall back
+        to a single stream.
+        """
+        segments = config.Config.DOWNLOAD_SEGMENTS
+        if segments < 2:
+            return None
+        
         try:
-            print(f"📥 Downloading media from: {url}")
-            response = self.session.get(url, stream=True, timeout=30)
+            with self.governor.slot(url):
+                probe = self.session.head(
+                    url, timeout=15, allow_redirects=True,
+                    headers={'Accept-Encoding': 'identity'}
+                )
+            if probe.status_code != 200:
+                return None
             
-            if response.status_code == 200:
-                with open(filename, 'wb') as f:
-                    for chunk in response.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
-                print(f"✅ Successfully downloaded: {filename}")
-                return True
-            else:
-                print(f"❌ Download failed with status: {response.status_code}")
+            total = int(probe.headers.get('Content-Length', 0))
+            ranges_supported = probe.headers.get('Accept-Ranges', '').lower() == 'bytes'
+            if not ranges_supported or total < config.Config.DOWNLOAD_SEGMENT_THRESHOLD:
+                return None
+            
+            self._check_response(probe, total)
+            return self._download_segmented(
+                url, filename, total, probe.headers.get('ETag'), segments, progress_callback
+            )
+        except MediaRejectedError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Segmented download failed, using a single stream: {e}")
+            return None
+    
+    def _download_segmented(self, url, filename, total, etag, segments, progress_callback=None):
+        part_path = f"{filename}.part"
+        segment_size = -(-total // segments)
+        bounds = [
+            (start, min(start + segment_size, total) - 1)
+            for start in range(0, total, segment_size)
+        ]
+        
+        progress = {'done': 0}
+        lock = threading.Lock()
+        
+        def report(count):
+            with lock:
+                progress['done'] += count
+                done = progress['done']
+            if progress_callback:
+                progress_callback(done, total)
+        
+        started = time.monotonic()
+        print(f"🧩 Downloading {total / 1024 / 1024:.1f} MB in {len(bounds)} segments: {url}")
+        
+        # Preallocate so every segment can write at its own offset
+        with open(part_path, 'wb') as f:
+            f.truncate(total)
+        
+        fd = os.open(part_path, os.O_WRONLY)
+        try:
+            with ThreadPoolExecutor(max_workers=len(bounds)) as executor:
+                futures = [
+                    executor.submit(self._fetch_segment, url, fd, start, end, etag, report)
+                    for start, end in bounds
+                ]
+                written = [future.result() for future in futures]
+        except Exception:
+            os.close(fd)
+            os.remove(part_path)
+            raise
+        os.close(fd)
+        
+        # Verify every byte range arrived before trusting the file
+        if written != [end - start + 1 for start, end in bounds] or os.path.getsize(part_path) != total:
+            os.remove(part_path)
+            raise IOError("segment sizes do not add up to the content length")
+        
+        digest = hashlib.sha256()
+        with open(part_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(config.Config.DOWNLOAD_BUFFER_SIZE), b''):
+                digest.update(chunk)
+        
+        os.replace(part_path, filename)
+        
+        elapsed = max(time.monotonic() - started, 1e-6)
+        throughput = total / elapsed
+        print(
+            f"✅ Successfully downloaded: {filename} "
+            f"({total / 1024 / 1024:.1f} MB in {elapsed:.1f}s, "
+            f"{throughput / 1024 / 1024:.2f} MB/s, {len(bounds)} segments)"
+        )
+        return {
+            'file_path': filename,
+            'size': total,
+            'sha256': digest.hexdigest(),
+            'elapsed': round(elapsed, 3),
+            'throughput_bps': int(throughput)
+        }
+    
+    def _fetch_segment(self, url, fd, start, end, etag, report):
+        """Fetch bytes start..end into ``fd`` with positioned writes, resuming on errors"""
+        position = start
+        attempts = config.Config.MAX_RETRIES + 1
+        
+        for attempt in range(1, attempts + 1):
+            try:
+                headers = {'Accept-Encoding': 'identity', 'Range': f"bytes={position}-{end}"}
+                if etag:
+                    headers['If-Range'] = etag
+                
+                with self.governor.slot(url), self.session.get(url, stream=True, timeout=30, headers=headers) as response:
+                    if response.status_code != 206:
+                        raise IOError(f"range request answered with status {response.status_code}")
+                    
+                    match = re.match(r'bytes (\d+)-(\d+)/', response.headers.get('Content-Range', ''))
+                    if not match or int(match.group(1)) != position:
+                        raise IOError("unexpected Content-Range for segment")
+                    
+                    buffer = bytearray(config.Config.DOWNLOAD_BUFFER_SIZE)
+                    view = memoryview(buffer)
+                    while position <= end:
+                        count = response.raw.readinto(view)
+                        if not count:
+                            break
+                        if position + count > end + 1:
+                            raise IOError("server sent more data than the requested range")
+                        self.governor.throttle(count)
+                        os.pwrite(fd, view[:count], position)
+                        position += count
+                        report(count)
+                
+                if position > end:
+                    return end - start + 1
+                raise IOError(f"segment ended early at byte {position}")
+                
+            except Exception as e:
+                if attempt == attempts:
+                    raise
+                print(f"❌ Segment {start}-{end} error (attempt {attempt}/{attempts}): {e}")
+                time.sleep(config.Config.REQUEST_DELAY * attempt)
+    
+    def _load_partial(self, url, part_path, meta_path):
+        """Restore resume state from a previous interrupted download"""
+        state = {
+            'offset': 0,
+            'total': None,
+            'etag': None,
+            'last_modified': None,
+            'digest': hashlib.sha256()
+        }
+        
+        try:
+            if os.path.exists(part_path) and os.path.exists(meta_path):
+                with open(meta_path) as f:
+                    meta = json.load(f)
                 
+                if meta.get('url') == url:
+                    # Re-hash the bytes already on disk so the digest covers the whole file
+                    with open(part_path, 'rb') as f:
+                        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                            state['digest'].update(chunk)
+                            state['offset'] += len(chunk)
+                    state['total'] = meta.get('total')
+                    state['etag'] = meta.get('etag')
+                    state['last_modified'] = meta.get('last_modified')
+                    return state
+            
+            for path in (part_path, meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
         except Exception as e:
-            print(f"❌ Error downloading media: {e}")
+            print(f"❌ Could not recover partial download: {e}")
+            self._reset_partial(state)
         
-        return False
+        return state
+    
+    def _save_partial_meta(self, url, meta_path, state):
+        with open(meta_path, 'w') as f:
+            json.dump({
+                'url': url,
+                'total': state['total'],
+                'etag': state['etag'],
+                'last_modified': state['last_modified']
+            }, f)
+    
+    def _reset_partial(self, state):
+        state['offset'] = 0
+        state['total'] = None
+        state['etag'] = None
+        state['last_modified'] = None
+        state['digest'] = hashlib.sha256()
+    
+    def _accept_partial_response(self, response, state):
+        """Check that a 206 response continues exactly where the .part file ends"""
+        etag = response.headers.get('ETag')
+        if state['etag'] and etag and etag != state['etag']:
+            print("🔁 ETag changed, restarting download")
+            return False
+        
+        match = re.match(r'bytes (\d+)-(\d+)/(\d+|\*)', response.headers.get('Content-Range', ''))
+        if not match or int(match.group(1)) != state['offset']:
+            print("🔁 Unexpected Content-Range, restarting download")
+            return False
+        
+        if match.group(3) != '*':
+            total = int(match.group(3))
+            if state['total'] is not None and total != state['total']:
+                print("🔁 Content length changed, restarting download")
+                return False
+            state['total'] = total
+        
+        return True
 
     def download_profile_picture(self, profile_data, filename=None):
         """Download profile picture"""
@@ -0,0 +1,184 @@
+import os
+import queue
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+import config
+
+def _owner_is_alive(owner):
+    """False only when ``owner`` is a process on this host that no longer exists"""
+    host, _, pid = (owner or '').rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class DownloadJobQueue:
+    """Background worker pool for download jobs persisted in SQLite.
+
+    Several processes may share the database (reloader, gunicorn workers),
+    so a worker runs a job only after claiming it with an atomic update, and
+    running jobs carry the owner's heartbeat so a crashed owner's jobs can be
+    recovered without stealing those of live processes.
+    """
+
+    def __init__(self, download_manager, handlers, workers=None):
+        self.download_manager = download_manager
+        self.handlers = handlers
+        self.workers = workers or config.Config.DOWNLOAD_WORKERS
+        self.queue = queue.Queue()
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+        # Live progress is kept in memory so polling doesn't hit the database
+        self._progress = {}
+        self._lock = threading.Lock()
+
+        self._recover_jobs()
+
+        for index in range(self.workers):
+            thread = threading.Thread(
+                target=self._worker,
+                name=f"download-worker-{index}",
+                daemon=True
+            )
+            thread.start()
+
+        threading.Thread(target=self._heartbeat, name='download-heartbeat', daemon=True).start()
+
+        print(f"✅ Download job queue started with {self.workers} workers")
+
+    def _is_stale(self, job):
+        if not _owner_is_alive(job['owner']):
+            return True
+        try:
+            heartbeat = datetime.fromisoformat(str(job['heartbeat']))
+        except ValueError:
+            return True
+        return datetime.now() - heartbeat > timedelta(seconds=config.Config.JOB_STALE_AFTER)
+
+    def _recover_jobs(self):
+        """Queue unfinished jobs; running ones only when their owner is gone"""
+        for job in self.download_manager.get_unfinished_jobs():
+            if job['type'] not in self.handlers:
+                continue
+            if job['status'] == 'running':
+                if not self._is_stale(job) or not self.download_manager.release_stale_job(job):
+                    continue
+                print(f"🔄 Recovered download job: {job['id']}")
+            # Queued jobs may also sit in another process's queue; the claim decides who runs them
+            self.queue.put((job['id'], job['type'], job['payload']))
+
+    def _heartbeat(self):
+        while True:
+            time.sleep(config.Config.JOB_HEARTBEAT_INTERVAL)
+            self.download_manager.heartbeat_jobs(self.owner)
+
+    def submit(self, job_type, payload):
+        """Persist a job and queue it, returning the job id immediately"""
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+
+        job_id = uuid.uuid4().hex
+        if not self.download_manager.create_job(job_id, job_type, payload):
+            return None
+
+        self.queue.put((job_id, job_type, payload))
+        return job_id
+
+    def get_job(self, job_id):
+        """Get job status merged with live progress"""
+        job = self.download_manager.get_job(job_id)
+        if not job:
+            return None
+
+        with self._lock:
+            progress = self._progress.get(job_id)
+        if progress and job['status'] == 'running':
+            job['bytes_downloaded'], job['bytes_total'] = progress
+
+        return job
+
+    def get_progress(self, job_id):
+        """Get lightweight progress information for a job"""
+        job = self.get_job(job_id)
+        if not job:
+            return None
+
+        total = job['bytes_total']
+        done = job['bytes_downloaded']
+        if job['status'] == 'completed':
+            percent = 100.0
+        elif total:
+            percent = round(done / total * 100, 1)
+        else:
+            percent = None
+
+        return {
+            'id': job['id'],
+            'status': job['status'],
+            'bytes_downloaded': done,
+            'bytes_total': total,
+            'percent': percent
+        }
+
+    def _worker(self):
+        while True:
+            job_id, job_type, payload = self.queue.get()
+            try:
+                self._run_job(job_id, job_type, payload)
+            finally:
+                self.queue.task_done()
+
+    def _run_job(self, job_id, job_type, payload):
+        if not self.download_manager.claim_job(job_id, self.owner):
+            return
+
+        last_saved = [0.0]
+
+        def progress_callback(bytes_downloaded, bytes_total):
+            with self._lock:
+                self._progress[job_id] = (bytes_downloaded, bytes_total)
+
+            now = time.monotonic()
+            if now - last_saved[0] >= config.Config.JOB_PROGRESS_SAVE_INTERVAL:
+                last_saved[0] = now
+                self.download_manager.update_job(
+                    job_id,
+                    bytes_downloaded=bytes_downloaded,
+                    bytes_total=bytes_total
+                )
+
+        try:
+            result = self.handlers[job_type](payload, progress_callback)
+
+            with self._lock:
+                bytes_downloaded, bytes_total = self._progress.get(job_id, (0, None))
+
+            if result and result.get('success'):
+                self.download_manager.update_job(
+                    job_id,
+                    status='completed',
+                    result=result,
+                    bytes_downloaded=bytes_downloaded,
+                    bytes_total=bytes_total or bytes_downloaded
+                )
+            else:
+                self.download_manager.update_job(
+                    job_id,
+                    status='failed',
+                    result=result,
+                    error=(result or {}).get('error', 'Download failed')
+                )
+        except Exception as e:
+            print(f"❌ Download job {job_id} error: {e}")
+            self.download_manager.update_job(job_id, status='failed', error=str(e))
+        finally:
+            with self._lock:
+                self._progress.pop(job_id, None)
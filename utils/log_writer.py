@@ -0,0 +1,148 @@
+import atexit
+import queue
+import threading
+import time
+import config
+
+class DownloadLogError(Exception):
+    """Raised when buffered download records could not be written"""
+    pass
+
+class DownloadLogWriter:
+    """Buffers download records and writes them in batched transactions.
+
+    Records are flushed once ``batch_size`` rows are pending or
+    ``flush_interval_ms`` has passed since the first pending row. The queue
+    is bounded, so producers block instead of growing memory without limit
+    if the database falls behind.
+
+    A failed write is retried with backoff. Rows that still could not be
+    written stay pending and are retried with the next batch; ``flush`` and
+    ``close`` raise DownloadLogError while any are left.
+    """
+
+    def __init__(self, write_rows, batch_size=None, flush_interval_ms=None, max_queue=None):
+        self.write_rows = write_rows
+        self.batch_size = batch_size or config.Config.DOWNLOAD_LOG_BATCH_SIZE
+        self.flush_interval = (flush_interval_ms or config.Config.DOWNLOAD_LOG_FLUSH_INTERVAL_MS) / 1000
+        self.max_pending = max_queue or config.Config.DOWNLOAD_LOG_QUEUE_SIZE
+        self.queue = queue.Queue(maxsize=self.max_pending)
+        self._closed = False
+
+        # Rows taken off the queue but not written yet; kept here so a restarted thread picks them up
+        self._batch = []
+        self._error = None
+
+        self._thread_lock = threading.Lock()
+        self._thread = None
+        self._ensure_thread()
+        atexit.register(self.close)
+
+    def _ensure_thread(self):
+        with self._thread_lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            if self._thread is not None:
+                print(f"⚠️ Download log writer stopped, restarting with {len(self._batch)} pending records")
+            self._thread = threading.Thread(target=self._run, name='download-log-writer', daemon=True)
+            self._thread.start()
+
+    def write(self, row):
+        """Queue a row for the next batch; blocks while the queue is full"""
+        if self._closed:
+            self.write_rows([row])
+            return
+        self._ensure_thread()
+        self.queue.put(row)
+
+    def flush(self, timeout=None):
+        """Write everything queued so far before returning.
+
+        Raises DownloadLogError if the rows are not written within ``timeout``
+        seconds or could not be written at all.
+        """
+        if self._closed:
+            return
+        timeout = timeout or config.Config.DOWNLOAD_LOG_FLUSH_TIMEOUT
+        self._ensure_thread()
+
+        done = threading.Event()
+        try:
+            self.queue.put(done, timeout=timeout)
+        except queue.Full:
+            raise DownloadLogError(f"download log queue stayed full for {timeout}s") from None
+        if not done.wait(timeout):
+            raise DownloadLogError(f"download records were not written within {timeout}s")
+        if self._error is not None:
+            raise DownloadLogError(f"{len(self._batch)} download records are not written yet: {self._error}")
+
+    def close(self):
+        """Flush pending rows and stop the writer thread"""
+        if self._closed:
+            return
+        self._closed = True
+        self.queue.put(None)
+        self._thread.join(timeout=config.Config.DOWNLOAD_LOG_FLUSH_TIMEOUT)
+        if self._batch and not self._thread.is_alive():
+            self._write()
+        if self._batch:
+            raise DownloadLogError(f"{len(self._batch)} download records were lost on close: {self._error}")
+
+    def _run(self):
+        deadline = time.monotonic() if self._batch else None
+        waiters = []
+
+        while True:
+            stopping = False
+            if len(self._batch) < self.max_pending:
+                timeout = None if deadline is None else max(0, deadline - time.monotonic())
+                try:
+                    item = self.queue.get(timeout=timeout)
+                except queue.Empty:
+                    item = False
+
+                if item is None:
+                    stopping = True
+                elif isinstance(item, threading.Event):
+                    waiters.append(item)
+                elif item is not False:
+                    self._batch.append(item)
+                    if deadline is None:
+                        deadline = time.monotonic() + self.flush_interval
+            else:
+                # Writes keep failing: stop taking rows so producers block on the full queue
+                time.sleep(max(0, deadline - time.monotonic()))
+
+            due = self._batch and (len(self._batch) >= self.batch_size or time.monotonic() >= deadline)
+            if stopping or waiters or due:
+                if self._write():
+                    deadline = None
+                else:
+                    deadline = time.monotonic() + config.Config.DOWNLOAD_LOG_RETRY_DELAY_MS / 1000
+                # Waiters check self._error to learn whether their rows were written
+                for waiter in waiters:
+                    waiter.set()
+                waiters = []
+
+            if stopping:
+                return
+
+    def _write(self):
+        """Write the pending rows, retrying with backoff; True once none are left"""
+        if not self._batch:
+            self._error = None
+            return True
+
+        attempts = config.Config.DOWNLOAD_LOG_WRITE_RETRIES + 1
+        for attempt in range(1, attempts + 1):
+            try:
+                self.write_rows(self._batch)
+                self._batch = []
+                self._error = None
+                return True
+            except Exception as e:
+                self._error = e
+                print(f"❌ Failed to write {len(self._batch)} download records (attempt {attempt}/{attempts}): {e}")
+                if attempt < attempts:
+                    time.sleep(config.Config.DOWNLOAD_LOG_RETRY_DELAY_MS / 1000 * attempt)
+        return False
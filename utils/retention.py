@@ -0,0 +1,119 @@
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import config
+
+class RetentionManager:
+    """Keeps the download folder under a size cap and maximum age.
+
+    Access times are collected in memory and written in one batch per sweep.
+    Each sweep first drops files not accessed within DOWNLOAD_MAX_AGE_DAYS,
+    then evicts least recently used files until the folder is back under
+    DOWNLOAD_EVICTION_LOW_WATERMARK of DOWNLOAD_MAX_TOTAL_SIZE.
+    """
+
+    def __init__(self, download_manager, download_folder, start=True):
+        self.download_manager = download_manager
+        self.download_folder = download_folder
+        self.batch_size = config.Config.DOWNLOAD_SWEEP_BATCH_SIZE
+
+        self._accesses = {}
+        self._lock = threading.Lock()
+        self._sweep_lock = threading.Lock()
+
+        if start and config.Config.DOWNLOAD_SWEEP_INTERVAL:
+            thread = threading.Thread(target=self._run, name='download-sweeper', daemon=True)
+            thread.start()
+
+    def touch(self, file_path):
+        """Note an access; persisted with the next sweep"""
+        with self._lock:
+            self._accesses[file_path] = datetime.now()
+
+    def flush_accesses(self):
+        with self._lock:
+            accesses, self._accesses = self._accesses, {}
+        self.download_manager.touch_files(accesses)
+
+    def _run(self):
+        while True:
+            time.sleep(config.Config.DOWNLOAD_SWEEP_INTERVAL)
+            try:
+                self.sweep()
+            except Exception as e:
+                print(f"❌ Download sweep error: {e}")
+
+    def sweep(self):
+        """Delete expired files, then evict LRU files while over the size cap"""
+        with self._sweep_lock:
+            self.flush_accesses()
+
+            removed = {'files': 0, 'bytes': 0}
+            max_age = config.Config.DOWNLOAD_MAX_AGE_DAYS
+            max_size = config.Config.DOWNLOAD_MAX_TOTAL_SIZE
+
+            if max_age:
+                cutoff = datetime.now() - timedelta(days=max_age)
+                while True:
+                    batch = self.download_manager.get_expired_files(cutoff, self.batch_size)
+                    if not batch or not self._remove(batch, removed):
+                        break
+                self._remove_stale_partials(cutoff)
+
+            if max_size:
+                stored = self.download_manager.get_stored_size()['total_size']
+                target = max_size * config.Config.DOWNLOAD_EVICTION_LOW_WATERMARK
+                if stored > max_size:
+                    while stored > target:
+                        batch = self._take_until(
+                            self.download_manager.get_lru_files(self.batch_size),
+                            stored - target
+                        )
+                        if not batch or not self._remove(batch, removed):
+                            break
+                        stored -= sum(size or 0 for _, size in batch)
+
+            if removed['files']:
+                print(
+                    f"🧹 Evicted {removed['files']} downloaded files "
+                    f"({removed['bytes'] / 1024 / 1024:.1f} MB)"
+                )
+            return removed
+
+    def _take_until(self, rows, bytes_needed):
+        """Take LRU rows until enough bytes would be freed"""
+        taken = []
+        freed = 0
+        for file_path, file_size in rows:
+            if freed >= bytes_needed:
+                break
+            taken.append((file_path, file_size))
+            freed += file_size or 0
+        return taken
+
+    def _remove(self, batch, removed):
+        """Delete a batch of files from disk and from the database together"""
+        paths = []
+        for file_path, file_size in batch:
+            try:
+                if os.path.exists(file_path):
+                    os.remove(file_path)
+            except OSError as e:
+                print(f"❌ Could not delete {file_path}: {e}")
+                continue
+            paths.append(file_path)
+            removed['files'] += 1
+            removed['bytes'] += file_size or 0
+
+        return bool(paths) and self.download_manager.remove_stored_files(paths)
+
+    def _remove_stale_partials(self, cutoff):
+        """Delete abandoned .part files from downloads that were never resumed"""
+        threshold = cutoff.timestamp()
+        try:
+            for entry in os.scandir(self.download_folder):
+                if entry.name.startswith('.incoming_') and entry.stat().st_mtime < threshold:
+                    os.remove(entry.path)
+        except OSError as e:
+            print(f"❌ Partial download cleanup error: {e}")
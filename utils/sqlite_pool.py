@@ -0,0 +1,105 @@
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+import config
+
+class PoolExhaustedError(Exception):
+    """No pooled connection was given back within Config.SQLITE_POOL_TIMEOUT"""
+    pass
+
+class SQLiteConnectionPool:
+    """Thread-safe pool of reusable, WAL-mode SQLite connections"""
+
+    def __init__(self, db_path, size=None):
+        self.db_path = db_path
+        self.size = size or config.Config.SQLITE_POOL_SIZE
+        self._pool = queue.LifoQueue(maxsize=self.size)
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _create_connection(self):
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=config.Config.SQLITE_BUSY_TIMEOUT / 1000,
+            check_same_thread=False,
+            # Each connection keeps its own cache of prepared statements
+            cached_statements=config.Config.SQLITE_STATEMENT_CACHE_SIZE
+        )
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA foreign_keys=ON')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute(f'PRAGMA busy_timeout={int(config.Config.SQLITE_BUSY_TIMEOUT)}')
+        conn.execute(f'PRAGMA cache_size=-{int(config.Config.SQLITE_CACHE_SIZE_KB)}')
+        conn.execute(f'PRAGMA mmap_size={int(config.Config.SQLITE_MMAP_SIZE)}')
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._created < self.size:
+                self._created += 1
+                create = True
+            else:
+                create = False
+
+        if create:
+            try:
+                return self._create_connection()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+
+        # Pool exhausted: wait for another thread to give a connection back
+        try:
+            return self._pool.get(timeout=config.Config.SQLITE_POOL_TIMEOUT)
+        except queue.Empty:
+            raise PoolExhaustedError(
+                f"all {self.size} connections to {self.db_path} stayed in use for "
+                f"{config.Config.SQLITE_POOL_TIMEOUT}s"
+            ) from None
+
+    def _release(self, conn):
+        self._pool.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection; commits on success and rolls back on error"""
+        conn = self._acquire()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._release(conn)
+
+    def get_stats(self):
+        """Get the pool size and how many connections exist, idle and in use"""
+        with self._lock:
+            created = self._created
+        idle = self._pool.qsize()
+        return {
+            'size': self.size,
+            'created': created,
+            'idle': idle,
+            'in_use': max(created - idle, 0)
+        }
+
+    def close_all(self):
+        """Close every idle connection in the pool"""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
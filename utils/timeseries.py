@@ -0,0 +1,272 @@
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+import numpy as np
+import config
+
+try:
+    import fcntl
+except ImportError:  # no cross-process locking on Windows; threads are still serialized
+    fcntl = None
+
+# Column name -> on-disk dtype; every tier stores the same columns
+COLUMNS = {
+    'timestamp': np.int64,
+    'followers': np.int64,
+    'following': np.int64,
+    'posts': np.int64,
+    'engagement_rate': np.float32
+}
+
+# Tiers oldest to newest: raw points are folded into hourly buckets, hourly into daily
+TIERS = ('daily', 'hourly', 'raw')
+BUCKET_SECONDS = {'hourly': 3600, 'daily': 86400}
+
+USERNAME_PATTERN = re.compile(r'^[a-z0-9._]{1,30}$')
+
+class TimeSeriesStore:
+    """Append-only, column-per-file history of profile counts and engagement.
+
+    Each username gets its own directory holding one binary file per column
+    and tier (``raw.followers``, ``hourly.timestamp``, ...). Snapshots are
+    appended to the raw tier; once they are older than
+    TIMESERIES_RAW_RETENTION_DAYS they are folded into hourly buckets, and
+    hourly buckets older than TIMESERIES_HOURLY_RETENTION_DAYS into daily
+    ones. A bucket keeps the last counts and the mean engagement rate of the
+    points it replaces, so a tracked account costs 36 bytes per stored point.
+
+    Several worker processes may share the folder, so every append,
+    compaction and query holds an flock on the account's ``.lock`` file.
+    """
+
+    def __init__(self, folder=None):
+        self.folder = folder or config.Config.TIMESERIES_FOLDER
+        os.makedirs(self.folder, exist_ok=True)
+
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    @contextmanager
+    def _lock(self, folder, exclusive=True):
+        """Serialize access to one account's files across threads and processes"""
+        with self._locks_lock:
+            thread_lock = self._locks.setdefault(folder, threading.Lock())
+
+        with thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(os.path.join(folder, '.lock'), 'a') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _user_folder(self, username):
+        username = (username or '').lower()
+        if not USERNAME_PATTERN.match(username):
+            raise ValueError(f"Invalid username: {username}")
+        return os.path.join(self.folder, username)
+
+    def _path(self, folder, tier, column):
+        return os.path.join(folder, f"{tier}.{column}")
+
+    def append(self, username, followers, following, posts, engagement_rate=None, timestamp=None):
+        """Record one snapshot; snapshots closer than TIMESERIES_MIN_INTERVAL are dropped.
+
+        Raises ValueError for an explicit ``timestamp`` older than the latest
+        stored point, since every tier must stay sorted.
+        """
+        folder = self._user_folder(username)
+        explicit = timestamp is not None
+        timestamp = int(timestamp if explicit else time.time())
+        os.makedirs(folder, exist_ok=True)
+
+        with self._lock(folder):
+            self._repair_raw(folder)
+            last = self._newest_timestamp(folder)
+            if last is not None and timestamp < last:
+                if explicit:
+                    raise ValueError(f"Snapshot at {timestamp} is older than the latest stored point ({last})")
+                return False
+            if last is not None and timestamp - last < config.Config.TIMESERIES_MIN_INTERVAL:
+                return False
+
+            values = {
+                'timestamp': timestamp,
+                'followers': followers or 0,
+                'following': following or 0,
+                'posts': posts or 0,
+                'engagement_rate': np.nan if engagement_rate is None else engagement_rate
+            }
+            for column, dtype in COLUMNS.items():
+                with open(self._path(folder, 'raw', column), 'ab') as f:
+                    f.write(np.array([values[column]], dtype=dtype).tobytes())
+
+            self._compact_if_due(folder, timestamp)
+            return True
+
+    def _repair_raw(self, folder):
+        """Trim raw columns left uneven by an interrupted append"""
+        lengths = {}
+        for column, dtype in COLUMNS.items():
+            path = self._path(folder, 'raw', column)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            lengths[column] = size // np.dtype(dtype).itemsize
+
+        rows = min(lengths.values())
+        for column, dtype in COLUMNS.items():
+            path = self._path(folder, 'raw', column)
+            if os.path.exists(path) and os.path.getsize(path) != rows * np.dtype(dtype).itemsize:
+                os.truncate(path, rows * np.dtype(dtype).itemsize)
+
+    def _newest_timestamp(self, folder):
+        """Timestamp of the latest stored point in any tier"""
+        for tier in reversed(TIERS):
+            path = self._path(folder, tier, 'timestamp')
+            try:
+                with open(path, 'rb') as f:
+                    f.seek(0, os.SEEK_END)
+                    size = f.tell() - f.tell() % 8
+                    if size < 8:
+                        continue
+                    f.seek(size - 8)
+                    return int(np.frombuffer(f.read(8), dtype=np.int64)[0])
+            except OSError:
+                continue
+        return None
+
+    def _read_tier(self, folder, tier):
+        arrays = {}
+        for column, dtype in COLUMNS.items():
+            path = self._path(folder, tier, column)
+            arrays[column] = np.fromfile(path, dtype=dtype) if os.path.exists(path) else np.array([], dtype=dtype)
+
+        # An interrupted append can leave columns of different lengths
+        length = min(len(values) for values in arrays.values())
+        return {column: values[:length] for column, values in arrays.items()}
+
+    def _write_tier(self, folder, tier, arrays):
+        """Replace a tier's files (only used when compacting)"""
+        for column, dtype in COLUMNS.items():
+            path = self._path(folder, tier, column)
+            temp_path = f"{path}.tmp"
+            arrays[column].astype(dtype).tofile(temp_path)
+            os.replace(temp_path, path)
+
+    def _append_tier(self, folder, tier, arrays):
+        for column, dtype in COLUMNS.items():
+            with open(self._path(folder, tier, column), 'ab') as f:
+                f.write(arrays[column].astype(dtype).tobytes())
+
+    def _oldest_timestamp(self, folder, tier):
+        path = self._path(folder, tier, 'timestamp')
+        try:
+            with open(path, 'rb') as f:
+                head = f.read(8)
+        except OSError:
+            return None
+        return int(np.frombuffer(head, dtype=np.int64)[0]) if len(head) == 8 else None
+
+    def _compact_if_due(self, folder, now):
+        """Fold expired raw and hourly points into coarser buckets"""
+        day = BUCKET_SECONDS['daily']
+        raw_cutoff = now - config.Config.TIMESERIES_RAW_RETENTION_DAYS * day
+        hourly_cutoff = now - config.Config.TIMESERIES_HOURLY_RETENTION_DAYS * day
+
+        # Wait for a day of expired points so compaction runs at most daily
+        oldest_raw = self._oldest_timestamp(folder, 'raw')
+        if oldest_raw is not None and oldest_raw < raw_cutoff - day:
+            self._fold(folder, 'raw', 'hourly', raw_cutoff)
+
+        oldest_hourly = self._oldest_timestamp(folder, 'hourly')
+        if oldest_hourly is not None and oldest_hourly < hourly_cutoff - day:
+            self._fold(folder, 'hourly', 'daily', hourly_cutoff)
+
+    def _fold(self, folder, source, target, cutoff):
+        bucket = BUCKET_SECONDS[target]
+        # Only whole buckets are folded, so target buckets never overlap
+        cutoff = cutoff - cutoff % bucket
+
+        arrays = self._read_tier(folder, source)
+        split = int(np.searchsorted(arrays['timestamp'], cutoff, side='left'))
+        if not split:
+            return
+
+        expired = {column: values[:split] for column, values in arrays.items()}
+        self._append_tier(folder, target, downsample(expired, bucket))
+        self._write_tier(folder, source, {column: values[split:] for column, values in arrays.items()})
+
+    def query(self, username, start=None, end=None, resolution=None):
+        """Get the history of a profile between two datetimes.
+
+        ``resolution`` may be 'raw', 'hourly' or 'daily'; by default it is
+        picked from the length of the range. Returns column lists keyed by name.
+        """
+        folder = self._user_folder(username)
+        start_ts = int(start.timestamp()) if start else None
+        end_ts = int(end.timestamp()) if end else None
+
+        if os.path.isdir(folder):
+            with self._lock(folder, exclusive=False):
+                tiers = [self._read_tier(folder, tier) for tier in TIERS]
+        else:
+            tiers = [self._read_tier(folder, tier) for tier in TIERS]
+
+        parts = []
+        for arrays in tiers:
+            timestamps = arrays['timestamp']
+            low = 0 if start_ts is None else int(np.searchsorted(timestamps, start_ts, side='left'))
+            high = len(timestamps) if end_ts is None else int(np.searchsorted(timestamps, end_ts, side='right'))
+            parts.append({column: values[low:high] for column, values in arrays.items()})
+
+        merged = {column: np.concatenate([part[column] for part in parts]) for column in COLUMNS}
+
+        if resolution is None and len(merged['timestamp']):
+            span = merged['timestamp'][-1] - merged['timestamp'][0]
+            resolution = 'daily' if span > 90 * 86400 else 'hourly' if span > 2 * 86400 else 'raw'
+        if resolution in BUCKET_SECONDS:
+            merged = downsample(merged, BUCKET_SECONDS[resolution])
+
+        engagement = merged['engagement_rate'].astype(np.float64)
+        return {
+            'resolution': resolution or 'raw',
+            'timestamps': [
+                datetime.fromtimestamp(int(value)).isoformat() for value in merged['timestamp']
+            ],
+            'followers': merged['followers'].tolist(),
+            'following': merged['following'].tolist(),
+            'posts': merged['posts'].tolist(),
+            'engagement_rate': [
+                None if np.isnan(value) else round(float(value), 4) for value in engagement
+            ]
+        }
+
+def downsample(arrays, bucket_seconds):
+    """Collapse sorted points into buckets: last counts, mean engagement rate"""
+    timestamps = arrays['timestamp']
+    if not len(timestamps):
+        return {column: values[:0] for column, values in arrays.items()}
+
+    buckets = timestamps - timestamps % bucket_seconds
+    starts = np.flatnonzero(np.diff(buckets, prepend=buckets[0] - 1))
+    ends = np.append(starts[1:], len(buckets)) - 1
+
+    engagement = arrays['engagement_rate'].astype(np.float64)
+    known = ~np.isnan(engagement)
+    sums = np.add.reduceat(np.where(known, engagement, 0), starts)
+    counts = np.add.reduceat(known.astype(np.int64), starts)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_engagement = np.where(counts, sums / counts, np.nan)
+
+    return {
+        'timestamp': buckets[starts],
+        'followers': arrays['followers'][ends],
+        'following': arrays['following'][ends],
+        'posts': arrays['posts'][ends],
+        'engagement_rate': mean_engagement.astype(np.float32)
+    }
@@ -0,0 +1,116 @@
+import threading
+import time
+import urllib.parse
+from collections import deque
+from contextlib import contextmanager
+import config
+
+class TransferGovernor:
+    """Limits concurrent connections per host and total download bandwidth.
+
+    Each connection holds a per-host slot, granted in arrival order. Bandwidth
+    is shared through a global token bucket: every chunk reserves its airtime
+    on one timeline, so concurrent transfers are interleaved chunk by chunk
+    and get an equal share of DOWNLOAD_MAX_BYTES_PER_SEC.
+    """
+
+    def __init__(self, max_per_host=None, max_bytes_per_sec=None, burst_seconds=1.0):
+        self.max_per_host = max_per_host or config.Config.DOWNLOAD_MAX_PER_HOST
+        if max_bytes_per_sec is None:
+            max_bytes_per_sec = config.Config.DOWNLOAD_MAX_BYTES_PER_SEC
+        self.max_bytes_per_sec = max_bytes_per_sec
+        self.burst_seconds = burst_seconds
+
+        self._hosts = {}
+        self._condition = threading.Condition()
+
+        self._bucket_lock = threading.Lock()
+        self._next_send = time.monotonic()
+        self._bytes_transferred = 0
+        self._throttled_seconds = 0.0
+
+    @contextmanager
+    def slot(self, url):
+        """Hold one connection slot for the host of ``url``"""
+        host = urllib.parse.urlparse(url).hostname or ''
+        self.acquire(host)
+        try:
+            yield host
+        finally:
+            self.release(host)
+
+    def acquire(self, host):
+        """Wait (first come, first served) for a free connection slot on ``host``"""
+        with self._condition:
+            state = self._hosts.setdefault(host, {'active': 0, 'waiting': deque()})
+            ticket = object()
+            state['waiting'].append(ticket)
+            while state['waiting'][0] is not ticket or state['active'] >= self.max_per_host:
+                self._condition.wait()
+            state['waiting'].popleft()
+            state['active'] += 1
+            # The next waiter in line may be able to start as well
+            self._condition.notify_all()
+
+    def release(self, host):
+        with self._condition:
+            state = self._hosts.get(host)
+            if not state:
+                return
+            state['active'] -= 1
+            if not state['active'] and not state['waiting']:
+                del self._hosts[host]
+            self._condition.notify_all()
+
+    def throttle(self, byte_count):
+        """Account for ``byte_count`` received bytes, sleeping to stay under the rate limit"""
+        rate = self.max_bytes_per_sec
+        if not rate:
+            with self._bucket_lock:
+                self._bytes_transferred += byte_count
+            return
+
+        with self._bucket_lock:
+            now = time.monotonic()
+            # Idle time builds up at most burst_seconds worth of credit
+            start = max(self._next_send, now - self.burst_seconds)
+            self._next_send = start + byte_count / rate
+            delay = self._next_send - now
+            self._bytes_transferred += byte_count
+            if delay > 0:
+                self._throttled_seconds += delay
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def get_stats(self):
+        """Get active and queued transfers per host plus bandwidth totals"""
+        with self._condition:
+            hosts = {
+                host: {'active': state['active'], 'queued': len(state['waiting'])}
+                for host, state in self._hosts.items()
+            }
+        with self._bucket_lock:
+            bytes_transferred = self._bytes_transferred
+            throttled_seconds = self._throttled_seconds
+
+        return {
+            'max_per_host': self.max_per_host,
+            'max_bytes_per_sec': self.max_bytes_per_sec,
+            'active': sum(host['active'] for host in hosts.values()),
+            'queued': sum(host['queued'] for host in hosts.values()),
+            'hosts': hosts,
+            'bytes_transferred': bytes_transferred,
+            'throttled_seconds': round(throttled_seconds, 3)
+        }
+
+_default_governor = None
+_default_lock = threading.Lock()
+
+def get_transfer_governor():
+    """Get the process-wide governor shared by all media downloaders"""
+    global _default_governor
+    with _default_lock:
+        if _default_governor is None:
+            _default_governor = TransferGovernor()
+        return _default_governor
@@ -0,0 +1,141 @@
+import threading
+import time
+from collections import OrderedDict
+import config
+
+class TypeaheadSearch:
+    """Search-as-you-type on top of an expensive upstream search.
+
+    Requests from one client are debounced: a request waits
+    TYPEAHEAD_DEBOUNCE_MS and is dropped if the same client sends a newer
+    query meanwhile. A newer query also cancels the client's upstream search
+    still in flight, through the ``cancel_check`` passed to ``search_func``.
+    Non-empty results are cached per query. When a query extends a cached
+    one and at least TYPEAHEAD_MIN_RESULTS cached profiles still match, they
+    are filtered locally instead of searching again.
+    """
+
+    def __init__(self, search_func):
+        self.search_func = search_func
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._clients = OrderedDict()
+        self._clients_lock = threading.Lock()
+        self._stats = {'cache_hits': 0, 'prefix_hits': 0, 'upstream': 0, 'superseded': 0}
+
+    def _count(self, name):
+        with self._cache_lock:
+            self._stats[name] += 1
+
+    def _client(self, client_id):
+        with self._clients_lock:
+            state = self._clients.get(client_id)
+            if state is None:
+                state = {'generation': 0, 'condition': threading.Condition()}
+                self._clients[client_id] = state
+                while len(self._clients) > config.Config.TYPEAHEAD_MAX_CLIENTS:
+                    self._clients.popitem(last=False)
+            else:
+                self._clients.move_to_end(client_id)
+            return state
+
+    def _cached(self, query):
+        """Exact cache hit, or the longest cached prefix filtered to ``query``"""
+        now = time.monotonic()
+        with self._cache_lock:
+            for length in range(len(query), config.Config.TYPEAHEAD_MIN_QUERY_LENGTH - 1, -1):
+                prefix = query[:length]
+                entry = self._cache.get(prefix)
+                if entry is None:
+                    continue
+                if now - entry['cached_at'] > config.Config.TYPEAHEAD_CACHE_TTL:
+                    del self._cache[prefix]
+                    continue
+                self._cache.move_to_end(prefix)
+
+                if length == len(query):
+                    return entry['profiles'], 'cache'
+
+                profiles = [profile for profile in entry['profiles'] if _matches(profile, query)]
+                # Upstream results are a ranked sample, never every match, so few survivors mean searching again
+                if len(profiles) >= config.Config.TYPEAHEAD_MIN_RESULTS:
+                    return profiles, 'prefix_cache'
+                return None, None
+
+        return None, None
+
+    def _store(self, query, profiles):
+        # The upstream search also returns no profiles when it fails, so empty results are not cached
+        if not profiles:
+            return
+        with self._cache_lock:
+            self._cache[query] = {
+                'profiles': profiles,
+                'cached_at': time.monotonic()
+            }
+            self._cache.move_to_end(query)
+            while len(self._cache) > config.Config.TYPEAHEAD_CACHE_SIZE:
+                self._cache.popitem(last=False)
+
+    def search(self, client_id, query):
+        """Return (profiles, source); source is None when a newer query superseded this one"""
+        query = (query or '').strip().lower()
+        if len(query) < config.Config.TYPEAHEAD_MIN_QUERY_LENGTH:
+            return [], 'empty'
+
+        state = self._client(client_id)
+        with state['condition']:
+            state['generation'] += 1
+            generation = state['generation']
+            state['condition'].notify_all()
+
+        def superseded():
+            return state['generation'] != generation
+
+        profiles, source = self._cached(query)
+        if profiles is not None:
+            self._count('cache_hits' if source == 'cache' else 'prefix_hits')
+            return profiles, source
+
+        # Debounce: give the client a moment to type the next character
+        deadline = time.monotonic() + config.Config.TYPEAHEAD_DEBOUNCE_MS / 1000
+        with state['condition']:
+            while not superseded():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                state['condition'].wait(remaining)
+
+        if superseded():
+            self._count('superseded')
+            return None, None
+
+        # Another client may have filled the cache while this one waited
+        profiles, source = self._cached(query)
+        if profiles is not None:
+            self._count('cache_hits' if source == 'cache' else 'prefix_hits')
+            return profiles, source
+
+        self._count('upstream')
+        profiles = self.search_func(query, cancel_check=superseded)
+        if superseded():
+            # The upstream cascade may have stopped early, so the results are not cached
+            self._count('superseded')
+            return None, None
+
+        self._store(query, profiles)
+        return profiles, 'upstream'
+
+    def get_stats(self):
+        """Get cache and upstream counters"""
+        with self._cache_lock:
+            stats = dict(self._stats, cached_queries=len(self._cache))
+        with self._clients_lock:
+            stats['clients'] = len(self._clients)
+        return stats
+
+def _matches(profile, query):
+    return (
+        query in (profile.get('username') or '').lower()
+        or query in (profile.get('full_name') or '').lower()
+    )